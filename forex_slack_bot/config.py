@@ -24,7 +24,16 @@ class Config:
     # データファイルパス
     DATA_DIR: str = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
     BALANCE_FILE: str = os.path.join(DATA_DIR, "balance", "balance.json")
-    TRANSACTION_LOG_FILE: str = os.path.join(DATA_DIR, "log", "transaction_log.json")
+    TRANSACTION_LOG_FILE: str = os.path.join(DATA_DIR, "log", "transaction_log.jsonl")  # 追記型（JSON Lines）
+    LEGACY_TRANSACTION_LOG_FILE: str = os.path.join(DATA_DIR, "log", "transaction_log.json")  # 移行元の従来形式
+    # 直近この件数の取引だけをログに残し、古い取引は data/log/archive/ に移す（0の場合は圧縮しない）
+    # 全件・ユーザー別・期間指定の取得やエクスポート、SQLiteへの移行はアーカイブも読むため遅くなる。
+    # IDによる検索と取り消し（/deal-undo）の対象はログに残っている取引のみ
+    TRANSACTION_LOG_COMPACT_KEEP: int = int(os.getenv("TRANSACTION_LOG_COMPACT_KEEP", "0"))
+    
+    # 保存先の方式（"json": 上記のファイル, "sqlite": SQLITE_DB_FILE）
+    STORAGE_BACKEND: str = os.getenv("STORAGE_BACKEND", "json").lower()
+    SQLITE_DB_FILE: str = os.getenv("SQLITE_DB_FILE", os.path.join(DATA_DIR, "forex.db"))
     
     # 推論結果保存先
     REAL_DATA_OUTPUT_DIR: str = os.path.join(DATA_DIR, "real_out")
@@ -82,11 +91,19 @@ class Config:
         """データディレクトリが存在しない場合は作成"""
         os.makedirs(cls.DATA_DIR, exist_ok=True)
         
+    @classmethod
+    def get_transaction_log_path(cls) -> str:
+        """推論サブプロセスに渡す取引ログのパス（保存先の方式に合わせる）"""
+        if cls.STORAGE_BACKEND == "sqlite":
+            return cls.SQLITE_DB_FILE
+        return cls.TRANSACTION_LOG_FILE
+        
     @classmethod
     def get_summary(cls) -> dict:
         """設定の概要を取得（機密情報は除く）"""
         return {
             "data_dir": cls.DATA_DIR,
+            "storage_backend": cls.STORAGE_BACKEND,
             "periodic_inference_enabled": cls.PERIODIC_INFERENCE_ENABLED,
             "periodic_inference_interval_hours": cls.PERIODIC_INFERENCE_INTERVAL_HOURS,
             "supported_currencies": cls.SUPPORTED_CURRENCIES,
@@ -10,6 +10,7 @@ from services.trading_service import TradingService
 from services.rate_service import RateService
 from utils.slack_utils import SlackUtils
 from config import Config
+from script.valuation import value_balances
 
 logger = logging.getLogger(__name__)
 
@@ -64,18 +65,13 @@ class BalanceHandler:
         総資産を日本円で計算（非同期版）
         """
         try:
-            total_jpy = 0.0
-            for currency, amount in balance.items():
-                if currency == "JPY":
-                    total_jpy += amount
-                else:
-                    pair = f"{currency}JPY"
-                    rate = await self.rate_service.get_current_rate(pair)
-                    if rate:
-                        total_jpy += amount * rate
-                    else:
-                        logger.warning(f"{pair}のレート取得に失敗しました")
-                        return None
+            # 必要な通貨ペアのレートをまとめて取得し、評価エンジンで一度に換算する
+            pairs = [f"{currency}JPY" for currency, amount in balance.items() if currency != "JPY" and amount]
+            rates = await self.rate_service.get_multiple_rates(pairs) if pairs else {}
+            _, total_jpy = value_balances(balance, rates, "JPY")
+            if total_jpy is None:
+                missing = [pair for pair in pairs if not rates.get(pair)]
+                logger.warning(f"{', '.join(missing)}のレート取得に失敗しました")
             return total_jpy
         except Exception as e:
             logger.error(f"JPY換算計算中にエラー: {e}")
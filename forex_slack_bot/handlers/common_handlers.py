@@ -42,6 +42,7 @@ class CommonHandlers:
             "`/run_inference` - シミュレータ連携AI推論を実行",
             "`/run_analysis` - 取引データの分析実行",
             "`/simulator_status` - シミュレータの状態確認",
+            "`/prompt-profile [実行ID]` - プロンプト生成の所要時間・サイズ・キャッシュ状況を表示",
             "",
             "**💰 取引系コマンド**",
             "`/deal {通貨ペア} {±金額} {レート}` - 取引実行",
@@ -80,8 +80,8 @@ class DealHandler:
                 })
                 return
             
-            # 取引ログを取得
-            transaction_logs = self.trading_service.get_transaction_logs()
+            # 取引ログを取得（表示する最新20件のみ）
+            transaction_logs = self.trading_service.get_transaction_logs(limit=20)
             
             if not transaction_logs:
                 respond({
@@ -213,7 +213,7 @@ class DealHandler:
         lines.append("日時                 | 通貨ペア | 金額      | レート   | 種別")
         lines.append("-" * 60)
         
-        for log in logs[-20:]:  # 最新20件のみ表示
+        for log in logs:  # 新しい順
             timestamp = log.get("timestamp", "")
             pair = log.get("currency_pair", "")
             amount = log.get("amount", 0)
@@ -6,6 +6,8 @@ from config import Config
 import subprocess  # ◀◀◀ subprocess をインポート
 import os          # ◀◀◀ os をインポート
 
+from script.artifact_store import ArtifactStore, load_artifact
+from script.prompt_profile import PROMPT_PROFILE_FILE, format_profile, load_profile
 from services.inference_service import InferenceService
 from services.trading_service import TradingService
 from utils.slack_utils import SlackUtils
@@ -64,7 +66,7 @@ class InferenceHandler:
             command_to_run = [
                 "python",
                 inference_script_path,
-                "--transaction_file", Config.TRANSACTION_LOG_FILE,
+                "--transaction_file", Config.get_transaction_log_path(),
                 "--output_dir", output_dir
             ]
 
@@ -86,11 +88,9 @@ class InferenceHandler:
                 # 成功した場合
                 logger.info(f"Inference script stdout:\n{result.stdout}")
                 
-                # response.txtから結果を読み込む
-                response_file = os.path.join(output_dir, "response.txt")
-                if os.path.exists(response_file):
-                    with open(response_file, 'r', encoding='utf-8') as f:
-                        inference_output = f.read()
+                # 成果物ストア（無ければ従来のresponse.txt）から結果を読み込む
+                inference_output = load_artifact(output_dir, "response.txt")
+                if inference_output is not None:
                     
                     # Slackに結果を通知
                     respond({
@@ -128,6 +128,67 @@ class InferenceHandler:
             with self.inference_service._inference_lock:
                 self.inference_service._inference_running = False
 
+    def handle_prompt_profile(self, respond, command):
+        """
+        /prompt-profile コマンドの処理
+        - 指定した実行（省略時は最新の実行）のプロンプト生成プロファイルを表示します。
+        """
+        run_id = (command.get("text") or "").strip()
+        logger.info(f"handle_prompt_profile called by user {command.get('user_id')}: run_id={run_id or '(latest)'}")
+
+        try:
+            run_dir = self._resolve_profile_run_dir(run_id)
+            profile = load_profile(run_dir) if run_dir else None
+            if profile is None:
+                respond({
+                    "text": f"❌ プロンプト生成プロファイルが見つかりませんでした: {run_id or '最新の実行'}",
+                    "response_type": "ephemeral"
+                })
+                return
+
+            respond({
+                "text": f"⏱️ プロンプト生成プロファイル\n```{format_profile(profile, os.path.basename(run_dir))}```",
+                "response_type": "ephemeral"
+            })
+        except Exception as e:
+            logger.error(f"handle_prompt_profileで予期せぬ例外: {e}", exc_info=True)
+            respond({
+                "text": f"❌ プロファイルの表示中にエラーが発生しました: {str(e)}",
+                "response_type": "ephemeral"
+            })
+
+    def _resolve_profile_run_dir(self, run_id):
+        """
+        プロファイルを表示する実行ディレクトリを決める
+
+        Args:
+            run_id (str): 実行ID（空の場合は最新の実行）
+
+        Returns:
+            str | None: 実行ディレクトリ。見つからない場合はNone
+        """
+        base_dir = Config.REAL_DATA_OUTPUT_DIR
+        if run_id:
+            # 実行IDはディレクトリ名のみ受け付ける
+            if os.path.basename(run_id) != run_id:
+                return None
+            return os.path.join(base_dir, run_id)
+
+        # 成果物ストアのインデックスから最新の実行を探す
+        for run in ArtifactStore(base_dir).list_runs(1):
+            run_dir = os.path.join(base_dir, run["run_id"])
+            if os.path.exists(os.path.join(run_dir, PROMPT_PROFILE_FILE)):
+                return run_dir
+
+        # インデックスに無い場合（レート取得失敗などでプロンプトを保存していない実行）はディレクトリ名の新しい順に探す
+        if not os.path.isdir(base_dir):
+            return None
+        for name in sorted(os.listdir(base_dir), reverse=True):
+            run_dir = os.path.join(base_dir, name)
+            if os.path.exists(os.path.join(run_dir, PROMPT_PROFILE_FILE)):
+                return run_dir
+        return None
+
 # ... ファイルの残りの部分は変更不要 ...
 
 def setup_inference_handlers(app):
@@ -145,4 +206,10 @@ def setup_inference_handlers(app):
         # handle_inference は同期的にサブプロセスを呼び出し、完了を待つ
         inference_handler.handle_inference(respond, command)
 
-    logger.info("実取引推論ハンドラが設定されました (/inference)")
\ No newline at end of file
+    @app.command("/prompt-profile")
+    def handle_prompt_profile_command(ack, respond, command):
+        logger.info(f"/prompt-profileコマンド受信: command={command}")
+        ack()
+        inference_handler.handle_prompt_profile(respond, command)
+
+    logger.info("実取引推論ハンドラが設定されました (/inference, /prompt-profile)")
@@ -4,8 +4,11 @@
 
 from .balance_manager import BalanceManager
 from .transaction_log import TransactionLog
+from .sqlite_backend import SqliteBalanceManager, SqliteTransactionLog
 
 __all__ = [
     "BalanceManager",
-    "TransactionLog"
+    "TransactionLog",
+    "SqliteBalanceManager",
+    "SqliteTransactionLog"
 ]
\ No newline at end of file
@@ -10,6 +10,7 @@ from typing import Dict
 from datetime import datetime
 
 from config import Config
+from script.segment_backup import BACKUP_MANIFEST_FILE, SegmentBackup
 
 logger = logging.getLogger(__name__)
 
@@ -18,6 +19,7 @@ class BalanceManager:
     
     def __init__(self):
         self._lock = threading.Lock()
+        self._backup = SegmentBackup(Config.BALANCE_FILE, self._backup_dir(), keep_count=5)
         self._ensure_data_directory()
         self._ensure_balance_file()
     
@@ -189,54 +191,38 @@ class BalanceManager:
         
         return True
     
+    def _backup_dir(self) -> str:
+        """
+        バックアップの保存先 integrate-slack-simulator/llm_real_transaction/data/balance/past_data
+        """
+        return os.path.abspath(os.path.join(os.path.dirname(Config.BALANCE_FILE), '../../data/balance/past_data'))
+    
     def _create_backup(self):
         """
-        現在の残高ファイルのバックアップを integrate-slack-simulator/llm_real_transaction/data/balance/past_data/{日時}.json に保存
+        書き込み前の残高ファイルをバックアップ（script/segment_backup.py、最新5件まで保持）
         """
         try:
-            if os.path.exists(Config.BALANCE_FILE):
-                backup_dir = os.path.join(os.path.dirname(Config.BALANCE_FILE), '../../data/balance/past_data')
-                backup_dir = os.path.abspath(backup_dir)
-                os.makedirs(backup_dir, exist_ok=True)
-                backup_file = os.path.join(backup_dir, f'{datetime.now().strftime("%Y%m%d_%H%M%S")}.json')
-                with open(Config.BALANCE_FILE, 'r', encoding='utf-8') as src:
-                    with open(backup_file, 'w', encoding='utf-8') as dst:
-                        dst.write(src.read())
-                self._cleanup_old_backups(backup_dir)
+            self._backup.backup()
         except Exception as e:
             logger.warning(f"バックアップ作成中にエラー: {e}")
 
     def _restore_from_backup(self):
         """
-        最新の integrate-slack-simulator/llm_real_transaction/data/balance/past_data/{日時}.json から残高を復元
+        最新のバックアップ（直前の更新の前の状態）から残高を復元
         """
-        backup_dir = os.path.join(os.path.dirname(Config.BALANCE_FILE), '../../data/balance/past_data')
-        backup_dir = os.path.abspath(backup_dir)
+        if self._backup.latest() is not None:
+            self._backup.restore()
+            return
+        # 差分バックアップ導入前の {日時}.json 形式のバックアップ
         import glob
-        backup_files = glob.glob(os.path.join(backup_dir, '*.json'))
+        backup_files = [path for path in glob.glob(os.path.join(self._backup_dir(), '*.json'))
+                        if os.path.basename(path) != BACKUP_MANIFEST_FILE]
         if not backup_files:
             raise FileNotFoundError("バックアップファイルが見つかりません")
         latest_backup = max(backup_files, key=os.path.getmtime)
         with open(latest_backup, 'r', encoding='utf-8') as src:
             with open(Config.BALANCE_FILE, 'w', encoding='utf-8') as dst:
                 dst.write(src.read())
-
-    def _cleanup_old_backups(self, backup_dir, keep_count: int = 5):
-        """
-        古いバックアップファイルを削除（最新5件まで保持）
-        """
-        try:
-            import glob
-            backup_files = glob.glob(os.path.join(backup_dir, '*.json'))
-            if len(backup_files) <= keep_count:
-                return
-            backup_files.sort(key=os.path.getmtime)
-            files_to_delete = backup_files[:-keep_count]
-            for file_path in files_to_delete:
-                os.remove(file_path)
-                logger.debug(f"古いバックアップファイルを削除: {file_path}")
-        except Exception as e:
-            logger.warning(f"バックアップファイル整理中にエラー: {e}")
     
     def _save_balance_history(self, balance: Dict[str, float]):
         """
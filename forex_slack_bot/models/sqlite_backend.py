@@ -0,0 +1,333 @@
+"""
+SQLiteバックエンド - 取引ログ・残高をSQLiteに保存する（STORAGE_BACKEND=sqlite のとき使用）
+
+TransactionLog / BalanceManager と同じメソッドを持ち、検索・集計はファイル全体を読まずに索引で行う。
+_restore_from_backup はバックアップファイルの代わりにデータベース内の書き込み前の状態（undo_journal）から復元する。
+既存のJSONファイルからの移行は script/sqlite_store.py のコマンドで行う。
+"""
+
+import logging
+import threading
+import uuid
+from typing import Dict, List, Optional, Any
+from datetime import datetime, timedelta
+
+from config import Config
+from script.log_export import write_export
+from script.sqlite_store import SqliteBalanceStore, SqliteTransactionStore
+
+logger = logging.getLogger(__name__)
+
+class SqliteTransactionLog:
+    """取引ログ管理クラス（SQLite）"""
+
+    def __init__(self, db_path: Optional[str] = None):
+        self._lock = threading.Lock()
+        Config.create_data_directory()
+        self._store = SqliteTransactionStore(db_path or Config.SQLITE_DB_FILE, journal_keep=10)
+
+    def add_transaction(self, transaction: Dict[str, Any]) -> str:
+        """
+        取引をログに追加
+
+        Args:
+            transaction: 取引データ
+
+        Returns:
+            追加された取引のID
+        """
+        with self._lock:
+            try:
+                transaction_id = str(uuid.uuid4())
+                transaction["id"] = transaction_id
+
+                if "timestamp" not in transaction:
+                    transaction["timestamp"] = datetime.now().isoformat()
+
+                self._store.add(transaction)
+
+                logger.info(f"取引ログを追加しました: {transaction_id}")
+                return transaction_id
+
+            except Exception as e:
+                logger.error(f"取引ログ追加中にエラー: {e}")
+                raise
+
+    def get_logs(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        取引ログを取得（新しい順）
+        """
+        try:
+            return self._store.newest(limit=limit)
+        except Exception as e:
+            logger.error(f"取引ログ取得中にエラー: {e}")
+            return []
+
+    def get_last_transaction(self) -> Optional[Dict[str, Any]]:
+        """
+        最新の取引を取得（取り消し済みは除く）
+        """
+        try:
+            return self._store.last_of_type("取引", exclude_status="取り消し済み")
+        except Exception as e:
+            logger.error(f"最新取引取得中にエラー: {e}")
+            return None
+
+    def get_last_undo_transaction(self) -> Optional[Dict[str, Any]]:
+        """
+        最新の取り消し取引を取得
+        """
+        try:
+            return self._store.last_of_type("取り消し")
+        except Exception as e:
+            logger.error(f"最新取り消し取引取得中にエラー: {e}")
+            return None
+
+    def get_transaction_by_id(self, transaction_id: str) -> Optional[Dict[str, Any]]:
+        """
+        IDで取引を取得
+        """
+        try:
+            return self._store.get(transaction_id)
+        except Exception as e:
+            logger.error(f"取引ID検索中にエラー: {e}")
+            return None
+
+    def mark_transaction_undone(self, transaction_id: str) -> bool:
+        """
+        取引を取り消し済みにマーク
+        """
+        with self._lock:
+            try:
+                updated = self._store.update(transaction_id, {
+                    "status": "取り消し済み",
+                    "undone_at": datetime.now().isoformat()
+                })
+                if not updated:
+                    logger.warning(f"取引ID {transaction_id} が見つかりません")
+                    return False
+                logger.info(f"取引 {transaction_id} を取り消し済みにマークしました")
+                return True
+
+            except Exception as e:
+                logger.error(f"取引マーク中にエラー: {e}")
+                return False
+
+    def get_user_transactions(self, user_id: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        特定ユーザーの取引ログを取得（新しい順）
+        """
+        try:
+            return self._store.newest(limit=limit, user_id=user_id)
+        except Exception as e:
+            logger.error(f"ユーザー取引ログ取得中にエラー: {e}")
+            return []
+
+    def get_statistics(self) -> Dict[str, Any]:
+        """
+        取引統計を取得
+        """
+        try:
+            return self._store.statistics()
+        except Exception as e:
+            logger.error(f"統計取得中にエラー: {e}")
+            return {}
+
+    def get_daily_summary(self, start_date: Optional[str] = None, end_date: Optional[str] = None) -> Dict[str, Dict[str, float]]:
+        """
+        日付ごとの取引件数・取引量を取得
+        """
+        try:
+            return self._store.daily_summary(start_date, end_date)
+        except Exception as e:
+            logger.error(f"日別集計取得中にエラー: {e}")
+            return {}
+
+    def get_pair_summary(self) -> Dict[str, Dict[str, float]]:
+        """
+        通貨ペアごとの取引件数・売買の差引数量・取引量を取得
+        """
+        try:
+            return self._store.pair_summary()
+        except Exception as e:
+            logger.error(f"通貨ペア別集計取得中にエラー: {e}")
+            return {}
+
+    def get_recent_transactions(self, limit: int = 10, hours: int = None) -> List[Dict[str, Any]]:
+        """
+        最近の取引を取得
+
+        Args:
+            limit: 取得する最大件数（デフォルト: 10）
+            hours: 過去何時間以内の取引を取得するか（Noneの場合は全期間）
+
+        Returns:
+            取引リスト（新しい順）
+        """
+        try:
+            since = (datetime.now() - timedelta(hours=hours)).isoformat() if hours is not None else None
+            return self._store.newest(limit=limit, since=since)
+        except Exception as e:
+            logger.error(f"最近の取引取得中にエラー: {e}")
+            return []
+
+    def clear_logs(self) -> bool:
+        """
+        全ての取引ログを削除
+        """
+        with self._lock:
+            try:
+                self._store.clear()
+                logger.info("取引ログをクリアしました")
+                return True
+            except Exception as e:
+                logger.error(f"取引ログクリア中にエラー: {e}")
+                return False
+
+    def export_logs(self, file_path: str, start_date: Optional[str] = None, end_date: Optional[str] = None) -> bool:
+        """
+        取引ログをファイルにエクスポート（タイムスタンプの索引で範囲を引き、1件ずつ書き出す）
+        """
+        try:
+            total_count = self._store.count_range(start_date, end_date)
+            write_export(file_path, self._store.iter_range(start_date, end_date), total_count, start_date, end_date)
+
+            logger.info(f"取引ログを {file_path} にエクスポートしました")
+            return True
+
+        except Exception as e:
+            logger.error(f"取引ログエクスポート中にエラー: {e}")
+            return False
+
+    def _restore_from_backup(self):
+        """
+        直前の書き込み（追加・取り消し済みのマーク・クリア）の前の状態にログを復元
+        """
+        with self._lock:
+            op = self._store.restore_last()
+            logger.info(f"取引ログを直前の書き込み（{op}）の前の状態に復元しました")
+
+
+class SqliteBalanceManager:
+    """残高管理クラス（SQLite）"""
+
+    def __init__(self, db_path: Optional[str] = None):
+        self._lock = threading.Lock()
+        Config.create_data_directory()
+        self._store = SqliteBalanceStore(db_path or Config.SQLITE_DB_FILE, journal_keep=5)
+        if self._store.get() is None:
+            self.update_balance(self._get_initial_balance())
+            logger.info("初期残高を作成しました")
+
+    def get_balance(self) -> Dict[str, float]:
+        """
+        現在の残高を取得
+
+        Returns:
+            通貨別残高の辞書
+        """
+        with self._lock:
+            try:
+                balances = self._store.get()
+                if balances is None:
+                    return self._get_initial_balance()
+
+                # サポート対象通貨が全て含まれているかチェック
+                for currency in Config.SUPPORTED_CURRENCIES:
+                    if currency not in balances:
+                        balances[currency] = Config.INITIAL_BALANCE_JPY if currency == "JPY" else 0.0
+
+                return balances
+
+            except Exception as e:
+                logger.error(f"残高取得中に予期しないエラー: {e}")
+                return self._get_initial_balance()
+
+    def update_balance(self, new_balance: Dict[str, float]) -> bool:
+        """
+        残高を更新（残高と履歴を1つのトランザクションで書き込む）
+
+        Args:
+            new_balance: 新しい残高データ
+
+        Returns:
+            更新成功の場合True
+        """
+        with self._lock:
+            try:
+                if not self._validate_balance_data(new_balance):
+                    logger.error("無効な残高データです")
+                    return False
+
+                self._store.set(new_balance)
+
+                logger.info("残高を正常に更新しました")
+                return True
+
+            except Exception as e:
+                logger.error(f"残高更新中にエラー: {e}")
+                return False
+
+    def get_balance_history(self, limit: int = 10) -> list:
+        """
+        残高変更履歴を取得
+
+        Args:
+            limit: 取得する履歴数の上限
+
+        Returns:
+            残高変更履歴のリスト
+        """
+        try:
+            return self._store.history(limit)
+        except Exception as e:
+            logger.error(f"残高履歴取得中にエラー: {e}")
+            return []
+
+    def reset_to_initial_balance(self) -> bool:
+        """
+        残高を初期状態にリセット
+        """
+        success = self.update_balance(self._get_initial_balance())
+        if success:
+            logger.info("残高を初期状態にリセットしました")
+        else:
+            logger.error("残高リセットに失敗しました")
+        return success
+
+    def _get_initial_balance(self) -> Dict[str, float]:
+        """
+        初期残高を取得
+        """
+        return {
+            currency: Config.INITIAL_BALANCE_JPY if currency == "JPY" else 0.0
+            for currency in Config.SUPPORTED_CURRENCIES
+        }
+
+    def _validate_balance_data(self, balance: Dict[str, float]) -> bool:
+        """
+        残高データの妥当性をチェック
+        """
+        if not isinstance(balance, dict):
+            return False
+
+        for currency, amount in balance.items():
+            if not isinstance(currency, str) or len(currency) != 3:
+                logger.warning(f"無効な通貨コード: {currency}")
+                return False
+            if not isinstance(amount, (int, float)):
+                logger.warning(f"無効な金額: {currency}={amount}")
+                return False
+            if amount < -1000000:  # 極端な負の値は無効
+                logger.warning(f"極端な負の残高: {currency}={amount}")
+                return False
+
+        return True
+
+    def _restore_from_backup(self):
+        """
+        直前の更新の前の状態に残高を復元
+        """
+        with self._lock:
+            self._store.restore_last()
+            logger.info("残高を直前の更新の前の状態に復元しました")
@@ -1,8 +1,16 @@
 """
 取引ログ - 取引ログの読み込み/書き込み
+
+取引ログは追記型のJSON Lines形式（script/jsonl_log.py）で保存し、取引の追加・取り消しのマークは
+ファイル末尾への1行の追記で行う。従来の transaction_log.json は初回起動時に移行する。
+読み込みはメモリ上の索引（StatsLogIndex）経由で行い、ファイルが変更された場合のみ変更部分を読み込む。
+取引統計は索引が追記・更新のたびに差分で更新し、チェックポイントにも保存される。
+一定件数の追記ごとにチェックポイント（script/log_checkpoint.py）を作り、設定されていれば古い取引をアーカイブに移す。
+アーカイブに移した取引は索引には載らないため、全件・ユーザー別・期間指定の読み込みとエクスポートではアーカイブも読む
+（IDによる検索と取り消しの対象はログに残っている取引のみ）。
 """
 
-import json
+import itertools
 import logging
 import os
 import threading
@@ -11,6 +19,16 @@ from typing import Dict, List, Optional, Any
 from datetime import datetime, timedelta
 
 from config import Config
+from script.jsonl_log import (
+    JSONL_OP_KEY, append_records, is_jsonl_log, migrate_legacy_log, read_header, read_recent_records, update_op,
+    write_log
+)
+from script.log_checkpoint import (
+    CHECKPOINT_INTERVAL, StatsLogIndex, base_state, compact_log, iter_archived_records, read_archived_recent,
+    remove_checkpoint, write_checkpoint
+)
+from script.log_export import write_export
+from script.segment_backup import BACKUP_MANIFEST_FILE, SegmentBackup
 
 logger = logging.getLogger(__name__)
 
@@ -19,8 +37,13 @@ class TransactionLog:
     
     def __init__(self):
         self._lock = threading.Lock()
+        self._backup = SegmentBackup(Config.TRANSACTION_LOG_FILE, self._backup_dir(), keep_count=10)
         self._ensure_data_directory()
+        self._migrate_legacy_log()
         self._ensure_log_file()
+        self._index = StatsLogIndex(Config.TRANSACTION_LOG_FILE)
+        self._appended_since_checkpoint = 0
+        self._update_checkpoint()
     
     def add_transaction(self, transaction: Dict[str, Any]) -> str:
         """
@@ -41,14 +64,8 @@ class TransactionLog:
                 if "timestamp" not in transaction:
                     transaction["timestamp"] = datetime.now().isoformat()
                 
-                # 既存のログを読み込み
-                logs = self._load_logs()
-                
-                # 新しい取引を追加
-                logs.append(transaction)
-                
-                # ログファイルに保存
-                self._save_logs(logs)
+                # 新しい取引をログファイルの末尾に追記
+                self._append_entries([transaction])
                 
                 logger.info(f"取引ログを追加しました: {transaction_id}")
                 return transaction_id
@@ -68,14 +85,15 @@ class TransactionLog:
             取引ログのリスト（新しい順）
         """
         try:
-            logs = self._load_logs()
+            if limit:
+                # 件数が決まっている場合は末尾から必要な件数だけ読む
+                return self._read_recent(limit=limit)
+            
+            logs = list(iter_archived_records(Config.TRANSACTION_LOG_FILE)) + self._load_logs()
             
             # 新しい順にソート
             logs.sort(key=lambda x: x.get("timestamp", ""), reverse=True)
             
-            if limit:
-                logs = logs[:limit]
-            
             return logs
             
         except Exception as e:
@@ -87,17 +105,9 @@ class TransactionLog:
         最新の取引を取得
         """
         try:
-            logs = self._load_logs()
-            
-            if not logs:
-                return None
-            
             # 最新の取引を取得（取り消し済みは除く）
-            for log in reversed(logs):
-                if log.get("type") == "取引" and log.get("status") != "取り消し済み":
-                    return log
-            
-            return None
+            log = self._index.refresh().last_of_type("取引", exclude_status="取り消し済み")
+            return dict(log) if log else None
             
         except Exception as e:
             logger.error(f"最新取引取得中にエラー: {e}")
@@ -108,17 +118,9 @@ class TransactionLog:
         最新の取り消し取引を取得
         """
         try:
-            logs = self._load_logs()
-            
-            if not logs:
-                return None
-            
             # 最新の取り消し取引を取得
-            for log in reversed(logs):
-                if log.get("type") == "取り消し":
-                    return log
-            
-            return None
+            log = self._index.refresh().last_of_type("取り消し")
+            return dict(log) if log else None
             
         except Exception as e:
             logger.error(f"最新取り消し取引取得中にエラー: {e}")
@@ -129,13 +131,8 @@ class TransactionLog:
         IDで取引を取得
         """
         try:
-            logs = self._load_logs()
-            
-            for log in logs:
-                if log.get("id") == transaction_id:
-                    return log
-            
-            return None
+            log = self._index.refresh().get(transaction_id)
+            return dict(log) if log else None
             
         except Exception as e:
             logger.error(f"取引ID検索中にエラー: {e}")
@@ -147,18 +144,16 @@ class TransactionLog:
         """
         with self._lock:
             try:
-                logs = self._load_logs()
-                
-                for log in logs:
-                    if log.get("id") == transaction_id:
-                        log["status"] = "取り消し済み"
-                        log["undone_at"] = datetime.now().isoformat()
-                        break
-                else:
+                log = self._index.refresh().get(transaction_id)
+                if log is None:
                     logger.warning(f"取引ID {transaction_id} が見つかりません")
                     return False
                 
-                self._save_logs(logs)
+                # 元の行は書き換えず、更新内容を1行追記する（統計を差分で更新できるよう更新前のステータスも記録）
+                self._append_entries([update_op(transaction_id, {
+                    "status": "取り消し済み",
+                    "undone_at": datetime.now().isoformat()
+                }, previous={"status": log.get("status", "")})])
                 logger.info(f"取引 {transaction_id} を取り消し済みにマークしました")
                 return True
                 
@@ -171,10 +166,10 @@ class TransactionLog:
         特定ユーザーの取引ログを取得
         """
         try:
-            all_logs = self._load_logs()
-            
-            # ユーザーIDでフィルター
-            user_logs = [log for log in all_logs if log.get("user_id") == user_id]
+            # ユーザーIDの索引から取得（件数に満たない場合はアーカイブに移した古い取引も読む）
+            user_logs = [dict(log) for log in self._index.refresh().user_records(user_id)]
+            if not limit or len(user_logs) < limit:
+                user_logs += iter_archived_records(Config.TRANSACTION_LOG_FILE, user_id=user_id)
             
             # 新しい順にソート
             user_logs.sort(key=lambda x: x.get("timestamp", ""), reverse=True)
@@ -190,59 +185,59 @@ class TransactionLog:
     
     def get_statistics(self) -> Dict[str, Any]:
         """
-        取引統計を取得
+        取引統計を取得（追記・更新のたびに更新される集計結果から作る）
         """
         try:
-            logs = self._load_logs()
-            
-            stats = {
-                "total_transactions": 0,
-                "completed_transactions": 0,
-                "undone_transactions": 0,
-                "currency_pairs": set(),
-                "transaction_types": {},
-                "date_range": {
-                    "earliest": None,
-                    "latest": None
-                }
+            stats = self._index.refresh().statistics()
+            
+            return {
+                "total_transactions": stats["count"],
+                "completed_transactions": stats["statuses"].get("完了", 0),
+                "undone_transactions": stats["statuses"].get("取り消し済み", 0),
+                "currency_pairs": list(stats["by_pair"]),
+                "transaction_types": dict(stats["transaction_types"]),
+                "date_range": dict(stats["date_range"])
             }
             
-            for log in logs:
-                stats["total_transactions"] += 1
-                
-                # ステータス別カウント
-                status = log.get("status", "")
-                if status == "完了":
-                    stats["completed_transactions"] += 1
-                elif status == "取り消し済み":
-                    stats["undone_transactions"] += 1
-                
-                # 通貨ペア集計
-                pair = log.get("currency_pair", "")
-                if pair and pair != "":
-                    stats["currency_pairs"].add(pair)
-                
-                # 取引タイプ集計
-                trans_type = log.get("type", "その他")
-                stats["transaction_types"][trans_type] = stats["transaction_types"].get(trans_type, 0) + 1
-                
-                # 日付範囲
-                timestamp = log.get("timestamp")
-                if timestamp:
-                    if stats["date_range"]["earliest"] is None or timestamp < stats["date_range"]["earliest"]:
-                        stats["date_range"]["earliest"] = timestamp
-                    if stats["date_range"]["latest"] is None or timestamp > stats["date_range"]["latest"]:
-                        stats["date_range"]["latest"] = timestamp
-            
-            # setをlistに変換
-            stats["currency_pairs"] = list(stats["currency_pairs"])
-            
-            return stats
-            
         except Exception as e:
             logger.error(f"統計取得中にエラー: {e}")
             return {}
     
+    def get_daily_summary(self, start_date: Optional[str] = None, end_date: Optional[str] = None) -> Dict[str, Dict[str, float]]:
+        """
+        日付ごとの取引件数・取引量を取得
+        
+        Args:
+            start_date: この日付（YYYY-MM-DD）以降のみ
+            end_date: この日付（YYYY-MM-DD）以前のみ
+            
+        Returns:
+            日付 -> {"count", "volume"} の辞書（日付順）
+        """
+        try:
+            by_day = self._index.refresh().statistics()["by_day"]
+            return {
+                day: dict(rollup) for day, rollup in sorted(by_day.items())
+                if (not start_date or day >= start_date) and (not end_date or day <= end_date)
+            }
+        except Exception as e:
+            logger.error(f"日別集計取得中にエラー: {e}")
+            return {}
+    
+    def get_pair_summary(self) -> Dict[str, Dict[str, float]]:
+        """
+        通貨ペアごとの取引件数・売買の差引数量・取引量を取得
+        
+        Returns:
+            通貨ペア -> {"count", "net_amount", "volume"} の辞書
+        """
+        try:
+            by_pair = self._index.refresh().statistics()["by_pair"]
+            return {pair: dict(rollup) for pair, rollup in by_pair.items()}
+        except Exception as e:
+            logger.error(f"通貨ペア別集計取得中にエラー: {e}")
+            return {}
+    
     def get_recent_transactions(self, limit: int = 10, hours: int = None) -> List[Dict[str, Any]]:
         """
         最近の取引を取得
@@ -255,49 +250,64 @@ class TransactionLog:
             取引リスト（新しい順）
         """
         try:
-            logs = self._load_logs()
-            
-            if not logs:
-                return []
-            
-            # 時間範囲でフィルタリング（指定された場合）
+            # 時間範囲（指定された場合）の境界
+            cutoff_iso = None
             if hours is not None:
                 cutoff_time = datetime.now() - timedelta(hours=hours)
                 cutoff_iso = cutoff_time.isoformat()
-                
-                logs = [log for log in logs 
-                       if log.get("timestamp", "") >= cutoff_iso]
             
-            # タイムスタンプで降順ソート（新しい順）
-            logs.sort(key=lambda x: x.get("timestamp", ""), reverse=True)
-            
-            # 指定件数まで取得
-            return logs[:limit]
+            # 末尾から読み、指定件数または時間範囲の外に達したら止める
+            return self._read_recent(limit=limit, since=cutoff_iso)
             
         except Exception as e:
             logger.error(f"最近の取引取得中にエラー: {e}")
             return []
 
+    def _read_recent(self, limit: Optional[int] = None, since: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        新しい順に取引を読み込む
+        
+        タイムスタンプが追記した順に並んでいる場合は末尾から必要な分だけ読み、ログに残っていない分はアーカイブから読む。
+        時刻を指定して追記された取引などで順序が崩れている場合は、全件をタイムスタンプで並べ替える。
+        
+        Args:
+            limit: 取得する最大件数（Noneの場合は制限なし）
+            since: このタイムスタンプ以降の取引のみ（Noneの場合は全期間）
+            
+        Returns:
+            取引リスト（新しい順）
+        """
+        index = self._index.refresh()
+        # アーカイブに移した取引はログに残っている最初の取引より古いことも確かめる
+        archived_latest = base_state(read_header(Config.TRANSACTION_LOG_FILE))["date_range"]["latest"]
+        in_order = index.timestamps_sorted and (
+            not archived_latest or not index.timestamps or archived_latest <= index.timestamps[0]
+        )
+        
+        if in_order:
+            logs = read_recent_records(Config.TRANSACTION_LOG_FILE, limit=limit, since=since)
+            if not limit or len(logs) < limit:
+                logs += read_archived_recent(
+                    Config.TRANSACTION_LOG_FILE, limit=limit - len(logs) if limit else None, since=since
+                )
+        else:
+            logs = [
+                log for log in itertools.chain(iter_archived_records(Config.TRANSACTION_LOG_FILE), self._load_logs())
+                if since is None or log.get("timestamp", "") >= since
+            ]
+        
+        # タイムスタンプで降順ソート（新しい順）
+        logs.sort(key=lambda x: x.get("timestamp", ""), reverse=True)
+        return logs[:limit] if limit else logs
+
     def _load_logs(self) -> List[Dict[str, Any]]:
         """
-        ログファイルからデータを読み込み
+        ログファイルからデータを読み込み（索引のレコードの複製を返す）
         """
         try:
-            if not os.path.exists(Config.TRANSACTION_LOG_FILE):
-                return []
-            
-            with open(Config.TRANSACTION_LOG_FILE, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            
-            if isinstance(data, dict) and "transactions" in data:
-                return data["transactions"]
-            elif isinstance(data, list):
-                return data
-            else:
-                logger.warning("取引ログファイルの形式が無効です")
-                return []
+            return [dict(log) for log in self._index.refresh().records]
                 
-        except json.JSONDecodeError as e:
+        except ValueError as e:
             logger.error(f"取引ログファイルのJSON解析エラー: {e}")
             return []
         except Exception as e:
@@ -306,26 +316,70 @@ class TransactionLog:
     
     def _save_logs(self, logs: List[Dict[str, Any]]):
         """
-        ログファイルにデータを保存
+        ログファイルをデータで作り直す（クリア・形式の変換時のみ）
         """
         try:
             # バックアップを作成
             self._create_backup()
             
-            log_data = {
-                "transactions": logs,
-                "last_updated": datetime.now().isoformat(),
-                "version": "1.0",
-                "total_count": len(logs)
-            }
-            
-            with open(Config.TRANSACTION_LOG_FILE, 'w', encoding='utf-8') as f:
-                json.dump(log_data, f, indent=2, ensure_ascii=False)
+            write_log(Config.TRANSACTION_LOG_FILE, logs)
+            # 作り直したログには以前のチェックポイントは使えない
+            remove_checkpoint(Config.TRANSACTION_LOG_FILE)
             
         except Exception as e:
             logger.error(f"取引ログ保存中にエラー: {e}")
             raise
     
+    def _append_entries(self, entries: List[Dict[str, Any]]):
+        """
+        ログファイルの末尾に行を追記（ファイル全体は読み書きしない）
+        """
+        # 従来形式のバックアップから復元された場合などは、追記する前に追記型に変換する
+        if not is_jsonl_log(Config.TRANSACTION_LOG_FILE):
+            self._save_logs(self._load_logs())
+        
+        # バックアップを作成（前回のバックアップ以降に追記された部分だけを保存）
+        self._create_backup(append=True)
+        
+        append_records(Config.TRANSACTION_LOG_FILE, entries)
+        
+        # 追記した行だけを索引に反映
+        self._index.refresh()
+        
+        self._appended_since_checkpoint += sum(1 for entry in entries if JSONL_OP_KEY not in entry)
+        if self._appended_since_checkpoint >= CHECKPOINT_INTERVAL:
+            self._update_checkpoint()
+    
+    def _update_checkpoint(self):
+        """
+        チェックポイントを更新し、設定されていれば古い取引をアーカイブに移す
+        """
+        try:
+            if not is_jsonl_log(Config.TRANSACTION_LOG_FILE):
+                return
+            keep = Config.TRANSACTION_LOG_COMPACT_KEEP
+            if keep > 0 and len(self._index.refresh().records) >= keep + CHECKPOINT_INTERVAL:
+                archive_path = compact_log(Config.TRANSACTION_LOG_FILE, keep)
+                logger.info(f"古い取引ログをアーカイブに移しました: {archive_path}")
+            else:
+                write_checkpoint(Config.TRANSACTION_LOG_FILE)
+            self._appended_since_checkpoint = 0
+        except Exception as e:
+            logger.warning(f"取引ログのチェックポイント作成中にエラー: {e}")
+    
+    def _migrate_legacy_log(self):
+        """
+        従来形式のログ（transaction_log.json）を追記型に移行
+        """
+        try:
+            migrated = migrate_legacy_log(Config.LEGACY_TRANSACTION_LOG_FILE, Config.TRANSACTION_LOG_FILE)
+            if migrated is not None:
+                remove_checkpoint(Config.TRANSACTION_LOG_FILE)
+                logger.info(f"従来形式の取引ログを移行しました: {migrated}件 -> {Config.TRANSACTION_LOG_FILE}")
+        except Exception as e:
+            logger.error(f"取引ログの移行中にエラー: {e}")
+            raise
+    
     def _ensure_data_directory(self):
         """
         データディレクトリの存在を確認・作成
@@ -337,57 +391,49 @@ class TransactionLog:
         ログファイルの存在を確認・作成
         """
         if not os.path.exists(Config.TRANSACTION_LOG_FILE):
-            self._save_logs([])
+            write_log(Config.TRANSACTION_LOG_FILE, [])
+            remove_checkpoint(Config.TRANSACTION_LOG_FILE)
             logger.info("取引ログファイルを作成しました")
     
-    def _create_backup(self):
+    def _backup_dir(self) -> str:
+        """
+        バックアップの保存先 integrate-slack-simulator/llm_real_transaction/data/log/past_data
+        """
+        return os.path.abspath(os.path.join(os.path.dirname(Config.TRANSACTION_LOG_FILE), '../../data/log/past_data'))
+    
+    def _create_backup(self, append: bool = False):
         """
-        現在のログファイルのバックアップを integrate-slack-simulator/llm_real_transaction/data/log/past_data/{日時}.json に保存
+        書き込み前のログファイルを差分バックアップ（script/segment_backup.py）に保存
+        
+        Args:
+            append: 直後の書き込みが追記の場合True
         """
         try:
-            if os.path.exists(Config.TRANSACTION_LOG_FILE):
-                backup_dir = os.path.join(os.path.dirname(Config.TRANSACTION_LOG_FILE), '../../data/log/past_data')
-                backup_dir = os.path.abspath(backup_dir)
-                os.makedirs(backup_dir, exist_ok=True)
-                backup_file = os.path.join(backup_dir, f'{datetime.now().strftime("%Y%m%d_%H%M%S")}.json')
-                with open(Config.TRANSACTION_LOG_FILE, 'r', encoding='utf-8') as src:
-                    with open(backup_file, 'w', encoding='utf-8') as dst:
-                        dst.write(src.read())
-                self._cleanup_old_backups(backup_dir)
+            self._backup.backup(append=append)
         except Exception as e:
             logger.warning(f"ログバックアップ作成中にエラー: {e}")
 
     def _restore_from_backup(self):
         """
-        最新の integrate-slack-simulator/llm_real_transaction/data/log/past_data/{日時}.json からログを復元
+        最新のバックアップ（直前の書き込みの前の状態）からログを復元
+        
+        復元で短くなったログに以前のチェックポイントは使えないため削除する（次回の更新で作り直す）。
         """
-        backup_dir = os.path.join(os.path.dirname(Config.TRANSACTION_LOG_FILE), '../../data/log/past_data')
-        backup_dir = os.path.abspath(backup_dir)
+        if self._backup.latest() is not None:
+            self._backup.restore()
+            remove_checkpoint(Config.TRANSACTION_LOG_FILE)
+            return
+        # 差分バックアップ導入前の {日時}.json 形式のバックアップ
         import glob
-        backup_files = glob.glob(os.path.join(backup_dir, '*.json'))
+        backup_files = [path for path in glob.glob(os.path.join(self._backup_dir(), '*.json'))
+                        if os.path.basename(path) != BACKUP_MANIFEST_FILE]
         if not backup_files:
             raise FileNotFoundError("ログバックアップファイルが見つかりません")
         latest_backup = max(backup_files, key=os.path.getmtime)
         with open(latest_backup, 'r', encoding='utf-8') as src:
             with open(Config.TRANSACTION_LOG_FILE, 'w', encoding='utf-8') as dst:
                 dst.write(src.read())
-
-    def _cleanup_old_backups(self, backup_dir, keep_count: int = 10):
-        """
-        古いログバックアップファイルを削除（最新10件まで保持）
-        """
-        try:
-            import glob
-            backup_files = glob.glob(os.path.join(backup_dir, '*.json'))
-            if len(backup_files) <= keep_count:
-                return
-            backup_files.sort(key=os.path.getmtime)
-            files_to_delete = backup_files[:-keep_count]
-            for file_path in files_to_delete:
-                os.remove(file_path)
-                logger.debug(f"古いログバックアップファイルを削除: {file_path}")
-        except Exception as e:
-            logger.warning(f"ログバックアップファイル整理中にエラー: {e}")
+        remove_checkpoint(Config.TRANSACTION_LOG_FILE)
     
     def clear_logs(self) -> bool:
         """
@@ -395,10 +441,7 @@ class TransactionLog:
         """
         with self._lock:
             try:
-                # バックアップを作成
-                self._create_backup()
-                
-                # ログをクリア
+                # ログをクリア（バックアップを作成してから空のログに作り直す）
                 self._save_logs([])
                 
                 logger.info("取引ログをクリアしました")
@@ -411,38 +454,21 @@ class TransactionLog:
     def export_logs(self, file_path: str, start_date: Optional[str] = None, end_date: Optional[str] = None) -> bool:
         """
         取引ログをファイルにエクスポート
+        
+        期間の境界はタイムスタンプの索引を二分探索して求め、取引を1件ずつ書き出す。
+        形式はファイル名の拡張子で決まる（.json / .jsonl / .csv、.gz を付けると圧縮）。
         """
         try:
-            logs = self._load_logs()
-            
-            # 日付でフィルター
-            if start_date or end_date:
-                filtered_logs = []
-                for log in logs:
-                    timestamp = log.get("timestamp", "")
-                    if start_date and timestamp < start_date:
-                        continue
-                    if end_date and timestamp > end_date:
-                        continue
-                    filtered_logs.append(log)
-                logs = filtered_logs
-            
-            export_data = {
-                "exported_at": datetime.now().isoformat(),
-                "date_range": {
-                    "start": start_date,
-                    "end": end_date
-                },
-                "total_count": len(logs),
-                "transactions": logs
-            }
-            
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(export_data, f, indent=2, ensure_ascii=False)
+            with self._lock:
+                total_count, logs = self._index.refresh().range_records(start_date, end_date)
+                # アーカイブに移した取引は件数を数えてから、ログの取引の前に1件ずつ書き出す
+                archived_count = sum(1 for _ in iter_archived_records(Config.TRANSACTION_LOG_FILE, start_date, end_date))
+                archived = iter_archived_records(Config.TRANSACTION_LOG_FILE, start_date, end_date)
+                write_export(file_path, itertools.chain(archived, logs), archived_count + total_count, start_date, end_date)
             
             logger.info(f"取引ログを {file_path} にエクスポートしました")
             return True
             
         except Exception as e:
             logger.error(f"取引ログエクスポート中にエラー: {e}")
-            return False
\ No newline at end of file
+            return False
@@ -6,6 +6,7 @@ import os         # ◀◀◀ インポート
 from datetime import datetime
 from config import Config
 from utils.slack_utils import SlackUtils
+from script.artifact_store import load_artifact
 
 logger = logging.getLogger(__name__)
 
@@ -38,7 +39,7 @@ class PeriodicInference:
             command_to_run = [
                 "python",
                 inference_script_path,
-                "--transaction_file", Config.TRANSACTION_LOG_FILE,
+                "--transaction_file", Config.get_transaction_log_path(),
                 "--output_dir", output_dir
             ]
             
@@ -55,10 +56,9 @@ class PeriodicInference:
 
             if result.returncode == 0:
                 logger.info("定期推論が正常に完了しました。")
-                response_file = os.path.join(output_dir, "response.txt")
-                if os.path.exists(response_file):
-                    with open(response_file, 'r', encoding='utf-8') as f:
-                        inference_output = f.read()
+                # 成果物ストア（無ければ従来のresponse.txt）から結果を読み込む
+                inference_output = load_artifact(output_dir, "response.txt")
+                if inference_output is not None:
                     
                     # Slackに通知
                     self.slack_utils.client.chat_postMessage(
@@ -13,6 +13,7 @@ from services.trading_service import TradingService
 from services.rate_service import RateService
 from utils.slack_utils import SlackUtils
 from config import Config
+from script.valuation import value_balances
 
 logger = logging.getLogger(__name__)
 
@@ -139,18 +140,15 @@ class PeriodicInference:
         # 現在の残高情報
         if result.get("current_balance"):
             formatted_text.append("💰 現在のポートフォリオ:")
-            total_jpy = 0
             for currency, amount in result["current_balance"].items():
                 formatted_text.append(f"  {currency}: {amount:,.2f}")
-                # JPY換算（概算）
-                if currency == "JPY":
-                    total_jpy += amount
-                elif currency == "USD":
-                    total_jpy += amount * result.get("market_data", {}).get("rates", {}).get("USDJPY", 150)
-                elif currency == "EUR":
-                    total_jpy += amount * result.get("market_data", {}).get("rates", {}).get("EURJPY", 160)
-            
-            formatted_text.append(f"  総価値（概算）: ¥{total_jpy:,.2f}")
+            # JPY換算（市場スナップショットのレートで評価し、固定値では補わない）
+            rates = result.get("market_data", {}).get("rates", {})
+            _, total_jpy = value_balances(result["current_balance"], rates, "JPY")
+            if total_jpy is None:
+                formatted_text.append("  総価値: 算出できません（レートなし）")
+            else:
+                formatted_text.append(f"  総価値: ¥{total_jpy:,.2f}")
             formatted_text.append("")
         
         # 市場分析
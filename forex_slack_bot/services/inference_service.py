@@ -13,6 +13,7 @@ import datetime as dt
 
 from config import Config
 from services.rate_service import RateService
+from script.handle_transaction_log import load_transaction_log_from_file
 
 logger = logging.getLogger(__name__)
 
@@ -97,10 +98,16 @@ class InferenceService:
     
     async def _fetch_market_data(self) -> Dict[str, Any]:
         """
-        市場データを取得（API呼び出しやrate_serviceを使わず、既に取得済みのデータを返す）
+        市場データを取得（API呼び出しをせず、推論サイクルで取得済みの市場スナップショットを返す）
         """
-        # ここではダミーの空データを返すか、必要に応じて外部からセットされたデータを返すようにする
-        # 実際のprompt作成時にデータが取得されている前提
+        # prompt作成時に取得したスナップショットがあれば同じレートを使う（無ければ空データ）
+        snapshot = self.rate_service.get_snapshot()
+        if snapshot is not None:
+            return {
+                "timestamp": snapshot.timestamp.isoformat(),
+                "rates": dict(snapshot.market_rates),
+                "trends": {}
+            }
         return {
             "timestamp": datetime.now().isoformat(),
             "rates": {},
@@ -237,16 +244,9 @@ class InferenceService:
             analysis_lines.append("")
             
             # 取引履歴ファイルの簡易チェック
-            transaction_log = os.path.join(os.path.dirname(__file__), '..', 'data', 'transaction_log.json')
+            transaction_log = Config.get_transaction_log_path()
             if os.path.exists(transaction_log):
-                import json
-                
-                transaction_count = 0
-                with open(transaction_log, 'r', encoding='utf-8') as f:
-                    for line in f:
-                        line = line.strip()
-                        if line:
-                            transaction_count += 1
+                transaction_count = load_transaction_log_from_file(transaction_log)["total_count"]
                 
                 analysis_lines.append(f"総取引記録件数: {transaction_count}")
             else:
@@ -8,8 +8,10 @@ import aiohttp
 from datetime import datetime, timedelta
 from typing import Dict, Optional, List, Any
 import json
+import os
 
 from config import Config
+from script.market_snapshot import MARKET_SNAPSHOT_FILE, load_snapshot
 
 logger = logging.getLogger(__name__)
 
@@ -20,6 +22,18 @@ class RateService:
         self._rate_cache = {}
         self._cache_expiry = {}
         self._cache_duration_minutes = 5  # キャッシュ有効期間
+        self._snapshot = None  # 推論サイクルで取得した市場スナップショット
+        self._snapshot_path = os.path.join(Config.REAL_DATA_OUTPUT_DIR, MARKET_SNAPSHOT_FILE)
+        self._snapshot_mtime = None
+    
+    def set_snapshot(self, snapshot):
+        """
+        推論サイクルで取得した市場スナップショットを使うように設定する
+        
+        Args:
+            snapshot: MarketSnapshot
+        """
+        self._snapshot = snapshot
         
     async def get_current_rate(self, currency_pair: str) -> Optional[float]:
         """
@@ -37,6 +51,11 @@ class RateService:
             if cached_rate is not None:
                 return cached_rate
             
+            # 推論サイクルの市場スナップショットが新しければ、同じレートを使う
+            snapshot_rate = self._get_snapshot_rate(currency_pair)
+            if snapshot_rate is not None:
+                return snapshot_rate
+            
             # 外部APIからレートを取得
             rate = await self._fetch_rate_from_api(currency_pair)
             
@@ -118,6 +137,33 @@ class RateService:
         
         return results
     
+    def get_snapshot(self):
+        """
+        有効期間内の市場スナップショットを取得
+        （推論が保存した最新のスナップショットの方が新しければそちらを読み込む）
+        
+        Returns:
+            MarketSnapshot | None: スナップショット。無い・古い場合はNone
+        """
+        if os.path.exists(self._snapshot_path):
+            mtime = os.path.getmtime(self._snapshot_path)
+            if mtime != self._snapshot_mtime:
+                snapshot = load_snapshot(self._snapshot_path)
+                self._snapshot_mtime = mtime
+                if snapshot is not None and (self._snapshot is None or snapshot.fetched_at > self._snapshot.fetched_at):
+                    self._snapshot = snapshot
+        
+        if self._snapshot is None or self._snapshot.age_seconds() > self._cache_duration_minutes * 60:
+            return None
+        return self._snapshot
+    
+    def _get_snapshot_rate(self, currency_pair: str) -> Optional[float]:
+        """
+        有効期間内の市場スナップショットから通貨ペアのレートを取得
+        """
+        snapshot = self.get_snapshot()
+        return snapshot.rate(currency_pair) if snapshot is not None else None
+    
     def _get_cached_rate(self, currency_pair: str) -> Optional[float]:
         """
         キャッシュからレートを取得
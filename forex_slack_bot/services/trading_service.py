@@ -8,6 +8,7 @@ from typing import Dict, List, Optional, Any
 
 from models.balance_manager import BalanceManager
 from models.transaction_log import TransactionLog
+from models.sqlite_backend import SqliteBalanceManager, SqliteTransactionLog
 from config import Config
 
 logger = logging.getLogger(__name__)
@@ -16,8 +17,12 @@ class TradingService:
     """取引実行サービス"""
     
     def __init__(self):
-        self.balance_manager = BalanceManager()
-        self.transaction_log = TransactionLog()
+        if Config.STORAGE_BACKEND == "sqlite":
+            self.balance_manager = SqliteBalanceManager()
+            self.transaction_log = SqliteTransactionLog()
+        else:
+            self.balance_manager = BalanceManager()
+            self.transaction_log = TransactionLog()
         
     def get_current_balance(self) -> Dict[str, float]:
         """
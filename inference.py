@@ -11,10 +11,14 @@ from script.portfolio import Portfolio
 from script.create_prompt import create_prompt
 from script._gemma import load_model, run_inference_with_loaded_model
 from script.handle_transaction_log import calculate_assets_from_file
+from script.artifact_store import ArtifactStore
 import argparse
 
 portfolio = None
 
+# プロンプト・レスポンスを圧縮したコンテンツアドレス形式で保存する（Falseの場合は従来の平文ファイル）
+USE_ARTIFACT_STORE = True
+
 def printgreen(text):
     """緑色でテキストを表示"""
     print(f"\033[92m{text}\033[0m")
@@ -53,16 +57,28 @@ def run_inference(start: dt.datetime, current_assets: dict, transaction_file: st
     
     # プロンプト生成
     printgreen("[STEP2]create_prompt")
-    prompt, pair_current_rates = create_prompt(current_time_utc, symbols, portfolio, currencies=None, transaction_file=transaction_file)
-    if pair_current_rates is None:
+    # プロンプトのトークン数はロード済みプロセッサーのトークナイザーで数え、実行ディレクトリに記録する
+    # レート・テクニカル指標はcreate_prompt内で1回だけ取得し、そのスナップショットを全体で共有する
+    prompt, snapshot = create_prompt(
+        current_time_utc, symbols, portfolio, transaction_file=transaction_file,
+        processor=processor, output_dir=output_dir
+    )
+    if snapshot is None:
         printgreen("レート取得に失敗したため、推論をスキップします。")
         # ★ 失敗した場合はNoneを返すように統一
         return None
 
-    # プロンプト保存
-    prompt_path = os.path.join(output_dir, "prompt.txt")
-    with open(prompt_path, "w", encoding="utf-8") as f:
-        f.write(prompt)
+    # このサイクルのスナップショットを保存（Slack Botのレート参照も同じ値を使う）
+    snapshot.publish(output_dir)
+
+    # プロンプト保存（ストアではセクションごとのチャンクに分けて重複を除く）
+    store = ArtifactStore.for_run_dir(output_dir) if USE_ARTIFACT_STORE else None
+    if store is not None:
+        store.save_artifact(output_dir, "prompt.txt", prompt, chunked=True)
+    else:
+        prompt_path = os.path.join(output_dir, "prompt.txt")
+        with open(prompt_path, "w", encoding="utf-8") as f:
+            f.write(prompt)
 
     # 推論実行
     printgreen("[STEP3] Inference with loaded model")
@@ -70,7 +86,7 @@ def run_inference(start: dt.datetime, current_assets: dict, transaction_file: st
         model, 
         processor, 
         prompt, 
-        os.path.join(output_dir, "response.txt")
+        None if store is not None else os.path.join(output_dir, "response.txt")
     )
 
     # 戻り値のチェック
@@ -80,6 +96,9 @@ def run_inference(start: dt.datetime, current_assets: dict, transaction_file: st
         return None
 
     response, saved_path = response_data
+    if store is not None and response is not None:
+        store.save_artifact(output_dir, "response.txt", response)
+        saved_path = os.path.join(output_dir, "manifest.json")
     
     if response is not None:
         print(f"生成されたレスポンス: {response[:100]}...")  # 先頭部分を表示
@@ -113,7 +132,7 @@ def run_inference(start: dt.datetime, current_assets: dict, transaction_file: st
 if __name__ == "__main__":
 
     parser = argparse.ArgumentParser(description="Run forex simulation.")
-    parser.add_argument("--transaction_file", type=str, default="data/log/transaction_log.json", help="Path to the transaction file")
+    parser.add_argument("--transaction_file", type=str, default="data/log/transaction_log.jsonl", help="Path to the transaction file")
     parser.add_argument("--output_dir", type=str, default=None, help="Output directory for logs and results")
     args = parser.parse_args()
 
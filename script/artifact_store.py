@@ -0,0 +1,256 @@
+"""
+成果物ストア - 推論の入出力（prompt.txt / response.txt）を圧縮したコンテンツアドレス形式で保存する
+
+data/real_out/
+    objects/<sha256の先頭2文字>/<残り>   zlib圧縮したブロブ（内容のSHA-256で命名、同じ内容は1回だけ保存）
+    index.jsonl                          全実行の成果物の一覧（追記のみ）
+    <実行ID>/manifest.json               実行ごとのマニフェスト（成果物名 -> ブロブのリスト）
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import zlib
+from datetime import datetime
+
+# ストア設定
+ARTIFACT_OBJECTS_DIR = "objects"
+ARTIFACT_INDEX_FILE = "index.jsonl"
+ARTIFACT_MANIFEST_FILE = "manifest.json"
+ARTIFACT_COMPRESSION_LEVEL = 6
+
+# プロンプトを分割する区切り行（"====" の行の直後で区切り、セクション単位で重複を除く）
+_CHUNK_BOUNDARY = re.compile(r"(?m)^={20,}\n")
+
+
+def split_chunks(text):
+    """
+    テキストを区切り行（"=" だけの行）の直後で分割する
+
+    連続するプロンプトで変わらないセクション（日足・質問文など）が同じブロブになるようにする。
+
+    Args:
+        text (str): 対象テキスト
+
+    Returns:
+        list: チャンクのリスト（結合すると元のテキストに戻る）
+    """
+    chunks = []
+    start = 0
+    for m in _CHUNK_BOUNDARY.finditer(text):
+        if m.end() > start:
+            chunks.append(text[start:m.end()])
+            start = m.end()
+    if start < len(text) or not chunks:
+        chunks.append(text[start:])
+    return chunks
+
+
+class ArtifactStore:
+    """
+    圧縮・コンテンツアドレス形式の成果物ストア
+
+    実行ディレクトリにはマニフェストだけを置き、本体は objects/ 以下のブロブとして共有する。
+    """
+
+    def __init__(self, root):
+        """
+        Args:
+            root (str): ストアのルートディレクトリ（data/real_out）
+        """
+        self.root = os.path.abspath(root)
+        self.objects_dir = os.path.join(self.root, ARTIFACT_OBJECTS_DIR)
+        self.index_path = os.path.join(self.root, ARTIFACT_INDEX_FILE)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_run_dir(cls, run_dir):
+        """実行ディレクトリ（data/real_out/<実行ID>）の親をルートとするストアを返す"""
+        return cls(os.path.dirname(os.path.abspath(run_dir)))
+
+    def _blob_path(self, sha):
+        return os.path.join(self.objects_dir, sha[:2], sha[2:])
+
+    def put_blob(self, data):
+        """
+        ブロブを保存する（同じ内容が既にあれば何もしない）
+
+        Args:
+            data (bytes): 保存する内容
+
+        Returns:
+            tuple: (SHA-256, 圧縮後のサイズ。既存の場合は0)
+        """
+        sha = hashlib.sha256(data).hexdigest()
+        path = self._blob_path(sha)
+        if os.path.exists(path):
+            return sha, 0
+
+        compressed = zlib.compress(data, ARTIFACT_COMPRESSION_LEVEL)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(compressed)
+        os.replace(tmp_path, path)
+        return sha, len(compressed)
+
+    def get_blob(self, sha):
+        """
+        ブロブを読み込む
+
+        Args:
+            sha (str): ブロブのSHA-256
+
+        Returns:
+            bytes: 内容
+        """
+        with open(self._blob_path(sha), 'rb') as f:
+            return zlib.decompress(f.read())
+
+    def save_artifact(self, run_dir, name, text, chunked=False, meta=None):
+        """
+        成果物を保存し、実行のマニフェストとインデックスに記録する
+
+        Args:
+            run_dir (str): 実行ディレクトリ
+            name (str): 成果物名（例: "prompt.txt"）
+            text (str): 内容
+            chunked (bool): Trueの場合は区切り行ごとのチャンクに分けて保存する
+            meta (dict): インデックスに一緒に記録する情報
+
+        Returns:
+            dict: マニフェストに記録した成果物の情報
+        """
+        data = text.encode("utf-8")
+        chunks = split_chunks(text) if chunked else [text]
+
+        blobs = []
+        stored_size = 0
+        for chunk in chunks:
+            sha, size = self.put_blob(chunk.encode("utf-8"))
+            blobs.append(sha)
+            stored_size += size
+
+        entry = {
+            "sha256": hashlib.sha256(data).hexdigest(),
+            "size": len(data),
+            "stored_size": stored_size,
+            "blobs": blobs,
+        }
+
+        run_id = os.path.basename(os.path.abspath(run_dir))
+        created_at = datetime.now().isoformat()
+        with self._lock:
+            manifest = read_manifest(run_dir) or {"run_id": run_id, "created_at": created_at, "artifacts": {}}
+            manifest["artifacts"][name] = entry
+            os.makedirs(run_dir, exist_ok=True)
+            manifest_path = os.path.join(run_dir, ARTIFACT_MANIFEST_FILE)
+            tmp_path = manifest_path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, indent=2, ensure_ascii=False)
+            os.replace(tmp_path, manifest_path)
+
+            record = {
+                "run_id": run_id,
+                "artifact": name,
+                "created_at": created_at,
+                "sha256": entry["sha256"],
+                "size": entry["size"],
+                "stored_size": stored_size,
+                **(meta or {}),
+            }
+            os.makedirs(self.root, exist_ok=True)
+            with open(self.index_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+        return entry
+
+    def load_artifact(self, run_dir, name):
+        """
+        マニフェストから成果物を復元する
+
+        Args:
+            run_dir (str): 実行ディレクトリ
+            name (str): 成果物名
+
+        Returns:
+            str | None: 内容。マニフェストに無い場合はNone
+        """
+        manifest = read_manifest(run_dir)
+        if not manifest or name not in manifest.get("artifacts", {}):
+            return None
+        return "".join(self.get_blob(sha).decode("utf-8") for sha in manifest["artifacts"][name]["blobs"])
+
+    def list_runs(self, limit=None):
+        """
+        インデックスから実行の一覧を新しい順に返す（ディレクトリを走査しない）
+
+        Args:
+            limit (int): 返す最大件数
+
+        Returns:
+            list: {"run_id", "created_at", "artifacts": {成果物名: インデックスの記録}} のリスト
+        """
+        runs = {}
+        if os.path.exists(self.index_path):
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # 書き込み途中で中断された行は無視する
+                        continue
+                    run = runs.setdefault(record["run_id"], {
+                        "run_id": record["run_id"],
+                        "created_at": record.get("created_at"),
+                        "artifacts": {}
+                    })
+                    run["artifacts"][record["artifact"]] = record
+
+        ordered = sorted(runs.values(), key=lambda r: r["created_at"] or "", reverse=True)
+        return ordered[:limit] if limit else ordered
+
+
+def read_manifest(run_dir):
+    """
+    実行ディレクトリのマニフェストを読み込む
+
+    Args:
+        run_dir (str): 実行ディレクトリ
+
+    Returns:
+        dict | None: マニフェスト。無い場合はNone
+    """
+    path = os.path.join(run_dir, ARTIFACT_MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (json.JSONDecodeError, OSError) as e:
+        print(f"マニフェストの読み込みエラー ({path}): {e}")
+        return None
+
+
+def load_artifact(run_dir, name):
+    """
+    実行ディレクトリの成果物を読み込む（ストアに無ければ従来の平文ファイルを読む）
+
+    Args:
+        run_dir (str): 実行ディレクトリ
+        name (str): 成果物名（例: "response.txt"）
+
+    Returns:
+        str | None: 内容。どちらにも無い場合はNone
+    """
+    text = ArtifactStore.for_run_dir(run_dir).load_artifact(run_dir, name)
+    if text is not None:
+        return text
+
+    path = os.path.join(run_dir, name)
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read()
+    return None
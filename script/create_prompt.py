@@ -6,13 +6,35 @@ import json
 import os
 import requests
 # こちらに変更
-from script.fetch import fetch_forex_technicals_with_news
-from script.handle_transaction_log import print_asset_summary
+from script.fetch import fetch_news_bundle, get_news_matcher
+from script.news_store import get_news_store
+from script.news_async import NEWS_FETCH_DEADLINE_SECONDS
+from script.handle_transaction_log import load_transaction_log_from_file, build_asset_summary, build_history_lines
+from script.prompt_builder import PromptBuilder, render, template_id, TECHNICALS_SEPARATOR
+from script.section_cache import SectionCache, hash_inputs
+from script.prompt_profile import start_profile
+from script.market_snapshot import take_market_snapshot
+from script.prompt_budget import TokenCounter, BudgetedSection, fit_sections, save_token_report, PROMPT_TOKEN_BUDGET
 # ニュース取得設定
 NEWS_HOURS_BACK = 12  # 過去何時間のニュースを取得するか
 NEWS_API_LIMIT = 10   # API から取得する最大件数
 NEWS_DISPLAY_LIMIT = 5  # プロンプトに表示する最大件数（個別通貨・通貨ペア用）
 NEWS_COMBINED_LIMIT = 5  # プロンプトに表示する最大件数（統合セクション用）
+NEWS_USE_STORE = True  # ローカルのニュースストアを使い、前回取得以降の記事だけをAPIから取得する
+NEWS_FETCH_STRATEGY = "union"  # "union": 和集合で1回取得 / "fanout": 通貨ペア・通貨ごとに並行取得
+NEWS_MISSING_NOTE = "ニュース取得失敗（時間内に応答なし）"  # 期限内に取得できなかったセクションの表記
+
+# トークン予算を超えた場合の削減段階（段階0が全文）
+TECHNICALS_TRIM_LEVELS = [(None, None), (6, 5), (4, 3), (3, 2), (2, 1)]  # (時間足の本数, 日足の本数)
+NEWS_TRIM_LEVELS = [  # (個別通貨・通貨ペアの件数, 統合セクションの件数, 要約の最大文字数。0は見出しのみ)
+    (NEWS_DISPLAY_LIMIT, NEWS_COMBINED_LIMIT, None),
+    (NEWS_DISPLAY_LIMIT, NEWS_COMBINED_LIMIT, 160),
+    (3, 3, 80),
+    (3, 3, 0),
+    (1, 1, 0),
+]
+HISTORY_TRIM_LEVELS = [None, 50, 20, 10, 5, 0]  # 取引ログ詳細に表示する直近の取引数
+PROMPT_REUSE_SECTIONS = True  # 入力が前回と同じセクションは前回の描画結果を再利用する
 
 # global 
 # symbol, latest_6, latest_3d, latest_macd, latest_signal = None, None, None, None, None, None, None
@@ -49,139 +71,129 @@ def extract_currencies_from_symbol(symbol):
         return ["USD", "JPY", "EUR"]
 
 
-def generate_news_section(symbols, all_news):
+def unique_news(news_lists):
     """
-    ニュース専用セクションを生成する関数。
-    prompt_idea.txtの形式に合わせて、通貨別・通貨ペア別にニュースを分類。
+    複数のニュースリストを結合し、URL（無い場合はタイトル）で重複を除去する
+    取り込み時に類似記事と判定された記事（duplicate_of）は重複元が含まれていれば除外する。
 
     Args:
-        symbols (list): 通貨ペアのリスト。
-        all_news (dict): 各通貨ペアのニュースデータ。
+        news_lists (iterable): ニュースリストのイテラブル
 
     Returns:
-        str: ニュース専用セクションのプロンプト。
+        list: 重複を除いたニュースのリスト（最初に出現した順）
+    """
+    seen = set()
+    unique = []
+    for news_list in news_lists:
+        for news in news_list:
+            key = news.get("url") or news.get("title", "")
+            if key not in seen:
+                seen.add(key)
+                unique.append(news)
+    return [news for news in unique if news.get("duplicate_of") not in seen]
+
+
+def select_multi_currency_news(news_items, matcher):
+    """
+    複数通貨に関連する、または通貨ペアが明示的に言及されているニュースを抽出する
+
+    Args:
+        news_items (list): ニュースのリスト
+        matcher (CurrencyMatcher): タグ未付与の記事を分類するマッチャー
+
+    Returns:
+        list: 該当するニュースのリスト（公開日時の新しい順）
     """
-    prompt = "各通貨関連ニュース\n"
-    prompt += "\n"
-    
-    # 各通貨ペアから個別通貨を抽出
-    individual_currencies = set()
-    for symbol in symbols:
-        currencies = extract_currencies_from_symbol(symbol)
-        individual_currencies.update(currencies)
-    
-    # 個別通貨のニュースセクション
-    for currency in sorted(individual_currencies):
-        prompt += f"[{currency}]:\n"
-        # 各通貨に関連するニュースを収集
-        currency_news = []
-        for symbol in symbols:
-            symbol_currencies = extract_currencies_from_symbol(symbol)
-            if currency in symbol_currencies:
-                news_list = all_news.get(symbol, [])
-                currency_news.extend(news_list)
-        
-        if currency_news:
-            # 重複を除去し、公開日時でソート
-            seen_titles = set()
-            unique_news = []
-            for news in currency_news:
-                title = news.get("title", "")
-                if title not in seen_titles:
-                    seen_titles.add(title)
-                    unique_news.append(news)
-            
-            # 最新のニュースを最初に表示
-            unique_news.sort(key=lambda x: x.get("published", ""), reverse=True)
-            
-            for news in unique_news[:NEWS_DISPLAY_LIMIT]:  # 設定可能な件数まで
-                published = news.get("published", "")
-                title = news.get("title", "")
-                summary = news.get("summary", "")
-                prompt += f"- {published} {title}: {summary}\n"
-        else:
-            prompt += "- 関連ニュースなし\n"
-        prompt += "\n"
-    
-    # 通貨ペアのニュースセクション
-    for symbol in symbols:
-        symbol_clean = symbol.replace("=X", "")
-        formatted_pair = f"{symbol_clean[:3]}/{symbol_clean[3:]}"
-        prompt += f"[{formatted_pair}]:\n"
-        
-        news_list = all_news.get(symbol, [])
-        if news_list:
-            for news in news_list[:NEWS_DISPLAY_LIMIT]:  # 設定可能な件数まで
-                published = news.get("published", "")
-                title = news.get("title", "")
-                summary = news.get("summary", "")
-                prompt += f"- {published} {title}: {summary}\n"
-        else:
-            prompt += "- 関連ニュースなし\n"
-        prompt += "\n"
-    
-    # 全通貨統合セクション（例: USD/JPY/EUR）
-    all_currencies = "/".join(sorted(individual_currencies))
-    prompt += f"[{all_currencies}]:\n"
-    
-    # 複数通貨に関連するニュースのみを抽出
     multi_currency_news = []
-    
-    # 全てのニュースを調べて、複数の通貨に関連するものを見つける
-    all_news_items = []
-    for news_list in all_news.values():
-        all_news_items.extend(news_list)
-    
-    # 重複除去
-    seen_titles = set()
-    unique_news_items = []
-    for news in all_news_items:
-        title = news.get("title", "")
-        if title not in seen_titles:
-            seen_titles.add(title)
-            unique_news_items.append(news)
-    
-    # 複数通貨に関連するニュースを特定
-    for news in unique_news_items:
-        title = news.get("title", "").upper()
-        summary = news.get("summary", "").upper()
-        content = f"{title} {summary}"
-        
-        # 個別通貨が何個含まれているかをカウント
-        currency_count = 0
-        for currency in individual_currencies:
-            if currency in content:
-                currency_count += 1
-        
-        # 通貨ペアが含まれているかもチェック
-        pair_found = False
-        for symbol in symbols:
-            clean_symbol = symbol.replace("=X", "").replace("/", "")
-            if clean_symbol.upper() in content:
-                pair_found = True
-                break
-        
-        # 複数通貨に関連している、または通貨ペアが明示的に言及されている場合のみ追加
-        if currency_count >= 2 or pair_found:
+    for news in news_items:
+        matcher.tag(news)  # 取り込み時にタグ付け済みの場合は何もしない
+        if len(news["currencies"]) >= 2 or news["pairs"]:
             multi_currency_news.append(news)
-    
-    if multi_currency_news:
-        # 公開日時でソート
-        multi_currency_news.sort(key=lambda x: x.get("published", ""), reverse=True)
-        
-        for news in multi_currency_news[:NEWS_COMBINED_LIMIT]:  # 設定可能な件数まで
-            published = news.get("published", "")
-            title = news.get("title", "")
-            summary = news.get("summary", "")
-            prompt += f"- {published} {title}: {summary}\n"
-    else:
-        prompt += "- 関連ニュースなし\n"
-    
-    prompt += "\n"
-    return prompt
+    multi_currency_news.sort(key=lambda x: x.get("published", ""), reverse=True)
+    return multi_currency_news
+
+
+def _truncate(text, max_chars):
+    """テキストを最大文字数で切り詰める（Noneの場合はそのまま、0の場合は空文字）"""
+    if max_chars is None or len(text) <= max_chars:
+        return text
+    return text[:max_chars].rstrip() + "…" if max_chars > 0 else ""
+
+
+def _transaction_log_fingerprint(transaction_log):
+    """
+    取引ログの描画に関わる内容の指紋（追記型のため、件数と最後の取引で変化を判定できる）
+
+    Args:
+        transaction_log (dict): 取引ログのデータ
+
+    Returns:
+        tuple: (総件数, 読み込んだ件数, 最後の取引のID, 最後の取引のタイムスタンプ, アーカイブ分の増減)
+    """
+    transactions = transaction_log.get("transactions", [])
+    last = transactions[-1] if transactions else {}
+    return (
+        transaction_log.get("total_count"), len(transactions),
+        last.get("id"), last.get("timestamp"), transaction_log.get("base_assets")
+    )
+
+
+def _news_fingerprint(news_by_key):
+    """
+    ニュースの指紋（記事ごとのURL・タイトルと公開日時のみ。本文は同じ記事なら変わらない）
+
+    Args:
+        news_by_key (dict): {通貨ペア・通貨: [articles]}
+
+    Returns:
+        list: [(キー, [(URL・タイトル, 公開日時, 重複元)])]
+    """
+    return [
+        (key, [(news.get("url") or news.get("title", ""), news.get("published"), news.get("duplicate_of"))
+               for news in articles])
+        for key, articles in sorted(news_by_key.items())
+    ]
+
+
+def _cached_section(cache, key, inputs, render_section):
+    """
+    セクションキャッシュがあれば入力ハッシュで再利用し、無ければそのまま描画する
+
+    Args:
+        cache (SectionCache): セクションキャッシュ（Noneの場合は常に描画）
+        key (str): セクションキー
+        inputs (tuple): セクションの入力（テンプレートの識別子を含める）
+        render_section (callable): テキストを描画する関数
+
+    Returns:
+        str: セクションのテキスト
+    """
+    if cache is None:
+        return render_section()
+    return cache.get_or_render(key, hash_inputs(*inputs), render_section)
+
+
+def _news_items(news_list, limit, summary_chars=None):
+    """テンプレートに渡すニュース項目（公開日時・タイトル・要約）を作る"""
+    return [
+        {
+            "published": news.get("published", ""),
+            "title": news.get("title", ""),
+            "summary": _truncate(news.get("summary", ""), summary_chars)
+        }
+        for news in news_list[:limit]
+    ]
 
 
-def generate_news_section_fixed(symbols, pair_news, individual_currency_news):
+def _format_pair_label(symbol):
+    """通貨ペアシンボルを表示用の表記に変換する (例: "USDJPY=X" -> "USD/JPY")"""
+    symbol_clean = symbol.replace("=X", "")
+    return f"{symbol_clean[:3]}/{symbol_clean[3:]}"
+
+
+def generate_news_section_fixed(symbols, pair_news, individual_currency_news, missing=None,
+                                display_limit=NEWS_DISPLAY_LIMIT, combined_limit=NEWS_COMBINED_LIMIT,
+                                summary_chars=None):
     """
     ニュース専用セクションを生成する関数（修正版）。
     個別通貨のニュースと通貨ペアのニュースを明確に分離。
@@ -190,12 +202,15 @@ def generate_news_section_fixed(symbols, pair_news, individual_currency_news):
         symbols (list): 通貨ペアのリスト。
         pair_news (dict): 各通貨ペアのニュースデータ。
         individual_currency_news (dict): 各個別通貨のニュースデータ。
+        missing (list): 期限内に取得できなかったセクション（通貨ペア・通貨）のリスト。
+        display_limit (int): 個別通貨・通貨ペアごとに表示する最大件数。
+        combined_limit (int): 統合セクションに表示する最大件数。
+        summary_chars (int): 要約の最大文字数（Noneの場合は全文、0の場合は見出しのみ）。
 
     Returns:
         str: ニュース専用セクションのプロンプト。
     """
-    prompt = "各通貨関連ニュース\n"
-    prompt += "\n"
+    missing = set(missing or [])
     
     # 各通貨ペアから個別通貨を抽出
     individual_currencies = set()
@@ -203,110 +218,50 @@ def generate_news_section_fixed(symbols, pair_news, individual_currency_news):
         currencies = extract_currencies_from_symbol(symbol)
         individual_currencies.update(currencies)
     
+    sections = []
+    
     # 個別通貨のニュースセクション（専用取得したニュースを使用）
     for currency in sorted(individual_currencies):
-        prompt += f"[{currency}]:\n"
-        
-        currency_news = individual_currency_news.get(currency, [])
-        
-        if currency_news:
-            # 最新のニュースを最初に表示
-            sorted_news = sorted(currency_news, key=lambda x: x.get("published", ""), reverse=True)
-            
-            for news in sorted_news[:NEWS_DISPLAY_LIMIT]:  # 設定可能な件数まで
-                published = news.get("published", "")
-                title = news.get("title", "")
-                summary = news.get("summary", "")
-                prompt += f"- {published} {title}: {summary}\n"
-        else:
-            prompt += "- 関連ニュースなし\n"
-        prompt += "\n"
+        # 最新のニュースを最初に表示
+        sorted_news = sorted(individual_currency_news.get(currency, []), key=lambda x: x.get("published", ""), reverse=True)
+        sections.append({
+            "label": currency,
+            "missing": currency in missing,
+            "items": _news_items(sorted_news, display_limit, summary_chars)
+        })
     
     # 通貨ペアのニュースセクション
     for symbol in symbols:
-        symbol_clean = symbol.replace("=X", "")
-        formatted_pair = f"{symbol_clean[:3]}/{symbol_clean[3:]}"
-        prompt += f"[{formatted_pair}]:\n"
-        
-        news_list = pair_news.get(symbol, [])
-        if news_list:
-            for news in news_list[:NEWS_DISPLAY_LIMIT]:  # 設定可能な件数まで
-                published = news.get("published", "")
-                title = news.get("title", "")
-                summary = news.get("summary", "")
-                prompt += f"- {published} {title}: {summary}\n"
-        else:
-            prompt += "- 関連ニュースなし\n"
-        prompt += "\n"
+        sections.append({
+            "label": _format_pair_label(symbol),
+            "missing": symbol in missing,
+            "items": _news_items(pair_news.get(symbol, []), display_limit, summary_chars)
+        })
     
     # 全通貨統合セクション（例: USD/JPY/EUR）
-    all_currencies = "/".join(sorted(individual_currencies))
-    prompt += f"[{all_currencies}]:\n"
-    
-    # 複数通貨に関連するニュースのみを抽出
-    multi_currency_news = []
-    
-    # 全てのニュースを調べて、複数の通貨に関連するものを見つける
-    all_news_items = []
-    for news_list in individual_currency_news.values():
-        all_news_items.extend(news_list)
-    for news_list in pair_news.values():
-        all_news_items.extend(news_list)
-    
-    # 重複除去
-    seen_titles = set()
-    unique_news_items = []
-    for news in all_news_items:
-        title = news.get("title", "")
-        if title not in seen_titles:
-            seen_titles.add(title)
-            unique_news_items.append(news)
-    
-    # 複数通貨に関連するニュースを特定
-    for news in unique_news_items:
-        title = news.get("title", "").upper()
-        summary = news.get("summary", "").upper()
-        content = f"{title} {summary}"
-        
-        # 個別通貨が何個含まれているかをカウント
-        currency_count = 0
-        for currency in individual_currencies:
-            if currency in content:
-                currency_count += 1
-        
-        # 通貨ペアが含まれているかもチェック
-        pair_found = False
-        for symbol in symbols:
-            clean_symbol = symbol.replace("=X", "").replace("/", "")
-            if clean_symbol.upper() in content:
-                pair_found = True
-                break
-        
-        # 複数通貨に関連している、または通貨ペアが明示的に言及されている場合のみ追加
-        if currency_count >= 2 or pair_found:
-            multi_currency_news.append(news)
-    
-    if multi_currency_news:
-        # 公開日時でソート
-        multi_currency_news.sort(key=lambda x: x.get("published", ""), reverse=True)
-        
-        for news in multi_currency_news[:NEWS_COMBINED_LIMIT]:  # 設定可能な件数まで
-            published = news.get("published", "")
-            title = news.get("title", "")
-            summary = news.get("summary", "")
-            prompt += f"- {published} {title}: {summary}\n"
-    else:
-        prompt += "- 関連ニュースなし\n"
-
-    prompt += "\n"
-    return prompt
+    # 複数通貨に関連するニュースのみを抽出（全ニュースを重複除去したうえでタグで判定）
+    multi_currency_news = select_multi_currency_news(
+        unique_news(list(individual_currency_news.values()) + list(pair_news.values())),
+        get_news_matcher(symbols)
+    )
+    sections.append({
+        "label": "/".join(sorted(individual_currencies)),
+        "missing": False,
+        "items": _news_items(multi_currency_news, combined_limit, summary_chars)
+    })
+    
+    # 取得できなかったセクションはテンプレート側で明示する
+    return render("news", sections=sections, missing_note=NEWS_MISSING_NOTE)
 
 def create_prompt(
     current_time_utc: str,
     symbols: list,
     portfolio,
-    currencies: list = None,
-    transaction_file: str = 'transaction_log.json'
+    transaction_file: str = 'transaction_log.jsonl',
+    processor=None,
+    output_dir: str = None,
+    token_budget: int = PROMPT_TOKEN_BUDGET,
+    snapshot=None
 ) -> str:
     
     """
@@ -316,11 +271,15 @@ def create_prompt(
         current_time_utc: 現在時刻（UTC）
         symbols: 通貨ペアのリスト
         portfolio: ポートフォリオインスタンス
-        currencies: ニュースフィルター用の通貨リスト (例: ["USD", "JPY", "EUR"])
+        transaction_file: 取引ログファイルのパス
+        processor: トークン数を数えるプロセッサー（省略時はバイト数から概算）
+        output_dir: トークン数の記録（prompt_tokens.json）と生成プロファイル（prompt_profile.json）を保存する実行ディレクトリ
+        token_budget: プロンプト全体のトークン上限
+        snapshot: サイクルで取得済みのMarketSnapshot（省略時はここで1回だけ取得する）
         
     Returns:
         prompt: 生成されたプロンプト文字列
-        pair_current_rates: 現在の通貨レート情報
+        snapshot: プロンプトに使った市場スナップショット（レート取得に失敗した場合はNone）
     """
     if isinstance(current_time_utc, str):
         current_time_utc = datetime.strptime(current_time_utc, "%Y-%m-%d %H:%M:%S")
@@ -332,112 +291,157 @@ def create_prompt(
         
     # datetime オブジェクトのまま計算して保持（UTC → JST変換）
     current_time_jst = current_time_utc + timedelta(hours=9)
-    prompt = ""
-    all_news = {}
-    individual_currency_news = {}
+    builder = PromptBuilder()
+    # セクションごとの所要時間・サイズとデータ取得のキャッシュ状況を記録する
+    profile = start_profile()
+
+    # Step 1: レートと各通貨ペアのテクニカル指標をサイクルで1回だけ取得し、以降は全てこのスナップショットを使う
+    if snapshot is None:
+        snapshot = take_market_snapshot(
+            portfolio, [normalize_forex_symbol(symbol) for symbol in symbols], current_time_jst
+        )
+    if snapshot is None:
+        print("レート取得に失敗したため、プロンプトを生成できません")
+        profile.finish()
+        if output_dir:
+            profile.save(output_dir)
+        return "", None
+    technicals = list(snapshot.technicals.items())
 
-    # Step 1: 各通貨ペアのテクニカル指標とニュースを取得
-    for symbol in symbols:
-        # 通貨ペアの正規化
-        normalized_symbol = normalize_forex_symbol(symbol)
-        
-        # 通貨ペアごとに適切な通貨フィルターを設定
-        # 各通貨ペアから個別に通貨を抽出してフィルターとして使用
-        symbol_currencies = extract_currencies_from_symbol(symbol)
-        
-        # Fetch technical indicators and news with currency filter
-        # テクニカル指標はJST時刻、ニュースはUTC時刻で取得する
-        data = fetch_forex_technicals_with_news(
-            normalized_symbol, 
-            current_time_jst,  # テクニカル指標用（JST）
-            news_base_time=current_time_utc,  # ニュース用（UTC）
+    # Step 2: 全通貨ペア・個別通貨のニュースを取得（UTC時刻、ストア未取得分のみ・サイクル共通の期限内で取得）
+    with profile.section("news"):
+        news_bundle = fetch_news_bundle(
+            symbols,
+            current_time_utc,
             hours_back=NEWS_HOURS_BACK,
             limit=NEWS_API_LIMIT,
-            currencies=symbol_currencies,
-            save_to_file=False,
-            use_cache=True  # キャッシュを有効化
+            store=get_news_store() if NEWS_USE_STORE else None,
+            deadline=NEWS_FETCH_DEADLINE_SECONDS,
+            strategy=NEWS_FETCH_STRATEGY
         )
+    all_news = news_bundle["pairs"]
+    individual_currency_news = news_bundle["currencies"]
+
+    # 市場情報を取得
+    with profile.section("market_info"):
+        market_info, _ = portfolio.display_market_info(current_time_jst, snapshot=snapshot)
+
+    # 取引ログを読み込む
+    with profile.section("portfolio"):
+        transaction_log = load_transaction_log_from_file(transaction_file)
+
+    # Step 3以降の描画・トークン計数・組み立ての時間は assembly に計上する
+    with profile.section("assembly"):
+        # Step 3: セクションごとのトークン予算に収まるよう、優先度の低い内容から削る
+        # 入力が前回のサイクルと同じセクション（日足・ニュース・取引履歴など）は描画結果を再利用する
+        section_cache = SectionCache() if PROMPT_REUSE_SECTIONS else None
+        missing_news = news_bundle.get("missing")
+        market_rates = dict(snapshot.market_rates)
+        # キャッシュの照合には全文ではなく指紋を使い、削減段階ごとに取引ログやニュース全体を直列化しない
+        news_fingerprint = hash_inputs(
+            _news_fingerprint(all_news), _news_fingerprint(individual_currency_news), sorted(missing_news or [])
+        )
+        transaction_fingerprint = hash_inputs(_transaction_log_fingerprint(transaction_log))
 
-        # 技術分析データをプロンプトに追加（ニュースは除く）
-        prompt += data_2_prompt(normalized_symbol, data)
-        prompt += f"\n==============================================\n"
-
-        # ニュースデータを収集（通貨ペア専用）
-        all_news[symbol] = data.get("news", [])
-
-    # Step 2: 個別通貨のニュースを専用取得
-    individual_currencies = set()
-    for symbol in symbols:
-        currencies = extract_currencies_from_symbol(symbol)
-        individual_currencies.update(currencies)
-    
-    for currency in individual_currencies:
-        # 個別通貨のニュースを専用取得
-        try:
-            # 単一通貨でニュースを取得
-            currency_data = fetch_forex_technicals_with_news(
-                "USDJPY=X",  # ダミーシンボル（テクニカル指標は使わない）
-                current_time_jst,  # テクニカル指標用（JST）
-                news_base_time=current_time_utc,  # ニュース用（UTC）
-                hours_back=NEWS_HOURS_BACK,
-                limit=NEWS_API_LIMIT,
-                currencies=[currency],  # 単一通貨のみ指定
-                save_to_file=False,
-                use_cache=True  # キャッシュを有効化
+        def render_technicals(level):
+            max_hourly, max_daily = TECHNICALS_TRIM_LEVELS[level]
+            return "".join(
+                data_2_prompt(normalized_symbol, data, max_hourly, max_daily, cache=section_cache) + TECHNICALS_SEPARATOR
+                for normalized_symbol, data in technicals
             )
-            individual_currency_news[currency] = currency_data.get("news", [])
-        except Exception as e:
-            print(f"Warning: 通貨 {currency} のニュース取得でエラー: {e}")
-            individual_currency_news[currency] = []
-
-    # ニュース専用セクションを追加
-    prompt += generate_news_section_fixed(symbols, all_news, individual_currency_news)
-    
-
-    # 市場情報を追加
-    add_prompt, pair_current_rates = portfolio.display_market_info(current_time_jst)
-    if pair_current_rates is None:
-        return "", None
-    prompt += add_prompt
-    
-    # 取引ログを追加
-    prompt += f"\n==================================================\n"
-    prompt += f"取引情報"
-    prompt += f"\n==================================================\n"
-    
-    prompt += print_asset_summary(transaction_file, current_rates=pair_current_rates)
-
-    prompt += f"\n==================================================\n"
-
 
-    # 質問セクションを追加
-    prompt += """
-以上の情報をもとに、次の質問に答えてください。
-
-Q: あなたは資産を増やすためにどの通貨ペアをいくら買う、売りますか？ ただし、変動率が小さいと予測される場合は「Hold」とし、【ポートフォリオ】の資産残高を参照し資産内で運用してください。
-
-回答は次のcsv形式の例に従う形で記述して下さい。購入しない場合は記述する必要はありません。
-例:
-行動,通貨ペア,数量
-BUY,USDJPY,1000 (例)
-SELL,EURJPY,500 (例)
+        def render_news(level):
+            display_limit, combined_limit, summary_chars = NEWS_TRIM_LEVELS[level]
+            # 期限内に取得できなかったセクションは明示する
+            return _cached_section(
+                section_cache, f"news:{level}",
+                (template_id("news"), NEWS_TRIM_LEVELS[level], symbols, news_fingerprint),
+                lambda: generate_news_section_fixed(
+                    symbols, all_news, individual_currency_news, missing_news,
+                    display_limit=display_limit, combined_limit=combined_limit, summary_chars=summary_chars
+                )
+            )
 
-行動,通貨ペア,数量
+        def render_portfolio(level):
+            return _cached_section(
+                section_cache, "portfolio",
+                (transaction_fingerprint, market_rates),
+                lambda: build_asset_summary(transaction_log, market_rates, include_history=False)
+            )
 
-"""
+        def render_history(level):
+            max_transactions = HISTORY_TRIM_LEVELS[level]
+            return _cached_section(
+                section_cache, f"history:{level}",
+                (transaction_fingerprint, max_transactions),
+                lambda: "\n".join(build_history_lines(transaction_log, max_transactions))
+            )
 
-    return prompt, pair_current_rates
+        sections = [
+            BudgetedSection("technicals", render_technicals, len(TECHNICALS_TRIM_LEVELS) - 1),
+            BudgetedSection("news", render_news, len(NEWS_TRIM_LEVELS) - 1),
+            BudgetedSection("portfolio", render_portfolio, 0),
+            BudgetedSection("history", render_history, len(HISTORY_TRIM_LEVELS) - 1),
+        ]
+        technicals_section, news_section, portfolio_section, history_section = sections
+        question = render("question")
+        counter = TokenCounter(processor)
+        sections_report = fit_sections(sections, counter, token_budget, fixed_text=market_info + question)
+
+        # Step 4: プロンプトを組み立てる
+        builder.add_section("technicals", technicals_section.text, "technicals")
+        builder.add_section("news", news_section.text, "news")
+        builder.add_section("market_info", market_info, "market_info")
+
+        # 取引ログを追加
+        asset_summary = portfolio_section.text + "\n" + history_section.text
+        print(asset_summary)
+        builder.render_section("portfolio", "trade_info", asset_summary=asset_summary)
+
+        # 質問セクションを追加
+        builder.add_section("question", question, "question")
+
+        prompt = builder.build()
+
+    section_reuse = None
+    if section_cache is not None:
+        section_cache.save()
+        section_reuse = section_cache.report()
+        print(f"再利用したセクション: {section_reuse['reused'] or 'なし'}")
+        print(f"描画したセクション: {section_reuse['rendered'] or 'なし'}")
+
+    token_report = save_token_report(output_dir, prompt, counter, sections_report, token_budget, section_reuse)
+    print(f"プロンプトのトークン数: {token_report['total_tokens']} / {token_budget}")
+
+    # 各セクションの出力サイズを記録し、プロファイルを prompt.txt と同じ実行ディレクトリに保存する
+    for name, text in (
+        ("technicals", technicals_section.text),
+        ("news", news_section.text),
+        ("market_info", market_info),
+        ("portfolio", asset_summary),
+        ("question", question),
+    ):
+        profile.record_output(name, text, counter.count(text))
+    profile.finish()
+    if output_dir:
+        profile.save(output_dir)
+    print(f"プロンプト生成時間: {profile.total_seconds:.2f}秒")
+
+    return prompt, snapshot
 
 
 
 # ============================================================
 
-def data_2_prompt(symbol, data):
+def data_2_prompt(symbol, data, max_hourly=None, max_daily=None, cache=None):
     """
     特定の時間と通貨ペアのデータを取得し、LLM向けのプロンプトを生成する関数
     
     Args:
         symbols (list): 通貨ペアのリスト（例: ["USDJPY=X"]）
+        max_hourly (int): 表示する時間足の本数（直近から、Noneの場合は全て）
+        max_daily (int): 表示する日足の本数（直近から、Noneの場合は全て）
+        cache (SectionCache): 日足ブロックを前回の描画結果から再利用するためのキャッシュ
         
     Returns:
         str: 生成されたプロンプトテキスト
@@ -447,54 +451,24 @@ def data_2_prompt(symbol, data):
     symbol_clean = data["meta"]["symbol"].replace("=X", "")
     base_time = data["meta"]["base_time_jst"]
     
-    # プロンプトの構築開始
-    prompt = f"""[通貨ペア]: {symbol_clean[:3]}/{symbol_clean[3:]}
-
-[現在の日時]
-{base_time.replace('-', '/')}
-
-[直近6時間（1時間足）の価格とRSIの推移]:
-"""
-
-    # 時間足データの追加（最新のデータを先頭に）
-    for i, hour_data in enumerate(reversed(data["hourly"]), 1):
-        prompt += f"{i}時間前: 始値: {hour_data['open']:.4f}, 終値: {hour_data['close']:.4f}, RSI: {hour_data['rsi_14']:.1f}\n"
-    
-    # RSIの解釈を追加
-#     prompt += """
-# ※RSIの解釈:
-# - RSI > 70: 買われすぎ（反転下落の可能性）
-# - RSI < 30: 売られすぎ（反転上昇の可能性）
-# - RSIの方向性: 上昇/下降トレンドの強さを示す
-# """
-    
-    # 日足データの追加
-    prompt += f"\n[直近{len(data['daily'])}日間（日足）の価格と移動平均]:\n"
-    for day_data in data["daily"]:
-        date_str = day_data["date"]
-        prompt += f"{date_str}: 始値: {day_data['open']:.4f}, 終値: {day_data['close']:.4f}, SMA(20): {day_data['sma_20']:.4f}\n"
-    
-    # 移動平均線の解釈を追加
-#     prompt += """
-# ※SMA(20)の解釈:
-# - 価格 > SMA(20): 上昇トレンドの可能性
-# - 価格 < SMA(20): 下降トレンドの可能性
-# - SMA傾斜: 上向きなら強気、下向きなら弱気
-# """
-    
-    # インジケーターの追加
-    prompt += f"\n[MACD（現在）]: MACD: {data['indicators']['macd']:.4f}, Signal: {data['indicators']['macd_signal']:.4f}\n"
-    
-    # MACDの解釈を追加
-#     prompt += """
-# ※MACDの解釈:
-# - MACD > シグナル: 買いシグナル
-# - MACD < シグナル: 売りシグナル
-# - MACDがゼロラインを上回る: 強気相場
-# - MACDがゼロラインを下回る: 弱気相場
-# """
-    
-    return prompt
+    # 日足は1日の間は変わらないため、前回と同じなら描画結果を再利用する
+    daily = data["daily"][-max_daily:] if max_daily else data["daily"]
+    daily_block = _cached_section(
+        cache, f"technicals_daily:{symbol_clean}:{max_daily}",
+        (template_id("technicals_daily"), daily),
+        lambda: render("technicals_daily", daily=daily)
+    )
+    
+    # 時間足データ（取得結果は新しい順）は直近の本数に絞ってから古い順に並べる。日足データも古い順
+    return render(
+        "technicals",
+        pair=f"{symbol_clean[:3]}/{symbol_clean[3:]}",
+        base_time=base_time.replace('-', '/'),
+        hourly=list(reversed(data["hourly"][:max_hourly])),
+        daily_block=daily_block,
+        macd=data["indicators"]["macd"],
+        macd_signal=data["indicators"]["macd_signal"]
+    )
 
 if __name__ == "__main__":
     # テスト用のデータを作成
@@ -507,7 +481,7 @@ if __name__ == "__main__":
     test_portfolio = Portfolio(balances={"JPY": 100000, "USD": 0, "EUR": 0})
     
     # プロンプトを生成
-    prompt, pair_current_rates = create_prompt(current_time_utc, symbols, test_portfolio)
+    prompt, snapshot = create_prompt(current_time_utc, symbols, test_portfolio)
     
     # 結果を表示
     print(prompt)
\ No newline at end of file
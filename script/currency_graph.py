@@ -0,0 +1,203 @@
+"""
+通貨グラフ - 取得できた為替レートから任意の通貨ペアのレートを最短経路で求める
+
+通貨を頂点、取得できた通貨ペア（とその逆数）を辺とするグラフを作り、
+全ての通貨の組について経由する通貨が最も少ない経路でレートを計算した変換行列を持つ。
+同じレートのスナップショットに対する変換行列はキャッシュし、換算は行列の参照だけで行う。
+"""
+
+import math
+import re
+import threading
+from collections import OrderedDict, deque
+
+import numpy as np
+
+# 通貨グラフ設定
+CURRENCY_GRAPH_CACHE_SIZE = 8  # 保持する変換行列の数（レートのスナップショットごと）
+
+_PAIR_PATTERN = re.compile(r"^([A-Z]{3})/?([A-Z]{3})(=X)?$")
+
+_graph_cache = OrderedDict()
+_graph_cache_lock = threading.Lock()
+
+
+def split_pair(pair):
+    """
+    通貨ペアを基軸通貨と決済通貨に分ける
+
+    Args:
+        pair (str): 通貨ペア（"USDJPY", "USD/JPY", "USDJPY=X" のいずれの表記も可）
+
+    Returns:
+        tuple | None: (基軸通貨, 決済通貨)。通貨ペアとして解釈できない場合はNone
+    """
+    m = _PAIR_PATTERN.match(str(pair).upper())
+    if not m:
+        return None
+    return m.group(1), m.group(2)
+
+
+class CurrencyGraph:
+    """
+    為替レートの通貨グラフと変換行列
+
+    matrix[index[A], index[B]] は 1A が何Bになるかを表す（経路が無い場合はNaN）。
+    """
+
+    def __init__(self, quotes, currencies=None):
+        """
+        Args:
+            quotes (dict): 通貨ペアとレートのマッピング（例: {"USDJPY": 150.0}）
+            currencies (list): 経路が無くても行列に含める通貨のリスト
+        """
+        edges = {}
+        for pair, rate in quotes.items():
+            legs = split_pair(pair)
+            if legs is None or rate is None:
+                continue
+            rate = float(rate)
+            if not math.isfinite(rate) or rate <= 0:
+                continue
+            base, quote = legs
+            edges.setdefault(base, {})[quote] = rate
+            edges.setdefault(quote, {}).setdefault(base, 1.0 / rate)
+
+        self.currencies = sorted(set(edges) | set(currencies or []))
+        self.index = {currency: i for i, currency in enumerate(self.currencies)}
+        self.matrix = np.full((len(self.currencies), len(self.currencies)), np.nan)
+        self._previous = {}
+
+        # 各通貨から幅優先探索し、経由する通貨が最も少ない経路でレートを掛け合わせる
+        for source in self.currencies:
+            i = self.index[source]
+            self.matrix[i, i] = 1.0
+            previous = {source: None}
+            queue = deque([source])
+            while queue:
+                current = queue.popleft()
+                for neighbor in sorted(edges.get(current, {})):
+                    if neighbor in previous:
+                        continue
+                    previous[neighbor] = current
+                    self.matrix[i, self.index[neighbor]] = (
+                        self.matrix[i, self.index[current]] * edges[current][neighbor]
+                    )
+                    queue.append(neighbor)
+            self._previous[source] = previous
+
+    def rate(self, base, quote):
+        """
+        1単位の基軸通貨が何単位の決済通貨になるかを返す
+
+        Args:
+            base (str): 基軸通貨（例: "USD"）
+            quote (str): 決済通貨（例: "JPY"）
+
+        Returns:
+            float | None: レート。経路が無い場合はNone
+        """
+        if base == quote:
+            return 1.0
+        if base not in self.index or quote not in self.index:
+            return None
+        value = self.matrix[self.index[base], self.index[quote]]
+        return None if np.isnan(value) else float(value)
+
+    def pair_rate(self, pair):
+        """
+        通貨ペア表記でレートを返す
+
+        Args:
+            pair (str): 通貨ペア（例: "EURUSD"）
+
+        Returns:
+            float | None: レート。解釈できない・経路が無い場合はNone
+        """
+        legs = split_pair(pair)
+        return self.rate(*legs) if legs else None
+
+    def convert(self, amount, from_currency, to_currency):
+        """
+        金額を別の通貨に換算する
+
+        Args:
+            amount (float): 金額
+            from_currency (str): 換算元の通貨
+            to_currency (str): 換算先の通貨
+
+        Returns:
+            float: 換算後の金額
+
+        Raises:
+            ValueError: 換算する経路が無い場合
+        """
+        rate = self.rate(from_currency, to_currency)
+        if rate is None:
+            raise ValueError(f"通貨 {from_currency} から {to_currency} への変換レートがありません")
+        return amount * rate
+
+    def path(self, base, quote):
+        """
+        レートの計算に使った経路を返す
+
+        Args:
+            base (str): 基軸通貨
+            quote (str): 決済通貨
+
+        Returns:
+            list | None: 経由する通貨のリスト（例: ["EUR", "USD", "JPY"]）。経路が無い場合はNone
+        """
+        previous = self._previous.get(base)
+        if previous is None or quote not in previous:
+            return None
+        path = [quote]
+        while previous[path[-1]] is not None:
+            path.append(previous[path[-1]])
+        return path[::-1]
+
+    def fill(self, pairs):
+        """
+        指定した通貨ペアのレートをグラフから求める
+
+        Args:
+            pairs (list): 通貨ペアのリスト
+
+        Returns:
+            dict: 通貨ペアとレートのマッピング（経路が無い通貨ペアは含まない）
+        """
+        rates = {}
+        for pair in pairs:
+            rate = self.pair_rate(pair)
+            if rate is not None:
+                rates[pair] = rate
+        return rates
+
+
+def solve_rates(quotes, currencies=None):
+    """
+    レートのスナップショットに対する通貨グラフを返す（同じスナップショットはキャッシュを使う）
+
+    Args:
+        quotes (dict): 通貨ペアとレートのマッピング
+        currencies (list): 経路が無くても行列に含める通貨のリスト
+
+    Returns:
+        CurrencyGraph: 通貨グラフ
+    """
+    key = (
+        tuple(sorted((str(pair), float(rate)) for pair, rate in quotes.items() if rate is not None)),
+        tuple(sorted(currencies or [])),
+    )
+    with _graph_cache_lock:
+        graph = _graph_cache.get(key)
+        if graph is not None:
+            _graph_cache.move_to_end(key)
+            return graph
+
+    graph = CurrencyGraph(quotes, currencies)
+    with _graph_cache_lock:
+        _graph_cache[key] = graph
+        while len(_graph_cache) > CURRENCY_GRAPH_CACHE_SIZE:
+            _graph_cache.popitem(last=False)
+    return graph
@@ -15,12 +15,22 @@ import os
 import json
 import hashlib
 import pickle
-import requests
+import math
+import time
+
+from script.http_client import get_session, get_default_timeout
+from script.news_matcher import get_matcher
+from script.news_dedup import NearDuplicateDetector
+from script.news_async import build_news_params, parse_news_articles, fetch_news_queries
+from script.prompt_profile import record_fetch
 
 # キャッシュ設定
 CACHE_DIR = os.path.join(os.path.dirname(__file__), '..', 'cache')
 CACHE_EXPIRY_MINUTES = 2  # キャッシュの有効期限（分）
 
+# ニュースAPI設定
+NEWS_API_URL = os.getenv("NEWS_API_URL", "http://192.168.207.239:18000/api/news/at")  # 環境変数で上書き可能（ローカル試験用サーバー: script/news_server.py）
+
 def get_cache_key(symbol, start_time, end_time, interval):
     """キャッシュキーを生成する"""
     key_string = f"{symbol}_{start_time}_{end_time}_{interval}"
@@ -69,11 +79,14 @@ def download_with_cache(symbol, interval, start, end, use_cache=True):
     """キャッシュ機能付きのyfinance.download"""
     # キャッシュキーを生成
     cache_key = get_cache_key(symbol, start.isoformat(), end.isoformat(), interval)
+    fetch_started = time.perf_counter()
     
     # キャッシュが有効な場合は使用
     if use_cache:
         cached_data = load_from_cache(cache_key)
         if cached_data is not None:
+            record_fetch("yfinance", f"{symbol} {interval}", True, time.perf_counter() - fetch_started,
+                         rows=len(cached_data))
             return cached_data
     
     # キャッシュが無い場合は新しくダウンロード
@@ -85,6 +98,7 @@ def download_with_cache(symbol, interval, start, end, use_cache=True):
     if use_cache:
         save_to_cache(df, cache_key)
     
+    record_fetch("yfinance", f"{symbol} {interval}", False, time.perf_counter() - fetch_started, rows=len(df))
     return df
 
 def clear_cache(older_than_hours=24):
@@ -275,7 +289,7 @@ def fetch_forex_technicals(symbol, base_time_jst, save_to_file=False, use_cache=
 
     return technical_data
 
-def fetch_news_at_time(base_time, hours_back=24, limit=10, currencies=None, api_url="http://192.168.207.239:18000/api/news/at"):
+def fetch_news_at_time(base_time, hours_back=24, limit=10, currencies=None, api_url=NEWS_API_URL, timeout=None, raise_on_error=False):
     """
     指定された日時より前の一定時間内のニュース記事を取得する関数
     
@@ -285,11 +299,16 @@ def fetch_news_at_time(base_time, hours_back=24, limit=10, currencies=None, api_
         limit (int): 取得する記事の最大数
         currencies (list): フィルタリング対象の通貨リスト (例: ["USD", "JPY", "EUR"])
         api_url (str): APIのエンドポイント
+        timeout (tuple): (接続, 読み込み) タイムアウト秒数。Noneの場合は共有クライアントの既定値
+        raise_on_error (bool): Trueの場合はエラー時に空リストを返さず例外を送出する
         
     Returns:
         list: ニュース記事のリスト、エラーの場合は空リスト
     """
     news_articles = []
+    session = get_session()
+    if timeout is None:
+        timeout = get_default_timeout()
     
     try:
         
@@ -297,68 +316,29 @@ def fetch_news_at_time(base_time, hours_back=24, limit=10, currencies=None, api_
         if isinstance(base_time, str):
             base_time = datetime.strptime(base_time, "%Y-%m-%d %H:%M:%S")
         
-        # 日時をISO形式に変換
-        date_time_iso = base_time.isoformat()
-        
-        # APIリクエストのパラメータを構築
-        params = {
-            "date_time": date_time_iso,
-            "hours_back": hours_back,
-            "limit": limit
-        }
-        
-        # 通貨フィルターが指定されている場合は追加
-        if currencies:
-            if isinstance(currencies, str):
-                # 文字列の場合はリストに変換
-                currencies = [currencies]
-            # 複数の通貨パラメータを正しく送信するため、paramsを修正
-            params["currencies"] = currencies
-        
-        # APIリクエストを送信
-        # 通貨パラメータを正しく送信するために、手動でクエリ文字列を構築
-        if currencies:
-            # 基本パラメータを構築
-            query_params = []
-            query_params.append(f"date_time={date_time_iso}")
-            query_params.append(f"hours_back={hours_back}")
-            query_params.append(f"limit={limit}")
-            
-            # 通貨パラメータを追加（各通貨ごとに currencies= を繰り返す）
-            for currency in currencies:
-                query_params.append(f"currencies={currency}")
-            
-            # 完全なURLを構築
-            full_url = f"{api_url}?{'&'.join(query_params)}"
-            print(f"リクエストURL: {full_url}")  # デバッグ用ログ
-            response = requests.get(full_url)
-        else:
-            # 通貨フィルターが無い場合は通常のパラメータ使用
-            response = requests.get(api_url, params=params)
+        # APIリクエストを送信（通貨パラメータは通貨ごとに currencies= を繰り返す）
+        params = build_news_params(base_time, hours_back, limit, currencies)
+        response = session.get(api_url, params=params, timeout=timeout)
+        print(f"リクエストURL: {response.url}")  # デバッグ用ログ
         
         # レスポンスを処理
         if response.status_code == 200:
-            api_data = response.json()
-            news_articles = [
-                {
-                    "title": article["title"],
-                    "summary": article["summary"],
-                    "url": article["url"],
-                    "published": article["published"]
-                }
-                for article in api_data.get("articles", [])
-            ]
+            news_articles = parse_news_articles(response.json())
             print(f"{len(news_articles)}件のニュース記事を取得しました")
         else:
             print(f"APIエラー: {response.status_code} - {response.text}")
+            if raise_on_error:
+                raise RuntimeError(f"ニュースAPIエラー: {response.status_code}")
     
     except Exception as e:
         print(f"ニュース取得中にエラーが発生しました: {str(e)}")
+        if raise_on_error:
+            raise
     
     return news_articles
 
 # fetch_forex_technicalsの結果に直接ニュースを追加する関数
-def fetch_forex_technicals_with_news(symbol, base_time_jst, news_base_time, hours_back=24, limit=10, currencies=None, api_url="http://192.168.207.239:18000/api/news/at", save_to_file=False, output_dir=None, use_cache=True):
+def fetch_forex_technicals_with_news(symbol, base_time_jst, news_base_time, hours_back=24, limit=10, currencies=None, api_url=NEWS_API_URL, save_to_file=False, output_dir=None, use_cache=True):
     """
     テクニカル指標データとニュース情報を一括取得する
     
@@ -403,6 +383,247 @@ def fetch_forex_technicals_with_news(symbol, base_time_jst, news_base_time, hour
     return technical_data
 
 
+def split_currency_pair(symbol):
+    """
+    通貨ペアシンボルを基軸通貨と決済通貨に分割する
+    
+    Args:
+        symbol (str): 通貨ペアシンボル (例: "USDJPY=X", "EUR/JPY")
+    
+    Returns:
+        tuple: (基軸通貨, 決済通貨)、6文字の通貨ペアでない場合はNone
+    """
+    clean_symbol = symbol.replace('/', '').replace('=X', '').upper()
+    if len(clean_symbol) != 6:
+        return None
+    return clean_symbol[:3], clean_symbol[3:]
+
+
+def partition_news(articles, symbols, currencies, per_bucket_limit=10):
+    """
+    まとめて取得したニュースを通貨ペア別・通貨別に振り分ける
+    
+    記事は取り込み時に付与した currencies タグで振り分ける。通貨ペアのバケットには
+    基軸通貨・決済通貨のどちらかに関連する記事が入る（通貨ペア単位でAPIに
+    問い合わせていた時と同じ条件）。重複元の記事が同じリストにある類似記事
+    （duplicate_of 付き）は除外する。
+    
+    Args:
+        articles (list): タグ付け済みのニュース記事のリスト（新しい順）
+        symbols (list): 通貨ペアのリスト
+        currencies (list): 個別通貨のリスト
+        per_bucket_limit (int): 各バケットに入れる最大件数
+    
+    Returns:
+        tuple: (通貨ペア別ニュースの辞書, 通貨別ニュースの辞書)
+    """
+    pair_news = {symbol: [] for symbol in symbols}
+    currency_news = {currency: [] for currency in currencies}
+    pair_legs = {symbol: split_currency_pair(symbol) or () for symbol in symbols}
+    present_keys = {article.get("url") or article.get("title", "") for article in articles}
+    
+    for article in articles:
+        if article.get("duplicate_of") in present_keys:
+            continue
+        article_currencies = set(article.get("currencies", [])).intersection(currencies)
+        if not article_currencies:
+            continue
+        
+        for currency in article_currencies:
+            if len(currency_news[currency]) < per_bucket_limit:
+                currency_news[currency].append(article)
+        
+        for symbol, legs in pair_legs.items():
+            if article_currencies.intersection(legs) and len(pair_news[symbol]) < per_bucket_limit:
+                pair_news[symbol].append(article)
+    
+    return pair_news, currency_news
+
+
+def get_news_matcher(symbols):
+    """
+    通貨ペアのリストから、その通貨と通貨ペアを判定するマッチャーを取得する
+    
+    Args:
+        symbols (list): 通貨ペアのリスト
+    
+    Returns:
+        CurrencyMatcher: コンパイル済みのマッチャー
+    """
+    currencies = []
+    pairs = []
+    for symbol in symbols:
+        legs = split_currency_pair(symbol)
+        if legs is None:
+            continue
+        pairs.append("".join(legs))
+        for currency in legs:
+            if currency not in currencies:
+                currencies.append(currency)
+    return get_matcher(currencies, pairs)
+
+
+def _build_news_queries(symbols, currencies, strategy):
+    """
+    取得戦略に応じたニュースクエリと、各クエリが対応するバケットを作る
+    
+    Returns:
+        tuple: (クエリ名 -> 通貨リストの辞書, クエリ名 -> バケット名リストの辞書)
+    """
+    if strategy == "fanout":
+        queries = {}
+        for symbol in symbols:
+            queries[symbol] = list(split_currency_pair(symbol) or ())
+        for currency in currencies:
+            queries[currency] = [currency]
+        return queries, {name: [name] for name in queries}
+    
+    return {"all": list(currencies)}, {"all": list(symbols) + list(currencies)}
+
+
+def _fetch_news_articles(symbols, currencies, base_time, hours_back, limit, api_url, timeout, deadline, strategy):
+    """
+    ニュースAPIから記事を取得する（エラーで例外を送出せず、取得できなかったバケットを返す）
+    
+    Returns:
+        tuple: (記事リスト, 取得できなかったバケット名のリスト, 件数の上限に達したクエリ名のリスト)
+    """
+    queries, query_buckets = _build_news_queries(symbols, currencies, strategy)
+    # 和集合で1回だけ問い合わせる場合は、全バケット分の件数を確保できるよう上限を広げる
+    query_limit = limit if strategy == "fanout" else limit * (len(symbols) + len(currencies))
+    
+    if deadline is not None:
+        results, failed = fetch_news_queries(queries, base_time, hours_back, query_limit, api_url, deadline=deadline)
+    else:
+        results, failed = {}, []
+        for name, query_currencies in queries.items():
+            try:
+                results[name] = fetch_news_at_time(base_time, hours_back, query_limit, query_currencies, api_url,
+                                                   timeout=timeout, raise_on_error=True)
+            except Exception:
+                failed.append(name)
+    
+    articles = unique_articles(results.values())
+    # 上限まで返ったクエリは、それより古い記事が取得されずに残っている可能性がある
+    truncated = [name for name, result in results.items() if len(result) >= query_limit]
+    missing = []
+    for name in failed:
+        for bucket in query_buckets[name]:
+            if bucket not in missing:
+                missing.append(bucket)
+    return articles, missing, truncated
+
+
+def unique_articles(article_lists):
+    """
+    複数の記事リストを結合し、URLで重複を除いて公開日時の新しい順に並べる
+    
+    Args:
+        article_lists (iterable): 記事リストのイテラブル
+    
+    Returns:
+        list: 記事のリスト
+    """
+    seen = set()
+    articles = []
+    for article_list in article_lists:
+        for article in article_list:
+            key = article.get("url") or article.get("title", "")
+            if key not in seen:
+                seen.add(key)
+                articles.append(article)
+    articles.sort(key=lambda x: x.get("published", ""), reverse=True)
+    return articles
+
+
+def fetch_news_bundle(symbols, base_time, hours_back=24, limit=10, api_url=NEWS_API_URL, timeout=None,
+                      store=None, offline=False, deadline=None, strategy="union"):
+    """
+    複数通貨ペアのニュースを取得し、通貨ペア別・通貨別に振り分ける
+    
+    テクニカル指標は取得しないニュース専用の取得経路。既定（strategy="union"）では
+    全通貨の和集合で1回だけ問い合わせ、取り込み時に通貨・通貨ペアのタグを付けて
+    クライアント側で振り分ける。strategy="fanout" では通貨ペアごと・通貨ごとの
+    クエリを並行して発行する。
+    deadline を指定した場合は全クエリを非同期で並行発行し、期限内に届いた結果だけを
+    使う。取得できなかったバケットは missing に記録される。
+    ストアを指定した場合は前回の取得済み範囲（high-water mark）より新しい分だけを
+    APIから取得し、対象期間の記事はストアから提供する。
+    
+    Args:
+        symbols (list): 通貨ペアのリスト (例: ["USDJPY", "EUR/JPY"])
+        base_time (datetime): ニュース取得用の基準日時（UTC）
+        hours_back (int): 何時間前までのニュースを取得するか
+        limit (int): 各通貨ペア・各通貨に割り当てる最大件数
+        api_url (str): ニュースAPIのエンドポイント
+        timeout (tuple): (接続, 読み込み) タイムアウト秒数（同期取得時）
+        store (NewsStore): ローカルのニュースストア（Noneの場合は毎回APIから全期間を取得）
+        offline (bool): Trueの場合はAPIに問い合わせずストアの記事のみを使う（バックテスト用）
+        deadline (float): ニュース取得全体の期限（秒）。Noneの場合は同期的に取得する
+        strategy (str): "union"（和集合で1回）または "fanout"（通貨ペア・通貨ごとに並行）
+    
+    Returns:
+        dict: ニュース情報
+            - pairs: 通貨ペア別ニュース {symbol: [articles]}
+            - currencies: 通貨別ニュース {currency: [articles]}
+            - articles: 対象期間の全記事
+            - missing: 期限切れ・エラーで最新のニュースを取得できなかったバケット名のリスト
+    """
+    if isinstance(base_time, str):
+        base_time = datetime.strptime(base_time, "%Y-%m-%d %H:%M:%S")
+    
+    matcher = get_news_matcher(symbols)
+    currencies = matcher.currencies
+    missing = []
+    
+    fetch_started = time.perf_counter()
+    
+    if store is None:
+        articles, missing, _ = _fetch_news_articles(symbols, currencies, base_time, hours_back, limit,
+                                                    api_url, timeout, deadline, strategy)
+        record_fetch("news", strategy, False, time.perf_counter() - fetch_started,
+                     articles=len(articles), missing=len(missing))
+        detector = NearDuplicateDetector()
+        for article in articles:
+            matcher.tag(article)
+            detector.check_article(article)
+    else:
+        window_start = base_time - timedelta(hours=hours_back)
+        fetch_from = None if offline else store.fetch_start(window_start, base_time)
+        
+        if fetch_from is not None:
+            # APIは時間単位で範囲を指定するため切り上げる
+            fetch_hours = max(1, min(hours_back, math.ceil((base_time - fetch_from).total_seconds() / 3600)))
+            fetched, missing, truncated = _fetch_news_articles(symbols, currencies, base_time, fetch_hours, limit,
+                                                               api_url, timeout, deadline, strategy)
+            added = store.add_articles(fetched, matcher)
+            record_fetch("news", f"{strategy} {fetch_hours}h", False, time.perf_counter() - fetch_started,
+                         articles=len(fetched), added=added, missing=len(missing))
+            print(f"ニュースストアに{added}件の新規記事を追加しました（過去{fetch_hours}時間分を取得）")
+            if missing:
+                # 一部でも取得できなかった場合は取得済み範囲を進めない（次回再取得する）
+                print("ニュース取得が完了しなかったため、未取得分はストア内の記事で補います")
+            elif truncated:
+                # 件数の上限で打ち切られた場合も取得済み範囲を進めない（上限より古い記事を取りこぼさない）
+                print(f"ニュースが取得件数の上限に達したため、取得済み範囲を記録しません（{', '.join(truncated)}）")
+            else:
+                store.mark_covered(base_time - timedelta(hours=fetch_hours), base_time)
+        else:
+            record_fetch("news", "store", True, time.perf_counter() - fetch_started)
+            print("ニュースストアの記事のみを使用します（APIリクエストなし）")
+        
+        articles = [matcher.tag(article) for article in store.query(window_start, base_time, currencies=currencies)]
+    
+    pair_news, currency_news = partition_news(articles, symbols, currencies, per_bucket_limit=limit)
+    
+    return {
+        "pairs": pair_news,
+        "currencies": currency_news,
+        "articles": articles,
+        "missing": missing
+    }
+
+
 def get_cache_info():
     """キャッシュの情報を取得する"""
     if not os.path.exists(CACHE_DIR):
@@ -2,6 +2,11 @@ import json
 from typing import Dict, List
 from datetime import datetime
 
+from script.valuation import value_balances
+from script.jsonl_log import is_jsonl_log, read_header, read_records
+from script.log_checkpoint import apply_transaction, base_state, replay_state
+from script.sqlite_store import is_sqlite_file, load_transactions
+
 
 def calculate_final_assets(transaction_log: Dict, initial_assets: Dict[str, float] ) -> Dict[str, float]:
     """
@@ -17,27 +22,13 @@ def calculate_final_assets(transaction_log: Dict, initial_assets: Dict[str, floa
     # 初期資産をコピー
     assets = initial_assets.copy()
     
+    # 圧縮でアーカイブに移した取引による増減を適用
+    for currency, amount in transaction_log.get("base_assets", {}).items():
+        assets[currency] = assets.get(currency, 0.0) + amount
+    
     # 各取引を適用
     for transaction in transaction_log["transactions"]:
-        currency_pair = transaction["currency_pair"]
-        amount = transaction["amount"]
-        rate = transaction["rate"]
-        
-        # 通貨ペア取得
-        base_currency = currency_pair[:3]
-        quote_currency = currency_pair[3:]
-        
-        # 基軸通貨と対象通貨が辞書に存在しない場合は初期化
-        if base_currency not in assets:
-            assets[base_currency] = 0.0
-        if quote_currency not in assets:
-            assets[quote_currency] = 0.0
-        
-        # 取引を適用
-        # amount > 0: 基軸通貨を買う（対象通貨を売る）
-        # amount < 0: 基軸通貨を売る（対象通貨を買う）
-        assets[base_currency] += amount
-        assets[quote_currency] -= amount * rate
+        apply_transaction(assets, transaction)
     
     # 現在のレートで全資産をJPY換算
     # total_jpy = 0.0
@@ -70,14 +61,26 @@ def calculate_final_assets(transaction_log: Dict, initial_assets: Dict[str, floa
 
 def load_transaction_log_from_file(file_path: str) -> Dict:
     """
-    ファイルからtransaction_logを読み込む
+    ファイルからtransaction_logを読み込む（追記型のtransaction_log.jsonl・従来形式のjson・SQLiteのデータベースに対応）
     
     Args:
-        file_path (str): transaction_log.jsonのファイルパス
+        file_path (str): transaction_log.jsonl（またはtransaction_log.json, forex.db）のファイルパス
         
     Returns:
         Dict: transaction_logデータ
     """
+    if is_sqlite_file(file_path):
+        transactions = load_transactions(file_path)
+        return {"transactions": transactions, "total_count": len(transactions)}
+    if is_jsonl_log(file_path):
+        # 圧縮済みのログはアーカイブに移した取引の件数・増減をヘッダーに持つ
+        base = base_state(read_header(file_path))
+        transactions = read_records(file_path)
+        return {
+            "transactions": transactions,
+            "total_count": base["count"] + len(transactions),
+            "base_assets": base["assets"]
+        }
     with open(file_path, 'r', encoding='utf-8') as f:
         return json.load(f)
 
@@ -87,29 +90,39 @@ def calculate_assets_from_file(log_file_path: str, initial_assets: Dict[str, flo
     ファイルからtransaction_logを読み込んで資産計算を行う
     
     Args:
-        log_file_path (str): transaction_log.jsonのファイルパス
+        log_file_path (str): transaction_log.jsonlのファイルパス
         initial_assets (Dict[str, float]): 初期資産
         current_rates (Dict[str, float]): 現在のレート
         
     Returns:
         Dict[str, float]: 最終的な資産状況
     """
+    if is_jsonl_log(log_file_path):
+        # 追記型ログはチェックポイント以降の取引だけを再生する
+        state, _ = replay_state(log_file_path)
+        assets = initial_assets.copy()
+        for currency, amount in state["assets"].items():
+            assets[currency] = assets.get(currency, 0.0) + amount
+        return {"assets": assets, "transaction_count": state["count"]}
+    
     transaction_log = load_transaction_log_from_file(log_file_path)
     return calculate_final_assets(transaction_log, initial_assets)
 
 
-def print_asset_summary(log_file_path: str, current_rates: Dict[str, float]):
+def build_asset_summary(transaction_log: Dict, current_rates: Dict[str, float],
+                        include_history: bool = True, max_transactions: int = None) -> str:
     """
-    資産計算結果を見やすく表示する。ログ詳細・残高・総資産(JPY換算)も表示。
+    資産計算結果の表示用テキストを作る（print_asset_summaryの本体、ファイル読み込み・表示なし）
 
     Args:
-        log_file_path (str): transaction_log.jsonのファイルパス
-        current_rates (Dict[str, float]): 現在のレート {"USDJPY": 148.0, "EURJPY": 172.0}
+        transaction_log (Dict): 取引ログのデータ
+        current_rates (Dict[str, float] | pd.DataFrame): 現在のレート {"USDJPY": 148.0, "EURJPY": 172.0}、
+            または display_market_info が返すレートのDataFrame
+        include_history (bool): 取引ログ詳細を含めるかどうか
+        max_transactions (int): 取引ログ詳細に表示する直近の取引数（Noneの場合は全件）
     Returns:
         str: 表示用のまとめテキスト
     """
-
-    transaction_log = load_transaction_log_from_file(log_file_path)
     result = calculate_final_assets(transaction_log, initial_assets)
 
     output = []
@@ -119,40 +132,81 @@ def print_asset_summary(log_file_path: str, current_rates: Dict[str, float]):
     for currency, amount in result["assets"].items():
         output.append(f"{currency}: {amount:,.2f}")
 
-    # 総資産(JPY換算)の計算
-    total_jpy = 0.0
+    # 総資産(JPY換算)の計算（レートが無い通貨は固定値で補わずに明示する）
+    jpy_values, total_jpy = value_balances(result["assets"], current_rates, "JPY")
     output.append("\n=== JPY換算残高 ===")
-    for currency, amount in result["assets"].items():
-        if currency == "JPY":
-            jpy_value = amount
-        elif currency == "USD":
-            jpy_value = amount * current_rates.get("USDJPY", 148.0)
-        elif currency == "EUR":
-            jpy_value = amount * current_rates.get("EURJPY", 172.0)
+    for currency, jpy_value in jpy_values.items():
+        if jpy_value is None:
+            output.append(f"{currency}: レートなし")
         else:
-            jpy_value = amount
-        output.append(f"{currency}: {jpy_value:,.2f} JPY")
-        total_jpy += jpy_value
-    output.append(f"\n総資産(JPY換算): {total_jpy:,.2f} JPY")
-
-    # 取引ログ詳細表示
-    if "transactions" in transaction_log:
-        output.append("\n=== 取引ログ詳細 ===")
-        for _, tx in enumerate(transaction_log["transactions"], 1):
-            ts = tx.get("timestamp", "")
-            pair = tx.get("currency_pair", "")
-            amt = tx.get("amount", 0.0)
-            rate = tx.get("rate", 0.0)
-            action = "買い" if amt > 0 else "売り"
-            # 日付部分だけ抽出
-            date_str = ts.split(" ")[0] if " " in ts else ts[:10]
-            output.append(
-                f"日付: {date_str}, 通貨ペア: {pair}, {action}, 数量: {abs(amt):,.2f}, レート: {rate:,.2f}"
-            )
+            output.append(f"{currency}: {jpy_value:,.2f} JPY")
+    if total_jpy is None:
+        missing = [currency for currency, jpy_value in jpy_values.items() if jpy_value is None]
+        output.append(f"\n総資産(JPY換算): 算出できません（レートなし: {', '.join(missing)}）")
     else:
-        output.append("\n取引ログ詳細は表示されません（transactions未指定）")
+        output.append(f"\n総資産(JPY換算): {total_jpy:,.2f} JPY")
+
+    if include_history:
+        output.extend(build_history_lines(transaction_log, max_transactions))
+
+    return "\n".join(output)
+
+
+def build_history_lines(transaction_log: Dict, max_transactions: int = None) -> List[str]:
+    """
+    取引ログ詳細の表示行を作る。max_transactionsを指定した場合は直近の取引のみ表示し、
+    それより古い取引は件数と売買の内訳の1行にまとめる。
+
+    Args:
+        transaction_log (Dict): 取引ログのデータ
+        max_transactions (int): 表示する直近の取引数（Noneの場合は全件）
 
-    summary = "\n".join(output)
+    Returns:
+        List[str]: 表示行のリスト
+    """
+    if "transactions" not in transaction_log:
+        return ["\n取引ログ詳細は表示されません（transactions未指定）"]
+
+    transactions = transaction_log["transactions"]
+    output = ["\n=== 取引ログ詳細 ==="]
+
+    shown = transactions
+    if max_transactions is not None and len(transactions) > max_transactions:
+        omitted = transactions[:len(transactions) - max_transactions]
+        shown = transactions[len(transactions) - max_transactions:] if max_transactions > 0 else []
+        buy_count = sum(1 for tx in omitted if tx.get("amount", 0.0) > 0)
+        output.append(
+            f"（それ以前の取引{len(omitted)}件は省略: 買い{buy_count}件, 売り{len(omitted) - buy_count}件）"
+        )
+
+    for tx in shown:
+        ts = tx.get("timestamp", "")
+        pair = tx.get("currency_pair", "")
+        amt = tx.get("amount", 0.0)
+        rate = tx.get("rate", 0.0)
+        action = "買い" if amt > 0 else "売り"
+        # 日付部分だけ抽出
+        date_str = ts.split(" ")[0] if " " in ts else ts[:10]
+        output.append(
+            f"日付: {date_str}, 通貨ペア: {pair}, {action}, 数量: {abs(amt):,.2f}, レート: {rate:,.2f}"
+        )
+    return output
+
+
+def print_asset_summary(log_file_path: str, current_rates: Dict[str, float], max_transactions: int = None):
+    """
+    資産計算結果を見やすく表示する。ログ詳細・残高・総資産(JPY換算)も表示。
+
+    Args:
+        log_file_path (str): transaction_log.jsonlのファイルパス
+        current_rates (Dict[str, float] | pd.DataFrame): 現在のレート {"USDJPY": 148.0, "EURJPY": 172.0}
+        max_transactions (int): 取引ログ詳細に表示する直近の取引数（Noneの場合は全件）
+    Returns:
+        str: 表示用のまとめテキスト
+    """
+
+    transaction_log = load_transaction_log_from_file(log_file_path)
+    summary = build_asset_summary(transaction_log, current_rates, max_transactions=max_transactions)
     print(summary)
     return summary
 
@@ -176,7 +230,7 @@ if __name__ == "__main__":
     # }
     
     # ファイルパスを指定して計算
-    log_file_path = "data/log/transaction_log.json"
+    log_file_path = "data/log/transaction_log.jsonl"
     # tr_log = load_transaction_log_from_file(log_file_path)
         
     # 計算実行
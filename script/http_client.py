@@ -0,0 +1,102 @@
+"""
+HTTPクライアント - ニュースAPI等への通信で共有するコネクションプール付きセッション
+"""
+
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# 接続設定（環境変数で上書き可能）
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "3.05"))  # 接続タイムアウト（秒）
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "10"))  # 読み込みタイムアウト（秒）
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "3"))  # 最大リトライ回数
+HTTP_BACKOFF_FACTOR = float(os.getenv("HTTP_BACKOFF_FACTOR", "0.5"))  # リトライ間隔の係数（0.5, 1.0, 2.0秒...）
+HTTP_POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", "4"))  # プールするホスト数
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "8"))  # ホストごとの最大コネクション数
+
+# リトライ対象のステータスコード
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_default_timeout():
+    """
+    デフォルトの (接続, 読み込み) タイムアウトを取得する
+
+    Returns:
+        tuple: (connect_timeout, read_timeout)
+    """
+    return (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+
+
+def create_session(
+    max_retries=HTTP_MAX_RETRIES,
+    backoff_factor=HTTP_BACKOFF_FACTOR,
+    pool_connections=HTTP_POOL_CONNECTIONS,
+    pool_maxsize=HTTP_POOL_MAXSIZE,
+):
+    """
+    Keep-Alive・リトライ・ホストごとの接続数制限を設定したセッションを作成する
+
+    Args:
+        max_retries (int): 最大リトライ回数
+        backoff_factor (float): 指数バックオフの係数
+        pool_connections (int): プールするホスト数
+        pool_maxsize (int): ホストごとの最大コネクション数
+
+    Returns:
+        requests.Session: 設定済みのセッション
+    """
+    retry = Retry(
+        total=max_retries,
+        connect=max_retries,
+        read=max_retries,
+        status=max_retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=RETRY_STATUS_CODES,
+        allowed_methods=frozenset(["GET", "HEAD"]),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    # pool_block=True でホストごとの同時接続数を pool_maxsize に制限する
+    adapter = HTTPAdapter(
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+        max_retries=retry,
+        pool_block=True,
+    )
+
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({"Connection": "keep-alive"})
+    return session
+
+
+def get_session():
+    """
+    プロセス内で共有するセッションを取得する（初回呼び出し時に作成）
+
+    Returns:
+        requests.Session: 共有セッション
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = create_session()
+    return _session
+
+
+def close_session():
+    """共有セッションを閉じ、保持しているコネクションを解放する"""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
@@ -0,0 +1,542 @@
+"""
+追記型ログ - 取引ログを1行1レコードのJSON Lines形式で保存する
+
+transaction_log.jsonl
+    1行目    ヘッダー {"_header": {"format": "transaction-log", "version": 2, "created_at": ...}}
+    2行目以降 取引1件につき1行（追記のみ）
+             既存の取引の更新は {"_op": "update", "id": ..., "set": {...}} の行を追記して表す
+
+書き込み途中で中断された最後の行は読み込み時に無視する。
+従来の {"transactions": [...]} 形式のファイルもそのまま読み込める。
+
+read_recent_records はファイルの末尾から逆順に読み、必要な件数・期間の取引だけを返す。
+LogIndex はログをメモリ上に保持し、ID・ユーザー・種類ごとの索引で引けるようにする。
+ファイルの更新時刻とサイズが変わった場合のみ、追記された部分だけを読み込んで索引を更新する。
+"""
+
+import bisect
+import json
+import os
+import threading
+from datetime import datetime
+
+# ログ形式の設定
+JSONL_LOG_FORMAT = "transaction-log"
+JSONL_LOG_VERSION = 2
+JSONL_HEADER_KEY = "_header"
+JSONL_OP_KEY = "_op"
+JSONL_FSYNC = True  # 追記のたびにディスクへ書き出す（電源断でも確定した取引を失わない）
+JSONL_REVERSE_BLOCK_SIZE = 64 * 1024  # 末尾から読み込むときの1回の読み込みサイズ
+
+
+def _dumps(record):
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":"))
+
+
+def make_header(**meta):
+    """
+    ヘッダー行の内容を作る
+
+    Args:
+        **meta: ヘッダーに追加する情報
+
+    Returns:
+        dict: ヘッダー行
+    """
+    return {JSONL_HEADER_KEY: {
+        "format": JSONL_LOG_FORMAT,
+        "version": JSONL_LOG_VERSION,
+        "created_at": datetime.now().isoformat(),
+        **meta,
+    }}
+
+
+def is_jsonl_log(path):
+    """
+    ファイルが追記型ログ（ヘッダー行で始まるJSON Lines）かどうかを返す
+
+    Args:
+        path (str): ファイルパス
+
+    Returns:
+        bool: 追記型ログの場合True
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            first_line = f.readline()
+        return JSONL_HEADER_KEY in json.loads(first_line)
+    except (OSError, ValueError, TypeError):
+        return False
+
+
+def read_header(path):
+    """
+    ヘッダーを読み込む
+
+    Args:
+        path (str): ログファイルのパス
+
+    Returns:
+        dict | None: ヘッダーの内容。追記型ログでない場合はNone
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.loads(f.readline()).get(JSONL_HEADER_KEY)
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def write_log(path, records, **meta):
+    """
+    ヘッダーとレコードでログファイルを作り直す（一時ファイル経由で置き換え）
+
+    Args:
+        path (str): ログファイルのパス
+        records (list): レコードのリスト
+        **meta: ヘッダーに追加する情報
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(_dumps(make_header(**meta)) + "\n")
+        for record in records:
+            f.write(_dumps(record) + "\n")
+        f.flush()
+        if JSONL_FSYNC:
+            os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def append_records(path, records):
+    """
+    レコードをログの末尾に追記する（ファイル全体は読み書きしない）
+
+    前回の書き込みが途中で中断されて最後の行が改行で終わっていない場合は、
+    改行を補ってから追記する（中断された行は読み込み時に無視される）。
+
+    Args:
+        path (str): ログファイルのパス
+        records (list): 追記するレコードのリスト
+
+    Returns:
+        int: 追記後のファイルサイズ
+    """
+    if not records:
+        return os.path.getsize(path)
+    payload = "".join(_dumps(record) + "\n" for record in records).encode("utf-8")
+    with open(path, 'a+b') as f:
+        size = f.tell()
+        if size > 0:
+            f.seek(size - 1)
+            if f.read(1) != b"\n":
+                payload = b"\n" + payload
+        f.write(payload)
+        f.flush()
+        if JSONL_FSYNC:
+            os.fsync(f.fileno())
+        return f.tell()
+
+
+def update_op(record_id, fields, previous=None):
+    """
+    既存のレコードを更新する操作行を作る
+
+    Args:
+        record_id (str): 更新するレコードのID
+        fields (dict): 上書きするフィールド
+        previous (dict): 上書きする前の値（集計結果を差分で更新するために記録する）
+
+    Returns:
+        dict: 操作行
+    """
+    op = {JSONL_OP_KEY: "update", "id": record_id, "set": fields}
+    if previous is not None:
+        op["prev"] = previous
+    return op
+
+
+def iter_entries(path, start_offset=0):
+    """
+    ログの行を先頭から順に読み込む（ヘッダー・壊れた行は除く）
+
+    Args:
+        path (str): ログファイルのパス
+        start_offset (int): 読み込みを始めるバイト位置（行の先頭であること）
+
+    Yields:
+        tuple: (行の先頭のバイト位置, 行の内容の辞書)
+    """
+    with open(path, 'rb') as f:
+        f.seek(start_offset)
+        offset = start_offset
+        for line in f:
+            line_offset = offset
+            offset += len(line)
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # 書き込み途中で中断された行
+                continue
+            if not isinstance(entry, dict) or JSONL_HEADER_KEY in entry:
+                continue
+            yield line_offset, entry
+
+
+def iter_committed_entries(path, start_offset=0):
+    """
+    改行で終わっている行だけを先頭から順に読み込む（ヘッダー・壊れた行は除く）
+
+    最後の行が改行で終わっていない場合は書き込み中の可能性があるため、そこで読み込みを止める。
+
+    Args:
+        path (str): ログファイルのパス
+        start_offset (int): 読み込みを始めるバイト位置（行の先頭であること）
+
+    Yields:
+        tuple: (行の末尾の次のバイト位置, 行の内容の辞書 または 壊れた行の場合None)
+    """
+    with open(path, 'rb') as f:
+        f.seek(start_offset)
+        offset = start_offset
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            offset += len(line)
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                yield offset, None
+                continue
+            if isinstance(entry, dict) and JSONL_HEADER_KEY not in entry:
+                yield offset, entry
+            else:
+                yield offset, None
+
+
+def apply_entry(records, by_id, entry):
+    """
+    1行分の内容をレコードのリストに反映する
+
+    Args:
+        records (list): レコードのリスト（その場で更新する）
+        by_id (dict): ID -> レコードの辞書（その場で更新する）
+        entry (dict): 行の内容
+
+    Returns:
+        dict | None: 追加・更新したレコード。反映できなかった場合はNone
+    """
+    op = entry.get(JSONL_OP_KEY)
+    if op is None:
+        records.append(entry)
+        if entry.get("id"):
+            by_id[entry["id"]] = entry
+        return entry
+    if op == "update":
+        record = by_id.get(entry.get("id"))
+        if record is not None:
+            record.update(entry.get("set", {}))
+        return record
+    return None
+
+
+def read_records(path):
+    """
+    ログを読み込み、更新操作を反映したレコードのリストを返す
+
+    追記型ログでない場合は従来の {"transactions": [...]}（またはリスト）形式として読み込む。
+
+    Args:
+        path (str): ログファイルのパス
+
+    Returns:
+        list: レコードのリスト（追記した順）
+    """
+    if not os.path.exists(path):
+        return []
+    if not is_jsonl_log(path):
+        return read_legacy_records(path)
+
+    records = []
+    by_id = {}
+    for _, entry in iter_entries(path):
+        apply_entry(records, by_id, entry)
+    return records
+
+
+def iter_lines_reverse(path, block_size=JSONL_REVERSE_BLOCK_SIZE):
+    """
+    ファイルの行を末尾から逆順に読み込む（改行で終わっていない最後の行は書き込み中として除く）
+
+    Args:
+        path (str): ファイルパス
+        block_size (int): 1回に読み込むバイト数
+
+    Yields:
+        bytes: 行（改行を除く）
+    """
+    with open(path, 'rb') as f:
+        position = f.seek(0, os.SEEK_END)
+        buffer = b""
+        at_end = True
+        while position > 0:
+            read_size = min(block_size, position)
+            position -= read_size
+            f.seek(position)
+            buffer = f.read(read_size) + buffer
+            if at_end:
+                # 最後の改行より後ろは書き込み中の行のため読み飛ばす
+                last_newline = buffer.rfind(b"\n")
+                if last_newline < 0:
+                    buffer = b""
+                    continue
+                buffer = buffer[:last_newline]
+                at_end = False
+            lines = buffer.split(b"\n")
+            # 先頭の行はまだ途中までしか読んでいない可能性があるため次のブロックに持ち越す
+            buffer = lines.pop(0)
+            for line in reversed(lines):
+                if line:
+                    yield line
+        if buffer and not at_end:
+            yield buffer
+
+
+def read_recent_records(path, limit=None, since=None):
+    """
+    ログの末尾から新しい順に取引を読み込む（必要な件数・期間に達したら読み込みを止める）
+
+    追記した順が新しい順であることを前提とする（前提が崩れている場合は呼び出し側で全件を並べ替えること。
+    LogIndex.timestamps_sorted で判定できる）。更新操作は対象の取引より後ろにあるため、
+    逆順に読むときは先に見つかった更新操作を保留し、対象の取引を読んだときに元の順で反映する。
+
+    Args:
+        path (str): ログファイルのパス
+        limit (int): 最大件数（Noneの場合は制限なし）
+        since (str): このタイムスタンプより古い取引に達したら止める（Noneの場合は制限なし）
+
+    Returns:
+        list: 取引のリスト（新しい順）
+    """
+    if not os.path.exists(path):
+        return []
+    if not is_jsonl_log(path):
+        records = [r for r in read_legacy_records(path) if since is None or r.get("timestamp", "") >= since]
+        records.sort(key=lambda x: x.get("timestamp", ""), reverse=True)
+        return records[:limit] if limit else records
+
+    records = []
+    pending = {}
+    for line in iter_lines_reverse(path):
+        if limit and len(records) >= limit:
+            break
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            continue
+        if not isinstance(entry, dict) or JSONL_HEADER_KEY in entry:
+            continue
+        op = entry.get(JSONL_OP_KEY)
+        if op == "update":
+            pending.setdefault(entry.get("id"), []).append(entry.get("set", {}))
+            continue
+        if op is not None:
+            continue
+        if since is not None and entry.get("timestamp", "") < since:
+            break
+        for fields in reversed(pending.pop(entry.get("id"), [])):
+            entry.update(fields)
+        records.append(entry)
+    return records
+
+
+def read_legacy_records(path):
+    """
+    従来の {"transactions": [...]} 形式のファイルを読み込む
+
+    Args:
+        path (str): ファイルパス
+
+    Returns:
+        list: レコードのリスト
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if isinstance(data, dict) and "transactions" in data:
+        return data["transactions"]
+    if isinstance(data, list):
+        return data
+    raise ValueError(f"取引ログファイルの形式が無効です: {path}")
+
+
+def migrate_legacy_log(legacy_path, path):
+    """
+    従来形式のログを追記型ログに移行する（移行済み・移行元が無い場合は何もしない）
+
+    Args:
+        legacy_path (str): 従来形式のファイルパス（transaction_log.json）
+        path (str): 追記型ログのファイルパス（transaction_log.jsonl）
+
+    Returns:
+        int | None: 移行したレコード数。移行しなかった場合はNone
+    """
+    if os.path.exists(path) or not os.path.exists(legacy_path):
+        return None
+    records = read_legacy_records(legacy_path)
+    write_log(path, records, migrated_from=os.path.basename(legacy_path))
+    return len(records)
+
+
+class LogIndex:
+    """
+    ログのレコードと索引をメモリ上に保持する
+
+    by_id       ID -> レコード
+    by_user     ユーザーID -> そのユーザーのレコードIDのリスト（追記した順）
+    by_type     種類（"取引", "取り消し" など） -> レコードIDのリスト（追記した順）
+    timestamps  レコードのタイムスタンプ（records と同じ順、期間の境界を二分探索で求める）
+
+    refresh() はファイルの (inode, 更新時刻, サイズ) が前回と同じなら何もしない。
+    同じファイル（inodeとヘッダー行が同じ）に追記されただけなら前回読んだ位置から先だけを読み、
+    作り直された場合は全体を読み直す。
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): ログファイルのパス
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._reset(None)
+
+    def _reset(self, signature):
+        self.records = []
+        self.by_id = {}
+        self.by_user = {}
+        self.by_type = {}
+        self.timestamps = []
+        self._timestamps_sorted = True
+        self._signature = signature
+        self._offset = 0
+        self._header_line = None
+
+    def refresh(self):
+        """
+        ファイルの変更を索引に反映する
+
+        Returns:
+            LogIndex: self
+        """
+        with self._lock:
+            try:
+                st = os.stat(self.path)
+            except FileNotFoundError:
+                self._reset(None)
+                return self
+            signature = (st.st_ino, st.st_mtime_ns, st.st_size)
+            if signature == self._signature:
+                return self
+
+            previous = self._signature
+            appended = (
+                previous is not None and previous[0] == st.st_ino
+                and self._offset and st.st_size >= self._offset
+                and self._read_header_line() == self._header_line
+            )
+            if not appended:
+                self._reset(None)
+                if not is_jsonl_log(self.path):
+                    # 従来形式は追記できないため、変更のたびに全体を読み直す
+                    for record in read_legacy_records(self.path):
+                        self._apply({k: v for k, v in record.items() if k != JSONL_OP_KEY})
+                    self._signature = signature
+                    return self
+                self._header_line = self._read_header_line()
+            self._read_from(self._offset)
+            self._signature = signature
+            return self
+
+    def _read_header_line(self):
+        with open(self.path, 'rb') as f:
+            return f.readline()
+
+    def _read_from(self, offset):
+        # 改行で終わっていない最後の行は書き込み中の可能性があるため、次回に読む
+        for offset, entry in iter_committed_entries(self.path, offset):
+            if entry is not None:
+                self._apply(entry)
+        self._offset = offset
+
+    def _apply(self, entry):
+        record = apply_entry(self.records, self.by_id, entry)
+        if record is None:
+            return
+        if entry.get(JSONL_OP_KEY) is not None:
+            if "timestamp" in entry.get("set", {}):
+                self._timestamps_sorted = False
+            return
+        timestamp = record.get("timestamp", "")
+        if self.timestamps and timestamp < self.timestamps[-1]:
+            self._timestamps_sorted = False
+        self.timestamps.append(timestamp)
+        if not record.get("id"):
+            return
+        record_id = record["id"]
+        self.by_user.setdefault(record.get("user_id"), []).append(record_id)
+        self.by_type.setdefault(record.get("type"), []).append(record_id)
+
+    @property
+    def timestamps_sorted(self):
+        """レコードのタイムスタンプが追記した順に並んでいる場合True（refresh() の後に参照する）"""
+        return self._timestamps_sorted
+
+    def get(self, record_id):
+        """IDでレコードを返す（無い場合はNone）"""
+        return self.by_id.get(record_id)
+
+    def range_records(self, start=None, end=None):
+        """
+        タイムスタンプが期間内のレコードを追記した順に返す
+
+        タイムスタンプが追記した順に並んでいる場合は境界を二分探索で求め、期間内のレコードだけを順に返す。
+
+        Args:
+            start (str): この値以上のタイムスタンプ（Noneの場合は制限なし）
+            end (str): この値以下のタイムスタンプ（Noneの場合は制限なし）
+
+        Returns:
+            tuple: (件数, レコードのイテレーター)
+        """
+        records = self.records
+        if not self._timestamps_sorted:
+            def in_range(record):
+                timestamp = record.get("timestamp", "")
+                return (not start or timestamp >= start) and (not end or timestamp <= end)
+            count = sum(1 for record in records if in_range(record))
+            return count, (record for record in records if in_range(record))
+        lo = bisect.bisect_left(self.timestamps, start) if start else 0
+        hi = bisect.bisect_right(self.timestamps, end) if end else len(self.timestamps)
+        return max(hi - lo, 0), (records[i] for i in range(lo, hi))
+
+    def user_records(self, user_id):
+        """ユーザーのレコードを追記した順に返す"""
+        return [self.by_id[record_id] for record_id in self.by_user.get(user_id, [])]
+
+    def last_of_type(self, record_type, exclude_status=None):
+        """
+        指定した種類の最後に追記されたレコードを返す
+
+        Args:
+            record_type (str): 種類
+            exclude_status (str): 除外するステータス
+
+        Returns:
+            dict | None: レコード
+        """
+        for record_id in reversed(self.by_type.get(record_type, [])):
+            record = self.by_id[record_id]
+            if exclude_status is None or record.get("status") != exclude_status:
+                return record
+        return None
@@ -0,0 +1,506 @@
+"""
+チェックポイント・圧縮 - 長くなった取引ログを毎回先頭から再生しないようにする
+
+transaction_log.jsonl.checkpoint.json
+    ある時点（N件目の取引まで）の集計結果と、その時点のログのバイト位置を保存する。
+    資産の再計算はチェックポイント以降に追記された取引だけを適用すればよい。
+    バイト位置の直前の内容のハッシュとファイルのinodeも保存し、バックアップからの復元などで
+    ログが置き換えられた場合はチェックポイントを使わずに最初から再生する。
+
+圧縮（任意）
+    直近の取引だけをログに残し、それより古い取引は archive/ に別ファイルとして移す。
+    移した取引の集計結果はログのヘッダーの "base" に、アーカイブの一覧（ログのディレクトリからの相対パス、古い順）は
+    "archives" に保存する。各アーカイブのヘッダーには移した取引の期間（"date_range"）を記録する。
+    全件・期間・ユーザーで取引を読む場合は iter_archived_records / read_archived_recent でアーカイブも読む。
+
+集計結果（state）
+    count               取引数
+    assets              取引による通貨ごとの増減（初期資産に足すと最終的な資産になる）
+    statuses            ステータスごとの件数
+    transaction_types   取引の種類ごとの件数
+    date_range          最初と最後の取引のタイムスタンプ
+    by_day              日付ごとの {"count", "volume"}
+    by_pair             通貨ペアごとの {"count", "net_amount", "volume"}
+
+StatsLogIndex はログの索引と同時に集計結果を追記・更新のたびに差分で更新する。
+"""
+
+import argparse
+import hashlib
+import json
+import os
+from datetime import datetime
+
+from script.jsonl_log import (
+    JSONL_OP_KEY, LogIndex, apply_entry, is_jsonl_log, iter_committed_entries, read_header, read_recent_records,
+    read_records, write_log
+)
+
+# チェックポイント設定
+CHECKPOINT_SUFFIX = ".checkpoint.json"
+CHECKPOINT_INTERVAL = 500  # この件数の取引を追記するごとにチェックポイントを作る
+CHECKPOINT_FINGERPRINT_BYTES = 4096  # チェックポイントの位置の直前のこのバイト数でログの同一性を確かめる
+ARCHIVE_DIR_NAME = "archive"
+
+# 集計に使うフィールド（チェックポイントより前の取引でこれらが更新された場合は全体を再生する）
+_STATE_FIELDS = ("currency_pair", "amount", "rate", "type", "timestamp", "status")
+
+
+def apply_transaction(assets, transaction):
+    """
+    1件の取引を資産に適用する
+
+    Args:
+        assets (dict): 通貨ごとの資産（その場で更新する）
+        transaction (dict): 取引（currency_pair, amount, rate）
+    """
+    currency_pair = transaction["currency_pair"]
+    amount = transaction["amount"]
+    rate = transaction["rate"]
+
+    # 通貨ペア取得
+    base_currency = currency_pair[:3]
+    quote_currency = currency_pair[3:]
+
+    # 基軸通貨と対象通貨が辞書に存在しない場合は初期化
+    if base_currency not in assets:
+        assets[base_currency] = 0.0
+    if quote_currency not in assets:
+        assets[quote_currency] = 0.0
+
+    # amount > 0: 基軸通貨を買う（対象通貨を売る）
+    # amount < 0: 基軸通貨を売る（対象通貨を買う）
+    assets[base_currency] += amount
+    assets[quote_currency] -= amount * rate
+
+
+def empty_state():
+    """取引が無い状態の集計結果を返す"""
+    return {
+        "count": 0,
+        "assets": {},
+        "statuses": {},
+        "transaction_types": {},
+        "date_range": {"earliest": None, "latest": None},
+        "by_day": {},
+        "by_pair": {},
+    }
+
+
+def _add_count(counts, key, delta):
+    counts[key] = counts.get(key, 0) + delta
+    if counts[key] == 0:
+        del counts[key]
+
+
+def _add_rollup(rollups, key, sign, **values):
+    rollup = rollups.setdefault(key, {"count": 0, **{name: 0.0 for name in values}})
+    rollup["count"] += sign
+    for name, value in values.items():
+        rollup[name] += sign * value
+    if rollup["count"] == 0:
+        del rollups[key]
+
+
+def add_record(state, record, sign=1):
+    """
+    1件の取引を集計結果に加える（sign=-1 の場合は取り除く）
+
+    取り除く場合、日付範囲（最初と最後のタイムスタンプ）は戻さない。
+
+    Args:
+        state (dict): 集計結果（その場で更新する）
+        record (dict): 取引
+        sign (int): 1 または -1
+    """
+    state["count"] += sign
+    if all(field in record for field in ("currency_pair", "amount", "rate")):
+        apply_transaction(state["assets"], record if sign > 0 else {**record, "amount": -record["amount"]})
+    _add_count(state["statuses"], record.get("status", ""), sign)
+    _add_count(state["transaction_types"], record.get("type", "その他"), sign)
+
+    amount = record.get("amount", 0.0)
+    timestamp = record.get("timestamp")
+    if timestamp:
+        _add_rollup(state["by_day"], timestamp[:10], sign, volume=abs(amount))
+        date_range = state["date_range"]
+        if sign > 0 and (date_range["earliest"] is None or timestamp < date_range["earliest"]):
+            date_range["earliest"] = timestamp
+        if sign > 0 and (date_range["latest"] is None or timestamp > date_range["latest"]):
+            date_range["latest"] = timestamp
+    if record.get("currency_pair"):
+        _add_rollup(state["by_pair"], record["currency_pair"], sign, net_amount=amount, volume=abs(amount))
+
+
+def fold_records(state, records):
+    """
+    取引を集計結果に加える
+
+    Args:
+        state (dict): 集計結果（その場で更新する）
+        records (iterable): 取引
+
+    Returns:
+        dict: state
+    """
+    for record in records:
+        add_record(state, record)
+    return state
+
+
+def apply_previous(state, entry):
+    """
+    集計済みの取引に対する更新操作を、記録された更新前の値を使って集計結果に反映する
+
+    Args:
+        state (dict): 集計結果（その場で更新する）
+        entry (dict): 更新操作の行
+
+    Returns:
+        bool: 反映できた場合True（ステータス以外の集計に使うフィールドを更新する操作・更新前の値が無い操作はFalse）
+    """
+    fields = entry.get("set", {})
+    previous = entry.get("prev")
+    changed = [field for field in _STATE_FIELDS if field in fields]
+    if not changed:
+        return True
+    if changed != ["status"] or previous is None or "status" not in previous:
+        return False
+    _add_count(state["statuses"], previous["status"], -1)
+    _add_count(state["statuses"], fields["status"], 1)
+    return True
+
+
+def checkpoint_path(path):
+    """ログファイルに対応するチェックポイントファイルのパス"""
+    return path + CHECKPOINT_SUFFIX
+
+
+def remove_checkpoint(path):
+    """
+    チェックポイントを削除する（ログを切り詰める・置き換える場合に呼ぶ）
+
+    Args:
+        path (str): ログファイルのパス
+    """
+    try:
+        os.remove(checkpoint_path(path))
+    except FileNotFoundError:
+        pass
+
+
+def prefix_fingerprint(path, offset):
+    """
+    ログの指定位置までの内容の指紋（inodeと、位置の直前 CHECKPOINT_FINGERPRINT_BYTES バイトのハッシュ）
+
+    Args:
+        path (str): ログファイルのパス
+        offset (int): バイト位置
+
+    Returns:
+        dict: {"inode", "sha256"}
+    """
+    with open(path, 'rb') as f:
+        start = max(0, offset - CHECKPOINT_FINGERPRINT_BYTES)
+        f.seek(start)
+        data = f.read(offset - start)
+        inode = os.fstat(f.fileno()).st_ino
+    return {"inode": inode, "sha256": hashlib.sha256(data).hexdigest()}
+
+
+def base_state(header):
+    """
+    ヘッダーに保存された、圧縮で移した取引の集計結果を返す
+
+    Args:
+        header (dict | None): ログのヘッダー
+
+    Returns:
+        dict: 集計結果（圧縮していない場合は空）
+    """
+    base = (header or {}).get("base")
+    return json.loads(json.dumps(base)) if base else empty_state()
+
+
+def read_checkpoint(path):
+    """
+    ログに対して有効なチェックポイントを読み込む
+
+    ログが作り直された（ヘッダーが違う・チェックポイントの位置より短い）場合や、
+    位置の直前の内容が保存時と違う（バックアップから復元された後に追記された等）場合は無効とする。
+
+    Args:
+        path (str): ログファイルのパス
+
+    Returns:
+        dict | None: {"header", "offset", "fingerprint", "state", "created_at"}。無い・無効な場合はNone
+    """
+    try:
+        with open(checkpoint_path(path), 'r', encoding='utf-8') as f:
+            checkpoint = json.load(f)
+        if checkpoint["header"] != read_header(path) or os.path.getsize(path) < checkpoint["offset"]:
+            return None
+        if checkpoint["fingerprint"] != prefix_fingerprint(path, checkpoint["offset"]):
+            return None
+        return checkpoint
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def replay_state(path, use_checkpoint=True):
+    """
+    ログ全体の集計結果を求める（有効なチェックポイントがあればそれ以降の行だけを読む）
+
+    Args:
+        path (str): 追記型ログのファイルパス
+        use_checkpoint (bool): Falseの場合はチェックポイントを使わず最初から再生する
+
+    Returns:
+        tuple: (集計結果, 読み込んだ最後の行の末尾のバイト位置)
+    """
+    checkpoint = read_checkpoint(path) if use_checkpoint else None
+    if checkpoint is not None:
+        state, start = checkpoint["state"], checkpoint["offset"]
+    else:
+        state, start = base_state(read_header(path)), 0
+
+    records = []
+    by_id = {}
+    offset = start
+    for offset, entry in iter_committed_entries(path, start):
+        if entry is None:
+            continue
+        if entry.get(JSONL_OP_KEY) == "update" and entry.get("id") not in by_id:
+            # 集計済みの取引の更新は差分で反映し、反映できない場合は最初から再生する
+            if checkpoint is not None and not apply_previous(state, entry):
+                return replay_state(path, use_checkpoint=False)
+            continue
+        apply_entry(records, by_id, entry)
+
+    return fold_records(state, records), offset
+
+
+def write_checkpoint(path):
+    """
+    現在のログの集計結果をチェックポイントに保存する（一時ファイル経由で置き換え）
+
+    Args:
+        path (str): 追記型ログのファイルパス
+
+    Returns:
+        dict: 集計結果
+    """
+    state, offset = replay_state(path)
+    checkpoint = {
+        "header": read_header(path),
+        "offset": offset,
+        "fingerprint": prefix_fingerprint(path, offset),
+        "state": state,
+        "created_at": datetime.now().isoformat(),
+    }
+    target = checkpoint_path(path)
+    tmp_path = f"{target}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(checkpoint, f, ensure_ascii=False)
+    os.replace(tmp_path, target)
+    return state
+
+
+def compact_log(path, keep_records, archive_dir=None):
+    """
+    直近の取引だけをログに残し、それより古い取引をアーカイブに移す
+
+    取り消し済みのマークなどの更新は反映した状態で書き出す。
+    移した取引の集計結果は新しいログのヘッダーの "base" に保存する。
+
+    Args:
+        path (str): 追記型ログのファイルパス
+        keep_records (int): ログに残す直近の取引数
+        archive_dir (str): アーカイブの保存先（省略時はログと同じディレクトリの archive/）
+
+    Returns:
+        str | None: アーカイブファイルのパス。移す取引が無い場合はNone
+    """
+    header = read_header(path)
+    records = read_records(path)
+    if len(records) <= keep_records:
+        return None
+
+    archived = records[:len(records) - keep_records]
+    kept = records[len(records) - keep_records:]
+
+    log_dir = os.path.dirname(os.path.abspath(path))
+    archive_dir = archive_dir or os.path.join(log_dir, ARCHIVE_DIR_NAME)
+    os.makedirs(archive_dir, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(path))[0]
+    archive_path = os.path.join(
+        archive_dir, f"{stem}.{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.jsonl"
+    )
+    timestamps = [record["timestamp"] for record in archived if record.get("timestamp")]
+    date_range = {"earliest": min(timestamps), "latest": max(timestamps)} if timestamps else None
+    write_log(archive_path, archived, archived_from=os.path.basename(path), date_range=date_range)
+
+    state = fold_records(base_state(header), archived)
+    archives = list((header or {}).get("archives", [])) + [os.path.relpath(archive_path, log_dir)]
+    write_log(path, kept, base=state, archives=archives)
+    write_checkpoint(path)
+    return archive_path
+
+
+def archive_paths(path, header=None):
+    """
+    圧縮でアーカイブに移したファイルのパスを返す
+
+    Args:
+        path (str): 追記型ログのファイルパス
+        header (dict): ログのヘッダー（省略時は読み込む）
+
+    Returns:
+        list: アーカイブのパス（古い順）
+
+    Raises:
+        FileNotFoundError: ヘッダーに記録されたアーカイブが無い場合
+    """
+    header = read_header(path) if header is None else header
+    log_dir = os.path.dirname(os.path.abspath(path))
+    paths = []
+    for name in (header or {}).get("archives", []):
+        archive_path = os.path.join(log_dir, name)
+        if not os.path.exists(archive_path):
+            # ファイル名だけを記録していたアーカイブは既定の保存先にある
+            archive_path = os.path.join(log_dir, ARCHIVE_DIR_NAME, name)
+        if not os.path.exists(archive_path):
+            raise FileNotFoundError(f"取引ログのアーカイブが見つかりません: {name}")
+        paths.append(archive_path)
+    return paths
+
+
+def iter_archived_records(path, start=None, end=None, user_id=None):
+    """
+    アーカイブに移した取引を古い順に返す
+
+    期間を指定した場合、ヘッダーの期間が範囲外のアーカイブは読まない。
+
+    Args:
+        path (str): 追記型ログのファイルパス
+        start (str): この値以上のタイムスタンプ（Noneの場合は制限なし）
+        end (str): この値以下のタイムスタンプ（Noneの場合は制限なし）
+        user_id (str): 指定した場合はそのユーザーの取引のみ
+
+    Yields:
+        dict: 取引
+    """
+    for archive_path in archive_paths(path):
+        date_range = (read_header(archive_path) or {}).get("date_range")
+        if date_range and ((start and date_range["latest"] < start) or (end and date_range["earliest"] > end)):
+            continue
+        for record in read_records(archive_path):
+            timestamp = record.get("timestamp", "")
+            if (start and timestamp < start) or (end and timestamp > end):
+                continue
+            if user_id is not None and record.get("user_id") != user_id:
+                continue
+            yield record
+
+
+def read_archived_recent(path, limit=None, since=None):
+    """
+    アーカイブに移した取引を新しい順に読み込む（新しいアーカイブから読み、件数・期間に達したら止める）
+
+    Args:
+        path (str): 追記型ログのファイルパス
+        limit (int): 最大件数（Noneの場合は制限なし）
+        since (str): このタイムスタンプより古い取引に達したら止める（Noneの場合は制限なし）
+
+    Returns:
+        list: 取引のリスト（新しい順）
+    """
+    results = []
+    for archive_path in reversed(archive_paths(path)):
+        results.extend(read_recent_records(archive_path, limit=limit - len(results) if limit else None, since=since))
+        if limit and len(results) >= limit:
+            break
+        date_range = (read_header(archive_path) or {}).get("date_range")
+        if since and date_range and date_range["earliest"] < since:
+            break
+    return results
+
+
+def read_all_records(path):
+    """
+    アーカイブに移した取引を含め、全ての取引を読み込む
+
+    Args:
+        path (str): 追記型ログのファイルパス
+
+    Returns:
+        list: 取引のリスト（古い順）
+
+    Raises:
+        ValueError: アーカイブの取引数がヘッダーの集計結果と一致しない場合
+    """
+    header = read_header(path)
+    archived = [record for archive_path in archive_paths(path, header) for record in read_records(archive_path)]
+    expected = base_state(header)["count"]
+    if len(archived) != expected:
+        raise ValueError(f"アーカイブの取引数（{len(archived)}件）がヘッダーの集計（{expected}件）と一致しません")
+    return archived + read_records(path)
+
+
+class StatsLogIndex(LogIndex):
+    """
+    ログの索引に加えて、集計結果（stats）を追記・更新のたびに差分で更新する
+
+    圧縮済みのログはヘッダーの "base" から集計を始める。ログが作り直された場合は索引と一緒に作り直す。
+    """
+
+    def _reset(self, signature):
+        super()._reset(signature)
+        self.stats = None
+
+    def _apply(self, entry):
+        if self.stats is None:
+            self.stats = base_state(read_header(self.path))
+        if entry.get(JSONL_OP_KEY) == "update":
+            record = self.by_id.get(entry.get("id"))
+            if record is not None:
+                add_record(self.stats, record, -1)
+            super()._apply(entry)
+            if record is not None:
+                add_record(self.stats, record, 1)
+            return
+        super()._apply(entry)
+        if entry.get(JSONL_OP_KEY) is None:
+            add_record(self.stats, entry)
+
+    def statistics(self):
+        """
+        現在の集計結果を返す（refresh() の後に呼ぶ）
+
+        Returns:
+            dict: 集計結果
+        """
+        if self.stats is None:
+            return base_state(read_header(self.path)) if os.path.exists(self.path) else empty_state()
+        return self.stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="取引ログのチェックポイント作成・圧縮")
+    parser.add_argument("--log", default="data/log/transaction_log.jsonl", help="取引ログ（transaction_log.jsonl）")
+    parser.add_argument("--compact", type=int, default=None, metavar="KEEP",
+                        help="直近KEEP件の取引だけを残し、それより古い取引をアーカイブに移す")
+    args = parser.parse_args()
+
+    if not is_jsonl_log(args.log):
+        print(f"追記型の取引ログではありません: {args.log}")
+        return
+    if args.compact is not None:
+        archive_path = compact_log(args.log, args.compact)
+        print(f"アーカイブに移しました: {archive_path}" if archive_path else "移す取引はありません")
+    state = write_checkpoint(args.log)
+    print(f"チェックポイントを作成しました（取引{state['count']}件まで）")
+
+
+if __name__ == "__main__":
+    main()
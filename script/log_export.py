@@ -0,0 +1,90 @@
+"""
+取引ログのエクスポート - 取引を1件ずつ書き出す（書き出す件数によらずメモリ使用量は一定）
+
+形式はファイル名の拡張子で決まる。
+    .json      {"exported_at", "date_range", "total_count", "transactions": [...]}（従来の形式）
+    .jsonl     1行1取引
+    .csv       EXPORT_CSV_FIELDS の列
+    .gz        上記のいずれかをgzipで圧縮（例: export.jsonl.gz）
+"""
+
+import csv
+import gzip
+import json
+import os
+from datetime import datetime
+
+# エクスポート設定
+EXPORT_FORMATS = ("json", "jsonl", "csv")
+EXPORT_CSV_FIELDS = [
+    "id", "timestamp", "user_id", "type", "status", "currency_pair", "amount", "rate",
+    "original_transaction_id", "details", "undone_at"
+]
+
+
+def detect_format(file_path):
+    """
+    ファイル名から形式と圧縮の有無を判定する
+
+    Args:
+        file_path (str): 出力ファイルのパス
+
+    Returns:
+        tuple: (形式, gzip圧縮する場合True)
+    """
+    name = file_path.lower()
+    compressed = name.endswith(".gz")
+    if compressed:
+        name = name[:-3]
+    ext = os.path.splitext(name)[1].lstrip(".")
+    return (ext if ext in EXPORT_FORMATS else "json"), compressed
+
+
+def write_export(file_path, records, total_count, start_date=None, end_date=None, fmt=None):
+    """
+    取引を1件ずつファイルに書き出す（一時ファイルに書き、完了後に置き換える）
+
+    Args:
+        file_path (str): 出力ファイルのパス
+        records (iterable): 書き出す取引（古い順）
+        total_count (int): 書き出す件数（json形式のヘッダーに使う）
+        start_date (str): 期間の開始（json形式のヘッダーに記録する）
+        end_date (str): 期間の終了（json形式のヘッダーに記録する）
+        fmt (str): 形式（省略時はファイル名から判定）
+
+    Returns:
+        int: 書き出した件数
+    """
+    detected, compressed = detect_format(file_path)
+    fmt = fmt or detected
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"未対応のエクスポート形式です: {fmt}")
+
+    tmp_path = f"{file_path}.{os.getpid()}.tmp"
+    opener = gzip.open if compressed else open
+    written = 0
+    with opener(tmp_path, 'wt', encoding='utf-8', newline='') as f:
+        if fmt == "jsonl":
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                written += 1
+        elif fmt == "csv":
+            writer = csv.DictWriter(f, fieldnames=EXPORT_CSV_FIELDS, extrasaction='ignore')
+            writer.writeheader()
+            for record in records:
+                writer.writerow(record)
+                written += 1
+        else:
+            head = json.dumps({
+                "exported_at": datetime.now().isoformat(),
+                "date_range": {"start": start_date, "end": end_date},
+                "total_count": total_count,
+            }, indent=2, ensure_ascii=False)
+            f.write(head[:-2] + ',\n  "transactions": [')
+            for record in records:
+                body = json.dumps(record, indent=2, ensure_ascii=False).replace("\n", "\n    ")
+                f.write(("," if written else "") + "\n    " + body)
+                written += 1
+            f.write("\n  ]\n}\n" if written else "]\n}\n")
+    os.replace(tmp_path, file_path)
+    return written
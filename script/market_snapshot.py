@@ -0,0 +1,183 @@
+"""
+市場スナップショット - 1回の推論サイクルで使うレートとテクニカル指標を1回だけ取得し、全ての処理で共有する
+
+data/real_out/
+    <実行ID>/market_snapshot.json   その実行で使ったスナップショット
+    market_snapshot.json             最新のスナップショット（Slack Botのレート表示などが参照する）
+"""
+
+import datetime
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Mapping
+
+import pandas as pd
+
+from script.currency_graph import solve_rates
+from script.fetch import fetch_forex_technicals
+from script.prompt_profile import profile_section
+
+# スナップショット設定
+MARKET_SNAPSHOT_FILE = "market_snapshot.json"
+
+
+@dataclass(frozen=True)
+class MarketSnapshot:
+    """
+    ある時点の市場データ（変更不可）
+
+    market_rates は仲値、bid_rates / ask_rates はスプレッドを適用した売り・買いのレート、
+    technicals は通貨ペア（YFinance形式）ごとのテクニカル指標。
+    """
+
+    timestamp: datetime.datetime  # 取得の基準時刻（JST）
+    market_rates: Mapping[str, float]
+    bid_rates: Mapping[str, float]
+    ask_rates: Mapping[str, float]
+    technicals: Mapping[str, dict] = field(default_factory=dict)
+    fetched_at: float = field(default_factory=time.time)  # 取得したUNIX時刻
+
+    def __post_init__(self):
+        # 共有しても書き換えられないよう、マッピングは読み取り専用にする
+        for name in ("market_rates", "bid_rates", "ask_rates", "technicals"):
+            object.__setattr__(self, name, MappingProxyType(dict(getattr(self, name))))
+
+    def rate(self, pair):
+        """
+        通貨ペアの仲値を返す（スナップショットに無い通貨ペアは交差レートで求める）
+
+        Args:
+            pair (str): 通貨ペア（例: "EURUSD"）
+
+        Returns:
+            float | None: レート。求められない場合はNone
+        """
+        if pair in self.market_rates:
+            return self.market_rates[pair]
+        return solve_rates(dict(self.market_rates)).pair_rate(pair)
+
+    def bank_rates(self):
+        """
+        市場情報の表示用に、通貨ペアごとの仲値・買値・売値とスプレッドを返す
+
+        Returns:
+            dict: 通貨ペア -> {"buy_rate", "sell_rate", "market_rate", "buy_spread", "sell_spread"}
+        """
+        return {
+            pair: {
+                "buy_rate": self.ask_rates[pair],
+                "sell_rate": self.bid_rates[pair],
+                "market_rate": rate,
+                "buy_spread": self.ask_rates[pair] - rate,
+                "sell_spread": rate - self.bid_rates[pair],
+            }
+            for pair, rate in self.market_rates.items()
+        }
+
+    def rates_frame(self):
+        """
+        通貨ペアごとのレートをDataFrameにする（display_market_info の戻り値と同じ列）
+
+        Returns:
+            pd.DataFrame: pair / market_rate / buy_rate / sell_rate / buy_spread / sell_spread 列
+        """
+        return pd.DataFrame([{"pair": pair, **rates} for pair, rates in self.bank_rates().items()])
+
+    def age_seconds(self):
+        """取得してからの経過秒数"""
+        return time.time() - self.fetched_at
+
+    def to_dict(self):
+        return {
+            "timestamp": self.timestamp.isoformat(),
+            "fetched_at": self.fetched_at,
+            "market_rates": dict(self.market_rates),
+            "bid_rates": dict(self.bid_rates),
+            "ask_rates": dict(self.ask_rates),
+            "technicals": dict(self.technicals),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            timestamp=datetime.datetime.fromisoformat(data["timestamp"]),
+            market_rates=data["market_rates"],
+            bid_rates=data["bid_rates"],
+            ask_rates=data["ask_rates"],
+            technicals=data.get("technicals", {}),
+            fetched_at=data.get("fetched_at", 0.0),
+        )
+
+    def save(self, path):
+        """スナップショットをJSONファイルに保存する（一時ファイル経由で置き換え）"""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=2, ensure_ascii=False, default=str)
+        os.replace(tmp_path, path)
+
+    def publish(self, run_dir):
+        """
+        スナップショットを実行ディレクトリと、その親（最新のスナップショット）に保存する
+
+        Args:
+            run_dir (str): 実行ディレクトリ（data/real_out/<実行ID>）
+        """
+        self.save(os.path.join(run_dir, MARKET_SNAPSHOT_FILE))
+        self.save(os.path.join(os.path.dirname(os.path.abspath(run_dir)), MARKET_SNAPSHOT_FILE))
+
+
+def load_snapshot(path):
+    """
+    保存したスナップショットを読み込む
+
+    Args:
+        path (str): market_snapshot.json のパス
+
+    Returns:
+        MarketSnapshot | None: スナップショット。無い・読めない場合はNone
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return MarketSnapshot.from_dict(json.load(f))
+    except (json.JSONDecodeError, OSError, KeyError, ValueError) as e:
+        print(f"市場スナップショットの読み込みエラー ({path}): {e}")
+        return None
+
+
+def take_market_snapshot(portfolio, symbols, current_time_jst):
+    """
+    レートとテクニカル指標を取得してスナップショットにする（1サイクルで1回だけ呼ぶ）
+
+    Args:
+        portfolio (Portfolio): レート取得とスプレッドの計算に使うポートフォリオ
+        symbols (list): テクニカル指標を取得する通貨ペア（YFinance形式、例: "USDJPY=X"）
+        current_time_jst (datetime): 基準時刻（JST）
+
+    Returns:
+        MarketSnapshot | None: スナップショット。レートが取得できなかった場合はNone
+    """
+    # レートが取得できないサイクルではテクニカル指標の取得（通貨ペアごとのダウンロード）を行わない
+    with profile_section("rates"):
+        market_rates = portfolio.get_current_rates(current_time=current_time_jst)
+    if not market_rates:
+        return None
+
+    with profile_section("technicals"):
+        technicals = {
+            symbol: fetch_forex_technicals(symbol, current_time_jst, save_to_file=False, use_cache=True)
+            for symbol in symbols
+        }
+
+    return MarketSnapshot(
+        timestamp=current_time_jst,
+        market_rates=market_rates,
+        bid_rates={pair: portfolio.apply_spread(rate, pair, False) for pair, rate in market_rates.items()},
+        ask_rates={pair: portfolio.apply_spread(rate, pair, True) for pair, rate in market_rates.items()},
+        technicals=technicals,
+    )
@@ -0,0 +1,198 @@
+"""
+非同期ニュース取得 - 複数のニュースクエリを1つの期限内で並行して取得する
+
+接続エラーと429/5xxは script/http_client.py のセッションと同じ設定（回数・バックオフ係数・Retry-After）で
+再試行する。ただし待ち時間が期限を越える場合は再試行せずにそのクエリを失敗とする。
+"""
+
+import asyncio
+import concurrent.futures
+import time
+from datetime import datetime
+
+import aiohttp
+
+from script.http_client import (
+    HTTP_BACKOFF_FACTOR, HTTP_CONNECT_TIMEOUT, HTTP_MAX_RETRIES, HTTP_POOL_MAXSIZE, RETRY_STATUS_CODES
+)
+
+# 1サイクルあたりのニュース取得期限（秒）
+NEWS_FETCH_DEADLINE_SECONDS = 8.0
+
+
+def build_news_params(base_time, hours_back, limit, currencies=None):
+    """
+    ニュースAPIのクエリパラメータを構築する（currencies は通貨ごとに繰り返す）
+
+    Args:
+        base_time (datetime): 基準日時
+        hours_back (int): 何時間前までのニュースを取得するか
+        limit (int): 取得する記事の最大数
+        currencies (list): フィルタリング対象の通貨リスト
+
+    Returns:
+        list: (キー, 値) のタプルのリスト
+    """
+    if isinstance(base_time, str):
+        base_time = datetime.strptime(base_time, "%Y-%m-%d %H:%M:%S")
+    if isinstance(currencies, str):
+        currencies = [currencies]
+
+    params = [
+        ("date_time", base_time.isoformat()),
+        ("hours_back", str(hours_back)),
+        ("limit", str(limit)),
+    ]
+    for currency in currencies or []:
+        params.append(("currencies", currency))
+    return params
+
+
+def parse_news_articles(api_data):
+    """
+    ニュースAPIのレスポンスを記事のリストに変換する
+
+    Args:
+        api_data (dict): APIのレスポンス（JSON）
+
+    Returns:
+        list: ニュース記事のリスト
+    """
+    return [
+        {
+            "title": article["title"],
+            "summary": article["summary"],
+            "url": article["url"],
+            "published": article["published"],
+            # APIが通貨タグを返す場合はそのまま保持する
+            **({"currencies": article["currencies"]} if article.get("currencies") else {})
+        }
+        for article in api_data.get("articles", [])
+    ]
+
+
+def _retry_after_seconds(value):
+    """Retry-Afterヘッダー（秒数）を秒に変換する（無い・日時形式の場合は0）"""
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return 0.0
+
+
+async def _fetch_query(session, api_url, params, deadline_at=None):
+    """
+    1つのクエリを取得する（エラー時は例外を送出）
+
+    接続エラーと RETRY_STATUS_CODES の応答は指数バックオフ（Retry-Afterがあればその秒数以上）で
+    最大 HTTP_MAX_RETRIES 回再試行する。待ち時間が期限（deadline_at）を越える場合は再試行しない。
+
+    Args:
+        session (aiohttp.ClientSession): セッション
+        api_url (str): ニュースAPIのエンドポイント
+        params (list): クエリパラメータ
+        deadline_at (float): time.monotonic() 基準の期限（Noneの場合は回数のみで制限）
+
+    Returns:
+        list: ニュース記事のリスト
+    """
+    for attempt in range(HTTP_MAX_RETRIES + 1):
+        delay = HTTP_BACKOFF_FACTOR * (2 ** attempt)
+        try:
+            async with session.get(api_url, params=params) as response:
+                if response.status == 200:
+                    api_data = await response.json(content_type=None)
+                    return parse_news_articles(api_data)
+                text = await response.text()
+                error = RuntimeError(f"ニュースAPIエラー: {response.status} - {text[:200]}")
+                if response.status not in RETRY_STATUS_CODES:
+                    raise error
+                delay = max(delay, _retry_after_seconds(response.headers.get("Retry-After")))
+        except aiohttp.ClientConnectionError as e:
+            error = e
+        if attempt == HTTP_MAX_RETRIES or (deadline_at is not None and time.monotonic() + delay >= deadline_at):
+            raise error
+        await asyncio.sleep(delay)
+
+
+async def fetch_news_queries_async(queries, base_time, hours_back, limit, api_url,
+                                   deadline=NEWS_FETCH_DEADLINE_SECONDS):
+    """
+    複数のニュースクエリを並行して発行し、期限内に届いた結果だけを返す
+
+    Args:
+        queries (dict): クエリ名 -> 通貨リスト
+        base_time (datetime): 基準日時（UTC）
+        hours_back (int): 何時間前までのニュースを取得するか
+        limit (int): 各クエリで取得する記事の最大数
+        api_url (str): ニュースAPIのエンドポイント
+        deadline (float): 全クエリ共通の期限（秒）
+
+    Returns:
+        tuple: (クエリ名 -> 記事リストの辞書, 期限切れ・エラーで取得できなかったクエリ名のリスト)
+    """
+    started = time.monotonic()
+    connector = aiohttp.TCPConnector(limit_per_host=HTTP_POOL_MAXSIZE)
+    timeout = aiohttp.ClientTimeout(total=deadline, connect=HTTP_CONNECT_TIMEOUT)
+
+    results = {}
+    missing = []
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        tasks = {
+            asyncio.ensure_future(
+                _fetch_query(session, api_url, build_news_params(base_time, hours_back, limit, currencies),
+                             deadline_at=started + deadline if deadline is not None else None)
+            ): name
+            for name, currencies in queries.items()
+        }
+        done, pending = await asyncio.wait(tasks, timeout=deadline)
+
+        for task in pending:
+            task.cancel()
+            missing.append(tasks[task])
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+        for task in done:
+            name = tasks[task]
+            try:
+                results[name] = task.result()
+            except Exception as e:
+                print(f"ニュース取得エラー ({name}): {e}")
+                missing.append(name)
+
+    elapsed = time.monotonic() - started
+    print(f"ニュース取得: {len(results)}/{len(queries)}クエリ完了 ({elapsed:.2f}秒)")
+    if missing:
+        print(f"警告: 期限内に取得できなかったクエリ: {', '.join(missing)}")
+    return results, missing
+
+
+def fetch_news_queries(queries, base_time, hours_back, limit, api_url,
+                       deadline=NEWS_FETCH_DEADLINE_SECONDS):
+    """
+    fetch_news_queries_async の同期版（イベントループ実行中でも呼び出し可能）
+
+    Args:
+        queries (dict): クエリ名 -> 通貨リスト
+        base_time (datetime): 基準日時（UTC）
+        hours_back (int): 何時間前までのニュースを取得するか
+        limit (int): 各クエリで取得する記事の最大数
+        api_url (str): ニュースAPIのエンドポイント
+        deadline (float): 全クエリ共通の期限（秒）
+
+    Returns:
+        tuple: (クエリ名 -> 記事リストの辞書, 取得できなかったクエリ名のリスト)
+    """
+    def run():
+        return asyncio.run(
+            fetch_news_queries_async(queries, base_time, hours_back, limit, api_url, deadline)
+        )
+
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return run()
+
+    # 既にイベントループが動いている場合は別スレッドで実行する
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(run).result()
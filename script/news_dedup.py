@@ -0,0 +1,165 @@
+"""
+ニュース重複検出 - シングル＋MinHashによる類似記事（同一配信記事の別見出し）の検出
+"""
+
+import random
+import re
+import unicodedata
+import zlib
+
+import numpy as np
+
+# 重複検出設定
+NEWS_DEDUP_THRESHOLD = 0.6  # この推定Jaccard類似度以上を重複とみなす
+NEWS_DEDUP_NUM_PERM = 64  # MinHashの署名長（ハッシュ関数の数）
+NEWS_DEDUP_SHINGLE_SIZE = 4  # 文字シングルの長さ
+NEWS_DEDUP_SEED = 1  # ハッシュ関数の係数を決める乱数シード（署名の互換性のため固定）
+
+_MERSENNE_PRIME = (1 << 31) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+def _choose_bands(num_perm, threshold):
+    """
+    LSHのバンド数と1バンドあたりの行数を選ぶ
+
+    候補判定の閾値 (1/b)^(1/r) が類似度の閾値を下回る範囲で最も近い組み合わせを選ぶ
+    （取りこぼしを減らし、候補は署名の比較で絞り込む）。
+    """
+    best = (num_perm, 1)
+    best_gap = None
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        lsh_threshold = (1.0 / bands) ** (1.0 / rows)
+        if lsh_threshold > threshold:
+            continue
+        gap = threshold - lsh_threshold
+        if best_gap is None or gap < best_gap:
+            best, best_gap = (bands, rows), gap
+    return best
+
+
+class NearDuplicateDetector:
+    """
+    MinHash署名とLSHバンドで類似記事を検出するクラス
+
+    署名は記事に保存して再利用し、新規記事はLSHで候補を引くだけなので
+    新規記事数に対して線形の計算量でクラスタリングできる。
+    """
+
+    def __init__(self, threshold=NEWS_DEDUP_THRESHOLD, num_perm=NEWS_DEDUP_NUM_PERM,
+                 shingle_size=NEWS_DEDUP_SHINGLE_SIZE, seed=NEWS_DEDUP_SEED):
+        """
+        Args:
+            threshold (float): 重複とみなす推定Jaccard類似度
+            num_perm (int): MinHashの署名長
+            shingle_size (int): 文字シングルの長さ
+            seed (int): ハッシュ関数の係数を決める乱数シード
+        """
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.bands, self.rows = _choose_bands(num_perm, threshold)
+
+        rng = random.Random(seed)
+        self._a = np.array([rng.randint(1, _MERSENNE_PRIME - 1) for _ in range(num_perm)], dtype=np.uint64)
+        self._b = np.array([rng.randint(0, _MERSENNE_PRIME - 1) for _ in range(num_perm)], dtype=np.uint64)
+
+        self._signatures = {}  # 記事キー -> 署名
+        self._buckets = {}  # (バンド番号, バンドの値) -> 代表記事キーのリスト
+
+    def shingles(self, text):
+        """
+        正規化したテキストから文字シングルのハッシュ集合を作る
+
+        Args:
+            text (str): 対象テキスト
+
+        Returns:
+            set: シングルのハッシュ値の集合
+        """
+        normalized = unicodedata.normalize("NFKC", text).lower()
+        normalized = re.sub(r"[^\w]+", " ", normalized).strip()
+        k = self.shingle_size
+        if len(normalized) <= k:
+            return {zlib.crc32(normalized.encode("utf-8"))} if normalized else set()
+        return {zlib.crc32(normalized[i:i + k].encode("utf-8")) for i in range(len(normalized) - k + 1)}
+
+    def signature(self, text):
+        """
+        テキストのMinHash署名を計算する
+
+        Args:
+            text (str): 対象テキスト
+
+        Returns:
+            list: 署名（num_perm個の整数）
+        """
+        shingles = self.shingles(text)
+        if not shingles:
+            return [_MAX_HASH] * self.num_perm
+        values = np.fromiter(shingles, dtype=np.uint64, count=len(shingles))
+        hashed = (self._a[:, None] * values[None, :] + self._b[:, None]) % _MERSENNE_PRIME
+        return hashed.min(axis=1).tolist()
+
+    def similarity(self, sig_a, sig_b):
+        """2つの署名から推定Jaccard類似度を計算する"""
+        matches = sum(1 for x, y in zip(sig_a, sig_b) if x == y)
+        return matches / self.num_perm
+
+    def add(self, key, signature):
+        """
+        署名を登録し、類似する既存記事があればそのキーを返す
+
+        重複と判定された記事はLSHバケットに登録せず、代表記事だけを候補に残す。
+
+        Args:
+            key (str): 記事キー（URLなど）
+            signature (list): MinHash署名
+
+        Returns:
+            str | None: 重複元（代表記事）のキー、重複でない場合はNone
+        """
+        band_keys = [
+            (band, tuple(signature[band * self.rows:(band + 1) * self.rows]))
+            for band in range(self.bands)
+        ]
+
+        checked = set()
+        for band_key in band_keys:
+            for candidate in self._buckets.get(band_key, ()):
+                if candidate in checked:
+                    continue
+                checked.add(candidate)
+                if self.similarity(signature, self._signatures[candidate]) >= self.threshold:
+                    return candidate
+
+        self._signatures[key] = signature
+        for band_key in band_keys:
+            self._buckets.setdefault(band_key, []).append(key)
+        return None
+
+    def check_article(self, article):
+        """
+        記事の署名を計算（保存済みなら再利用）して重複判定し、結果を記事に記録する
+
+        Args:
+            article (dict): ニュース記事（minhash / duplicate_of キーを付与する）
+
+        Returns:
+            str | None: 重複元の記事キー、重複でない場合はNone
+        """
+        key = article.get("url") or article.get("title", "")
+        signature = article.get("minhash")
+        if not signature or len(signature) != self.num_perm:
+            signature = self.signature(article.get("title", ""))
+            article["minhash"] = signature
+
+        duplicate_of = self.add(key, signature)
+        if duplicate_of is not None:
+            article["duplicate_of"] = duplicate_of
+        else:
+            article.pop("duplicate_of", None)
+        return duplicate_of
@@ -0,0 +1,115 @@
+"""
+ニュース分類 - 記事に関連する通貨・通貨ペアを1つのコンパイル済み正規表現で判定する
+"""
+
+import re
+from functools import lru_cache
+
+# 記事本文から通貨を判定するためのキーワード（通貨コード以外の表記）
+CURRENCY_KEYWORDS = {
+    "USD": ["DOLLAR", "GREENBACK", "FED", "FOMC"],
+    "JPY": ["YEN", "BOJ", "BANK OF JAPAN"],
+    "EUR": ["EURO", "ECB", "EUROZONE"],
+}
+
+# 通貨ペア表記の区切り文字 (例: USDJPY, USD/JPY, USD-JPY)
+PAIR_SEPARATORS = ["", "/", "-"]
+
+
+class CurrencyMatcher:
+    """
+    通貨コード・通称・通貨ペア表記をまとめた1つの正規表現で記事を分類するクラス
+
+    タイトルと要約を1回だけ走査し、関連する通貨と、明示的に言及された通貨ペアを返す。
+    """
+
+    def __init__(self, currencies, pairs=None, keywords=None):
+        """
+        Args:
+            currencies (list): 判定対象の通貨リスト (例: ["USD", "JPY", "EUR"])
+            pairs (list): 判定対象の通貨ペアのリスト (例: ["USDJPY", "EURJPY"])
+            keywords (dict): 通貨ごとの追加キーワード（省略時はCURRENCY_KEYWORDS）
+        """
+        if keywords is None:
+            keywords = CURRENCY_KEYWORDS
+
+        self.currencies = [c.upper() for c in currencies]
+        self.pairs = [p.upper() for p in (pairs or [])]
+
+        # 一致した文字列 -> (通貨の集合, 通貨ペア or None)
+        self._lookup = {}
+        for currency in self.currencies:
+            for term in [currency] + keywords.get(currency, []):
+                self._lookup[term.upper()] = ({currency}, None)
+        for pair in self.pairs:
+            base, quote = pair[:3], pair[3:]
+            for separator in PAIR_SEPARATORS:
+                self._lookup[f"{base}{separator}{quote}"] = ({base, quote}, pair)
+
+        # 長い表記を優先して一致させる（例: "EUROZONE" を "EURO" より先に）
+        terms = sorted(self._lookup, key=len, reverse=True)
+        alternation = "|".join(re.escape(term) for term in terms)
+        self._pattern = re.compile(rf"(?<![A-Z0-9])({alternation})S?(?![A-Z0-9])")
+
+    def match(self, text):
+        """
+        テキストに含まれる通貨と通貨ペアを判定する
+
+        Args:
+            text (str): 判定対象のテキスト
+
+        Returns:
+            tuple: (通貨のリスト, 通貨ペアのリスト)
+        """
+        found_currencies = set()
+        found_pairs = set()
+        for m in self._pattern.finditer(text.upper()):
+            currencies, pair = self._lookup[m.group(1)]
+            found_currencies.update(currencies)
+            if pair:
+                found_pairs.add(pair)
+
+        return (
+            [c for c in self.currencies if c in found_currencies],
+            [p for p in self.pairs if p in found_pairs]
+        )
+
+    def tag(self, article):
+        """
+        記事に currencies / pairs タグを付与する（既にタグ付け済みの記事はそのまま）
+
+        APIが返した通貨タグがある場合は、本文から判定した通貨と合わせて保持する。
+
+        Args:
+            article (dict): ニュース記事
+
+        Returns:
+            dict: タグ付けされた記事
+        """
+        if "pairs" in article:
+            return article
+
+        currencies, pairs = self.match(f"{article.get('title', '')} {article.get('summary', '')}")
+        api_tags = {c.upper() for c in article.get("currencies", [])}
+        article["currencies"] = [c for c in self.currencies if c in api_tags or c in currencies]
+        article["pairs"] = pairs
+        return article
+
+
+@lru_cache(maxsize=16)
+def _cached_matcher(currencies, pairs):
+    return CurrencyMatcher(list(currencies), list(pairs))
+
+
+def get_matcher(currencies, pairs=None):
+    """
+    通貨・通貨ペアの組み合わせごとにコンパイル済みのマッチャーを取得する
+
+    Args:
+        currencies (list): 判定対象の通貨リスト
+        pairs (list): 判定対象の通貨ペアのリスト
+
+    Returns:
+        CurrencyMatcher: コンパイル済みのマッチャー
+    """
+    return _cached_matcher(tuple(currencies), tuple(pairs or ()))
@@ -0,0 +1,314 @@
+"""
+ローカルニュースAPIサーバー - /api/news/at と同じ仕様で固定コーパスを返す負荷・レイテンシ試験用サーバー
+
+使い方:
+    python -m script.news_server --port 18000 --latency 0.2 --jitter 0.1 --error-rate 0.05
+    NEWS_API_URL=http://127.0.0.1:18000/api/news/at python inference.py ...
+"""
+
+import argparse
+import bisect
+import json
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from script.news_store import parse_published
+
+# サーバー設定
+NEWS_SERVER_HOST = "127.0.0.1"
+NEWS_SERVER_PORT = 18000
+NEWS_SERVER_PATH = "/api/news/at"
+NEWS_SERVER_CORPUS_SIZE = 2000  # 生成するコーパスの記事数
+NEWS_SERVER_SPAN_HOURS = 72  # 生成するコーパスがカバーする時間（基準時刻から遡る時間）
+NEWS_SERVER_SEED = 42
+
+# コーパス生成用のテンプレート（通貨 -> 見出しの主語）
+_SUBJECTS = {
+    "USD": ["Dollar", "Fed", "FOMC", "US Treasury yields", "Greenback"],
+    "JPY": ["Yen", "BOJ", "Bank of Japan", "Japanese exporters"],
+    "EUR": ["Euro", "ECB", "Eurozone", "German Bund yields"],
+}
+_PAIR_SUBJECTS = ["USD/JPY", "EUR/JPY", "EUR/USD"]
+_VERBS = ["rises", "falls", "steadies", "extends gains", "slips", "rebounds", "holds near highs", "hits two-week low"]
+_REASONS = [
+    "after inflation data", "ahead of central bank meeting", "as risk appetite improves",
+    "on intervention warnings", "as traders pare rate bets", "after strong jobs report",
+    "amid trade tensions", "on weak PMI figures",
+]
+
+
+def generate_corpus(size=NEWS_SERVER_CORPUS_SIZE, end_time=None, span_hours=NEWS_SERVER_SPAN_HOURS,
+                    seed=NEWS_SERVER_SEED):
+    """
+    試験用のニュースコーパスを生成する（同じシードなら同じ内容）
+
+    Args:
+        size (int): 記事数
+        end_time (datetime): 最も新しい記事の公開日時（UTC、省略時は現在時刻）
+        span_hours (int): コーパスがカバーする時間
+        seed (int): 乱数シード
+
+    Returns:
+        list: ニュース記事のリスト
+    """
+    if end_time is None:
+        end_time = datetime.utcnow().replace(microsecond=0)
+    rng = random.Random(seed)
+    span_seconds = span_hours * 3600
+
+    articles = []
+    for i in range(size):
+        if rng.random() < 0.25:
+            subject = rng.choice(_PAIR_SUBJECTS)
+            currencies = subject.split("/")
+        else:
+            currency = rng.choice(list(_SUBJECTS))
+            subject = rng.choice(_SUBJECTS[currency])
+            currencies = [currency]
+        title = f"{subject} {rng.choice(_VERBS)} {rng.choice(_REASONS)}"
+        published = end_time - timedelta(seconds=rng.randint(0, span_seconds))
+        articles.append({
+            "title": title,
+            "summary": f"{title}. Market participants watched {subject} closely during the session.",
+            "url": f"http://news.local/articles/{seed}/{i}",
+            "published": published.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "currencies": currencies,
+        })
+    return articles
+
+
+def load_corpus(path, size=None):
+    """
+    ファイルからコーパスを読み込む（JSON Lines、記事のリスト、または {"articles": [...]} 形式）
+
+    size がファイルの記事数より大きい場合は、URLを変えて繰り返し使う。
+
+    Args:
+        path (str): コーパスファイルのパス
+        size (int): 使用する記事数（省略時はファイルの全記事）
+
+    Returns:
+        list: ニュース記事のリスト
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    try:
+        data = json.loads(text)
+        articles = data.get("articles", []) if isinstance(data, dict) else data
+    except json.JSONDecodeError:
+        articles = [json.loads(line) for line in text.splitlines() if line.strip()]
+
+    if size is None or not articles:
+        return articles
+    if size <= len(articles):
+        return articles[:size]
+
+    expanded = list(articles)
+    copy = 1
+    while len(expanded) < size:
+        for article in articles[:size - len(expanded)]:
+            expanded.append(dict(article, url=f"{article.get('url', '')}#copy{copy}"))
+        copy += 1
+    return expanded
+
+
+class NewsCorpus:
+    """
+    公開日時で索引付けしたコーパス（/api/news/at のクエリを二分探索で処理する）
+    """
+
+    def __init__(self, articles):
+        entries = []
+        for article in articles:
+            published = parse_published(article.get("published"))
+            if published is not None:
+                entries.append((published, article))
+        entries.sort(key=lambda x: x[0])
+        self._times = [published for published, _ in entries]
+        self._articles = [article for _, article in entries]
+
+    def __len__(self):
+        return len(self._articles)
+
+    def query(self, date_time, hours_back=24, limit=10, currencies=None):
+        """
+        基準日時より前の一定時間内の記事を新しい順に返す
+
+        Args:
+            date_time (datetime): 基準日時（UTC）
+            hours_back (int): 何時間前までの記事を返すか
+            limit (int): 最大件数
+            currencies (list): 指定した場合はいずれかの通貨タグを持つ記事のみ
+
+        Returns:
+            list: ニュース記事のリスト
+        """
+        lo = bisect.bisect_left(self._times, date_time - timedelta(hours=hours_back))
+        hi = bisect.bisect_right(self._times, date_time)
+        wanted = {c.upper() for c in currencies} if currencies else None
+
+        results = []
+        for i in range(hi - 1, lo - 1, -1):
+            article = self._articles[i]
+            if wanted is not None and not wanted.intersection(article.get("currencies", [])):
+                continue
+            results.append(article)
+            if len(results) >= limit:
+                break
+        return results
+
+
+class NewsServer(ThreadingHTTPServer):
+    """
+    レイテンシ・エラー率を設定できるニュースAPIサーバー
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, corpus, latency=0.0, jitter=0.0, error_rate=0.0, error_status=503, seed=None):
+        """
+        Args:
+            address (tuple): (ホスト, ポート)
+            corpus (NewsCorpus): 返すコーパス
+            latency (float): 応答までの平均遅延（秒）
+            jitter (float): 遅延のばらつき（秒、±jitterの一様分布）
+            error_rate (float): エラー応答を返す割合（0〜1）
+            error_status (int): エラー時のHTTPステータス
+            seed (int): 遅延・エラー判定の乱数シード
+        """
+        super().__init__(address, NewsRequestHandler)
+        self.corpus = corpus
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self.stats = {"requests": 0, "errors": 0}
+
+    def next_delay_and_error(self):
+        """次の応答の遅延（秒）とエラーにするかどうかを決める"""
+        with self._rng_lock:
+            delay = max(0.0, self.latency + self._rng.uniform(-self.jitter, self.jitter))
+            fail = self._rng.random() < self.error_rate
+            self.stats["requests"] += 1
+            if fail:
+                self.stats["errors"] += 1
+        return delay, fail
+
+
+class NewsRequestHandler(BaseHTTPRequestHandler):
+    """/api/news/at のリクエストハンドラー"""
+
+    def log_message(self, format, *args):
+        # 負荷試験時に標準エラーが埋まらないようアクセスログは出さない
+        pass
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        if parsed.path != NEWS_SERVER_PATH:
+            self._send_json(404, {"detail": "Not Found"})
+            return
+
+        delay, fail = self.server.next_delay_and_error()
+        if delay:
+            time.sleep(delay)
+        if fail:
+            self._send_json(self.server.error_status, {"detail": "injected error"})
+            return
+
+        query = parse_qs(parsed.query)
+        try:
+            date_time = parse_published(query.get("date_time", [None])[0]) or datetime.utcnow()
+            hours_back = int(query.get("hours_back", ["24"])[0])
+            limit = int(query.get("limit", ["10"])[0])
+        except ValueError as e:
+            self._send_json(422, {"detail": str(e)})
+            return
+        currencies = query.get("currencies")
+
+        articles = self.server.corpus.query(date_time, hours_back, limit, currencies)
+        self._send_json(200, {"articles": articles, "count": len(articles)})
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_news_server(corpus, host=NEWS_SERVER_HOST, port=0, **options):
+    """
+    ニュースサーバーをバックグラウンドスレッドで起動する（ベンチマーク・試験用）
+
+    Args:
+        corpus (NewsCorpus | list): 返すコーパス（記事のリストも可）
+        host (str): 待ち受けホスト
+        port (int): 待ち受けポート（0の場合は空いているポート）
+        **options: NewsServer のオプション（latency, jitter, error_rate, error_status, seed）
+
+    Returns:
+        tuple: (NewsServer, APIのURL)。停止時は server.shutdown() を呼ぶ
+    """
+    if not isinstance(corpus, NewsCorpus):
+        corpus = NewsCorpus(corpus)
+    server = NewsServer((host, port), corpus, **options)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url = f"http://{server.server_address[0]}:{server.server_address[1]}{NEWS_SERVER_PATH}"
+    return server, url
+
+
+def main():
+    # コマンドライン引数の解析
+    parser = argparse.ArgumentParser(description='/api/news/at と同じ仕様のローカルニュースAPIサーバーを起動します')
+    parser.add_argument('--host', default=NEWS_SERVER_HOST, help='待ち受けホスト')
+    parser.add_argument('--port', type=int, default=NEWS_SERVER_PORT, help='待ち受けポート')
+    parser.add_argument('--corpus', help='コーパスファイル（JSON Lines または JSON）。指定しない場合は生成する')
+    parser.add_argument('--corpus-size', type=int, default=None, help=f'コーパスの記事数（生成時の既定値: {NEWS_SERVER_CORPUS_SIZE}）')
+    parser.add_argument('--span-hours', type=int, default=NEWS_SERVER_SPAN_HOURS, help='生成するコーパスがカバーする時間')
+    parser.add_argument('--end-time', help='生成するコーパスの最新時刻（UTC, 例: 2025-07-01T12:00:00）。省略時は現在時刻')
+    parser.add_argument('--latency', type=float, default=0.0, help='応答までの平均遅延（秒）')
+    parser.add_argument('--jitter', type=float, default=0.0, help='遅延のばらつき（秒）')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='エラー応答を返す割合（0〜1）')
+    parser.add_argument('--error-status', type=int, default=503, help='エラー時のHTTPステータス')
+    parser.add_argument('--seed', type=int, default=NEWS_SERVER_SEED, help='コーパス生成・遅延・エラー判定の乱数シード')
+
+    args = parser.parse_args()
+
+    if args.corpus:
+        articles = load_corpus(args.corpus, args.corpus_size)
+    else:
+        articles = generate_corpus(
+            size=args.corpus_size or NEWS_SERVER_CORPUS_SIZE,
+            end_time=parse_published(args.end_time) if args.end_time else None,
+            span_hours=args.span_hours,
+            seed=args.seed
+        )
+    corpus = NewsCorpus(articles)
+
+    server = NewsServer(
+        (args.host, args.port), corpus,
+        latency=args.latency, jitter=args.jitter,
+        error_rate=args.error_rate, error_status=args.error_status,
+        seed=args.seed
+    )
+    print(f"ニュースサーバーを起動しました: http://{args.host}:{args.port}{NEWS_SERVER_PATH}")
+    print(f"記事数: {len(corpus)}, 遅延: {args.latency}±{args.jitter}秒, エラー率: {args.error_rate}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"リクエスト数: {server.stats['requests']}, エラー応答数: {server.stats['errors']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+"""
+ニュースストア - 取得済みニュースを公開日時・通貨で索引付けして保存するローカルストア
+"""
+
+import bisect
+import json
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+
+from script.news_dedup import NearDuplicateDetector
+
+# ストア設定
+NEWS_STORE_DIR = os.path.join(os.path.dirname(__file__), '..', 'data', 'news')
+NEWS_STORE_ARTICLES_FILE = "articles.jsonl"
+NEWS_STORE_STATE_FILE = "state.json"
+NEWS_STORE_RETENTION_HOURS = 24 * 7  # 取得済み範囲の終端からこの時間より古い記事は読み込まずに破棄する
+
+
+def parse_published(value):
+    """
+    記事の公開日時をタイムゾーンなしのUTC datetimeに変換する
+
+    Args:
+        value (str | datetime): 公開日時（ISO 8601 または RFC 2822 形式）
+
+    Returns:
+        datetime | None: UTCの日時、解釈できない場合はNone
+    """
+    if isinstance(value, datetime):
+        parsed = value
+    elif not value or not isinstance(value, str):
+        return None
+    else:
+        text = value.strip()
+        parsed = None
+        try:
+            parsed = datetime.fromisoformat(text.replace("Z", "+00:00"))
+        except ValueError:
+            try:
+                parsed = parsedate_to_datetime(text)
+            except (TypeError, ValueError):
+                return None
+
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+class NewsStore:
+    """
+    公開日時で索引付けしたニュースストア
+
+    記事はURLで重複排除して articles.jsonl に追記し、取得済みの時間範囲
+    （covered_from 〜 high_water）を state.json に保存する。
+    high_water から retention_hours より古い記事は読み込み時に破棄し、破棄した行が
+    残した行以上になったら articles.jsonl を書き直す（ファイルは保持期間の約2倍に収まる）。
+    見出しが少し違うだけの類似記事は取り込み時にMinHashで判定し、duplicate_of を記録する
+    （署名は記事と一緒に保存し、読み込み時に再計算しない）。
+    """
+
+    def __init__(self, store_dir=NEWS_STORE_DIR, dedup_threshold=None, retention_hours=NEWS_STORE_RETENTION_HOURS):
+        self.store_dir = os.path.abspath(store_dir)
+        self.retention_hours = retention_hours
+        self.articles_path = os.path.join(self.store_dir, NEWS_STORE_ARTICLES_FILE)
+        self.state_path = os.path.join(self.store_dir, NEWS_STORE_STATE_FILE)
+        self._lock = threading.Lock()
+
+        self._by_url = {}  # url -> 記事
+        self._time_index = []  # (公開日時, url) の昇順リスト
+        self._by_currency = {}  # 通貨 -> url の集合
+        self._state = {"covered_from": None, "high_water": None}
+        if dedup_threshold is None:
+            self._dedup = NearDuplicateDetector()
+        else:
+            self._dedup = NearDuplicateDetector(threshold=dedup_threshold)
+
+        os.makedirs(self.store_dir, exist_ok=True)
+        self._load()
+
+    def __len__(self):
+        return len(self._by_url)
+
+    @property
+    def high_water(self):
+        """取得済み範囲の終端（これより新しい記事は未取得）"""
+        return self._parse_state_time("high_water")
+
+    @property
+    def covered_from(self):
+        """取得済み範囲の始端"""
+        return self._parse_state_time("covered_from")
+
+    def fetch_start(self, window_start, window_end):
+        """
+        指定の時間範囲を提供するためにAPIから取得すべき開始日時を返す
+
+        Args:
+            window_start (datetime): 必要な範囲の始端（UTC）
+            window_end (datetime): 必要な範囲の終端（UTC）
+
+        Returns:
+            datetime | None: 取得開始日時。ストアだけで提供できる場合はNone
+        """
+        covered_from = self.covered_from
+        high_water = self.high_water
+        if covered_from is None or high_water is None or window_start < covered_from:
+            return window_start
+        if window_end <= high_water:
+            return None
+        return max(window_start, high_water)
+
+    def add_articles(self, articles, matcher=None):
+        """
+        記事をストアに追加する（URLが既存の記事はスキップ）
+
+        Args:
+            articles (list): ニュース記事のリスト
+            matcher (CurrencyMatcher): 取り込み時に通貨・通貨ペアのタグを付けるマッチャー
+
+        Returns:
+            int: 新規に追加した記事数
+        """
+        new_articles = []
+        with self._lock:
+            for article in articles:
+                url = article.get("url")
+                if not url or url in self._by_url:
+                    continue
+                stored = dict(article)
+                if matcher is not None:
+                    matcher.tag(stored)
+                self._index(stored)
+                new_articles.append(stored)
+
+            if new_articles:
+                with open(self.articles_path, 'a', encoding='utf-8') as f:
+                    for stored in new_articles:
+                        f.write(json.dumps(stored, ensure_ascii=False) + "\n")
+
+        return len(new_articles)
+
+    def mark_covered(self, start, end):
+        """
+        指定の時間範囲を取得済みとして記録する
+
+        既存の取得済み範囲と重なる場合は結合し、離れている場合は新しい範囲で置き換える。
+
+        Args:
+            start (datetime): 取得した範囲の始端（UTC）
+            end (datetime): 取得した範囲の終端（UTC）
+        """
+        with self._lock:
+            covered_from = self.covered_from
+            high_water = self.high_water
+            if covered_from is not None and high_water is not None and start <= high_water and end >= covered_from:
+                start = min(start, covered_from)
+                end = max(end, high_water)
+            self._state["covered_from"] = start.isoformat()
+            self._state["high_water"] = end.isoformat()
+            self._save_state()
+
+    def query(self, start, end, currencies=None, limit=None):
+        """
+        公開日時が指定範囲内の記事を新しい順に取得する
+
+        Args:
+            start (datetime): 範囲の始端（UTC、この日時を含む）
+            end (datetime): 範囲の終端（UTC、この日時を含む）
+            currencies (list): 指定した場合はいずれかの通貨に関連する記事のみ
+            limit (int): 取得する最大件数
+
+        Returns:
+            list: ニュース記事のリスト（新しい順）
+        """
+        with self._lock:
+            lo = bisect.bisect_left(self._time_index, (start, ""))
+            hi = bisect.bisect_right(self._time_index, (end, "\uffff"))
+
+            allowed = None
+            if currencies:
+                allowed = set()
+                for currency in currencies:
+                    allowed.update(self._by_currency.get(currency, ()))
+
+            results = []
+            for _, url in reversed(self._time_index[lo:hi]):
+                if allowed is not None and url not in allowed:
+                    continue
+                results.append(self._by_url[url])
+                if limit and len(results) >= limit:
+                    break
+            return results
+
+    def _index(self, article):
+        """記事をメモリ上の索引に登録する"""
+        url = article["url"]
+        published = self._article_time(article)
+        self._dedup.check_article(article)
+        self._by_url[url] = article
+        bisect.insort(self._time_index, (published, url))
+        for currency in article.get("currencies", []):
+            self._by_currency.setdefault(currency, set()).add(url)
+
+    @staticmethod
+    def _article_time(article):
+        """索引に使う記事の日時（公開日時が不明な記事は取得時刻）"""
+        published = parse_published(article.get("published"))
+        if published is None:
+            published = parse_published(article.get("fetched_at")) or datetime.utcnow()
+            article.setdefault("fetched_at", published.isoformat())
+        return published
+
+    def _load(self):
+        """ストアファイルから状態と記事を読み込む（保持期間より古い記事は破棄する）"""
+        if os.path.exists(self.state_path):
+            try:
+                with open(self.state_path, 'r', encoding='utf-8') as f:
+                    self._state.update(json.load(f))
+            except (json.JSONDecodeError, OSError) as e:
+                print(f"ニュースストアの状態ファイル読み込みエラー: {e}")
+
+        high_water = self.high_water
+        cutoff = None
+        if high_water is not None and self.retention_hours is not None:
+            cutoff = high_water - timedelta(hours=self.retention_hours)
+
+        dropped = 0
+        if os.path.exists(self.articles_path):
+            with open(self.articles_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        article = json.loads(line)
+                    except json.JSONDecodeError:
+                        # 書き込み途中で中断された行は無視する
+                        dropped += 1
+                        continue
+                    if not article.get("url") or article["url"] in self._by_url:
+                        dropped += 1
+                        continue
+                    if cutoff is not None and self._article_time(article) < cutoff:
+                        dropped += 1
+                        continue
+                    self._index(article)
+
+        if cutoff is not None:
+            covered_from = self.covered_from
+            if covered_from is not None and covered_from < cutoff:
+                # 破棄した期間は取得済みとして扱わない
+                self._state["covered_from"] = cutoff.isoformat()
+                self._save_state()
+        if dropped and dropped >= len(self._by_url):
+            self._rewrite_articles()
+            print(f"ニュースストアを整理しました（{dropped}行を削除、{len(self._by_url)}件を保持）")
+
+    def _rewrite_articles(self):
+        """保持している記事だけで articles.jsonl を書き直す（一時ファイル経由で置き換え）"""
+        tmp_path = f"{self.articles_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for _, url in self._time_index:
+                f.write(json.dumps(self._by_url[url], ensure_ascii=False) + "\n")
+        os.replace(tmp_path, self.articles_path)
+
+    def _save_state(self):
+        """状態ファイルを書き込む（一時ファイル経由で置き換え）"""
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._state, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, self.state_path)
+
+    def _parse_state_time(self, key):
+        value = self._state.get(key)
+        return datetime.fromisoformat(value) if value else None
+
+
+_default_store = None
+
+
+def get_news_store():
+    """
+    デフォルトのニュースストアを取得する（初回呼び出し時に読み込み）
+
+    Returns:
+        NewsStore: 共有ニュースストア
+    """
+    global _default_store
+    if _default_store is None:
+        _default_store = NewsStore()
+    return _default_store
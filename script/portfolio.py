@@ -8,6 +8,24 @@ import datetime
 import pandas as pd
 import yfinance as yf
 import time
+import random
+import threading
+
+from script.prompt_builder import render
+from script.prompt_profile import record_fetch
+from script.currency_graph import solve_rates, split_pair
+from script.valuation import ValuationEngine
+
+# 最新レート取得設定
+LATEST_QUOTE_WINDOW_MINUTES = 15  # まず直近この分数の1分足だけを取得する
+LATEST_QUOTE_FALLBACK_HOURS = 24  # 直近の足が無い通貨ペア（週末・取引停止中など）だけこの範囲で再取得する
+
+# レート取得のリトライ設定
+RATE_FETCH_MAX_ATTEMPTS = 5
+RATE_FETCH_BACKOFF_BASE_SECONDS = 0.5  # 1回目の再試行までの待機時間の上限（以降2倍ずつ、この範囲でランダムに待つ）
+RATE_FETCH_BACKOFF_MAX_SECONDS = 4.0
+RATE_FETCH_DEADLINE_SECONDS = 20.0  # 全ての再試行を含めたレート取得の期限
+RATE_FETCH_REQUEST_TIMEOUT = 10  # 1回のダウンロードのタイムアウト（秒、期限の残り時間の方が短ければそちらを使う）
 
 @dataclass
 class Portfolio:
@@ -153,26 +171,16 @@ class Portfolio:
         
         Returns:
             float: 基準通貨での総資産価値
-        """
-        total = self.balances.get(base_currency, 0)
         
-        for currency, amount in self.balances.items():
-            if currency == base_currency:
-                continue  # 基準通貨はそのまま
-            
-            # 通貨ペアを構築して適切なレートを取得
-            currency_pair = f"{currency}{base_currency}"
-            reverse_pair = f"{base_currency}{currency}"
-            
-            if currency_pair in rates:
-                # 直接のレートがある場合 (例: USDJPY)
-                total += amount * rates[currency_pair]
-            elif reverse_pair in rates:
-                # 逆レートがある場合 (例: JPYUSD)
-                total += amount / rates[reverse_pair]
-            else:
-                raise ValueError(f"通貨 {currency} から {base_currency} への変換レートがありません")
-                
+        Raises:
+            ValueError: 換算する経路が無い通貨がある場合
+        """
+        # 直接・逆レートが無い通貨は取得できたレートを経由して換算する
+        engine = ValuationEngine.for_balances(self.balances)
+        total = engine.total(self.balances, rates, base_currency)
+        if total is None:
+            missing = engine.missing_currencies(self.balances, rates, base_currency)
+            raise ValueError(f"通貨 {', '.join(missing)} から {base_currency} への変換レートがありません")
         return total
     
     def summary(self, rates: Dict[str, float], base_currency: str = "JPY") -> Dict:
@@ -187,21 +195,7 @@ class Portfolio:
             Dict: ポートフォリオの概要情報
         """
         # 各通貨の価値を基準通貨で計算
-        values = {}
-        for currency, amount in self.balances.items():
-            if currency == base_currency:
-                values[currency] = amount
-            else:
-                # 通貨ペアを構築
-                currency_pair = f"{currency}{base_currency}"
-                reverse_pair = f"{base_currency}{currency}"
-                
-                if currency_pair in rates:
-                    values[currency] = amount * rates[currency_pair]
-                elif reverse_pair in rates:
-                    values[currency] = amount / rates[reverse_pair]
-                else:
-                    values[currency] = None  # レートがない場合
+        values = ValuationEngine.for_balances(self.balances).values(self.balances, rates, base_currency)  # レートがない通貨はNone
         
         return {
             "balances": dict(self.balances),
@@ -230,14 +224,22 @@ class Portfolio:
         self,
         currency_pairs=None,
         current_time: datetime.datetime | None = None,
+        deadline: float | None = RATE_FETCH_DEADLINE_SECONDS,
+        cancel_event: threading.Event | None = None,
     ) -> Dict[str, float] | None:
 
         """
         指定された通貨ペアの現在のレートをYFinanceから取得
         交差レート計算機能付き
         
+        取得できなかった通貨ペアだけを指数バックオフ（ジッター付き）で再取得し、
+        2つの通貨ペアが揃った時点で残りは交差レートで補う。
+        
         Args:
             currency_pairs: 通貨ペアのリスト（デフォルトはUSDJPY, EURJPY, EURUSD）
+            current_time: 基準時刻（naiveの場合はJST）
+            deadline: 全ての再試行を含めた期限（秒）。Noneの場合は期限なし
+            cancel_event: セットされると再試行を中止するイベント
         
         Returns:
             Dict[str, float] | None: 通貨ペアとレートのマッピング。取得できなかった場合はNone
@@ -254,98 +256,58 @@ class Portfolio:
         else:
             current_time_utc = current_time.astimezone(datetime.timezone.utc).replace(tzinfo=None)
 
-        start = current_time_utc - datetime.timedelta(days=1)
-        end = current_time_utc
-        
-        # 通貨ペアの=Xを追加（YFinance形式に変換）
-        formatted_pairs = []
-        for pair in currency_pairs:
-            if not pair.endswith("=X"):
-                formatted_pairs.append(f"{pair}=X")
-            else:
-                formatted_pairs.append(pair)
-        
+        # 通貨ペアの=Xを除いた表記に揃える
+        clean_pairs = [pair.replace("=X", "") for pair in currency_pairs]
+        deadline_at = time.monotonic() + deadline if deadline is not None else None
+
         try:
             rates = {}
-            for i in range(5):  # 最大5回リトライ
-                # YFinanceからデータを取得
-                data = yf.download(
-                    formatted_pairs,
-                    start=start,
-                    end=end,
-                    interval="1m",
-                    group_by="ticker",
-                    progress=False,
-                )
+            # 通貨ペアの=Xを追加（YFinance形式に変換）。再試行では未取得の通貨ペアだけを取得する
+            pending = [f"{pair}=X" for pair in clean_pairs]
+            for i in range(RATE_FETCH_MAX_ATTEMPTS):
+                if cancel_event is not None and cancel_event.is_set():
+                    print("レート取得が中止されました")
+                    break
+
+                timeout = RATE_FETCH_REQUEST_TIMEOUT
+                if deadline_at is not None:
+                    remaining = deadline_at - time.monotonic()
+                    if remaining <= 0:
+                        print(f"レート取得の期限（{deadline}秒）を過ぎました")
+                        break
+                    timeout = max(1, min(timeout, remaining))
 
-                rates.clear()
-
-                for pair in formatted_pairs:
-                    clean_pair = pair.replace("=X", "")
-                    try:
-                        # 最新のClose価格を取得
-                        if len(data) > 0:
-                            if isinstance(data, pd.DataFrame) and pair in data:
-                                latest_price = data[pair]["Close"].iloc[-1]
-                            else:
-                                latest_price = data[(pair, "Close")].iloc[-1]
-                            if pd.notna(latest_price):
-                                rates[clean_pair] = float(latest_price)
-                            else:
-                                print(f"警告: {pair}の最新価格がNaNです")
-                        else:
-                            print(f"警告: {pair}のデータがありません")
-                    except Exception as e:
-                        print(f"エラー: {pair}のデータ取得に失敗しました: {e}")
-
-                # 交差レート計算
-                if (
-                    ("EURUSD" not in rates or pd.isna(rates.get("EURUSD")))
-                    and "EURJPY" in rates
-                    and "USDJPY" in rates
-                    and pd.notna(rates["USDJPY"])
-                    and rates["USDJPY"] != 0
-                ):
-                    rates["EURUSD"] = rates["EURJPY"] / rates["USDJPY"]
-                    print(
-                        f"EURUSD: 交差レートで計算しました → {rates['EURUSD']:.6f}"
-                    )
-
-                if (
-                    ("EURJPY" not in rates or pd.isna(rates.get("EURJPY")))
-                    and "EURUSD" in rates
-                    and "USDJPY" in rates
-                    and pd.notna(rates["EURUSD"])
-                ):
-                    rates["EURJPY"] = rates["EURUSD"] * rates["USDJPY"]
-                    print(
-                        f"EURJPY: 交差レートで計算しました → {rates['EURJPY']:.4f}"
-                    )
-
-                if (
-                    ("USDJPY" not in rates or pd.isna(rates.get("USDJPY")))
-                    and "EURJPY" in rates
-                    and "EURUSD" in rates
-                    and pd.notna(rates["EURUSD"])
-                    and rates["EURUSD"] != 0
-                ):
-                    rates["USDJPY"] = rates["EURJPY"] / rates["EURUSD"]
-                    print(
-                        f"USDJPY: 交差レートで計算しました → {rates['USDJPY']:.4f}"
-                    )
+                # 直近数分の足から最新のClose価格を取得（足が無い通貨ペアだけ広い範囲で再取得）
+                rates.update(self.get_latest_quotes(pending, current_time_utc, timeout=timeout))
+
+                # 交差レート計算（取得できた通貨ペアから求まる通貨ペアは再取得しない）
+                self._apply_cross_rates(rates, clean_pairs)
 
                 missing = [
                     pair
-                    for pair in currency_pairs
+                    for pair in clean_pairs
                     if pair not in rates or pd.isna(rates[pair])
                 ]
                 if not missing:
                     return rates
+                if i == RATE_FETCH_MAX_ATTEMPTS - 1:
+                    break
 
+                # 指数バックオフ（フルジッター）。期限の残り時間より長くは待たない
+                delay = random.uniform(0, min(RATE_FETCH_BACKOFF_MAX_SECONDS, RATE_FETCH_BACKOFF_BASE_SECONDS * 2 ** i))
+                if deadline_at is not None:
+                    delay = min(delay, max(0.0, deadline_at - time.monotonic()))
                 print(
-                    f"警告: {', '.join(missing)}のレートが取得できませんでした、リトライします ({i+1}/5回目)"
+                    f"警告: {', '.join(missing)}のレートが取得できませんでした、"
+                    f"{delay:.1f}秒後に未取得分のみ再取得します ({i+1}/{RATE_FETCH_MAX_ATTEMPTS}回目)"
                 )
-                time.sleep(2)  # 2秒待機してから再試行
+                if cancel_event is not None:
+                    if cancel_event.wait(delay):
+                        print("レート取得が中止されました")
+                        break
+                else:
+                    time.sleep(delay)
+                pending = [f"{pair}=X" for pair in missing]
 
             # 最終的に全てのレートが揃わなかった場合は失敗とみなす
             return None
@@ -353,6 +315,111 @@ class Portfolio:
         except Exception as e:
             print(f"レート取得エラー: {e}")
             return {}
+
+    @staticmethod
+    def _apply_cross_rates(rates: Dict[str, float], currency_pairs: List[str]) -> None:
+        """
+        取得できなかった通貨ペアを、取得できた通貨ペアを経由する交差レートで補う
+        
+        Args:
+            rates: 通貨ペアとレートのマッピング（その場で更新する）
+            currency_pairs: 必要な通貨ペアのリスト
+        """
+        missing = [pair for pair in currency_pairs if pair not in rates or pd.isna(rates[pair])]
+        if not missing:
+            return
+
+        graph = solve_rates({pair: rate for pair, rate in rates.items() if pd.notna(rate)})
+        for pair, rate in graph.fill(missing).items():
+            rates[pair] = rate
+            print(
+                f"{pair}: 交差レートで計算しました（{' → '.join(graph.path(*split_pair(pair)))}）→ {rate:.6f}"
+            )
+
+    def get_latest_quotes(
+        self,
+        formatted_pairs: List[str],
+        current_time_utc: datetime.datetime,
+        timeout: float = RATE_FETCH_REQUEST_TIMEOUT,
+    ) -> Dict[str, float]:
+        """
+        通貨ペアの最新のClose価格を取得
+        
+        丸1日分の1分足ではなく直近LATEST_QUOTE_WINDOW_MINUTES分の足だけを取得し、
+        その範囲に足が無い通貨ペアだけをLATEST_QUOTE_FALLBACK_HOURS時間の範囲で再取得する。
+        
+        Args:
+            formatted_pairs: YFinance形式の通貨ペアのリスト（例: ["USDJPY=X"]）
+            current_time_utc: 基準時刻（UTC）
+            timeout: 1回のダウンロードのタイムアウト（秒）
+        
+        Returns:
+            Dict[str, float]: 通貨ペア（=Xなし）と最新価格のマッピング。取得できなかった通貨ペアは含まない
+        """
+        window = datetime.timedelta(minutes=LATEST_QUOTE_WINDOW_MINUTES)
+        quotes = self._download_latest_closes(formatted_pairs, current_time_utc - window, current_time_utc, timeout)
+
+        stale_pairs = [pair for pair in formatted_pairs if pair.replace("=X", "") not in quotes]
+        if stale_pairs:
+            print(
+                f"直近{LATEST_QUOTE_WINDOW_MINUTES}分の足が無いため、"
+                f"{', '.join(stale_pairs)}を過去{LATEST_QUOTE_FALLBACK_HOURS}時間の範囲で再取得します"
+            )
+            fallback = datetime.timedelta(hours=LATEST_QUOTE_FALLBACK_HOURS)
+            quotes.update(self._download_latest_closes(stale_pairs, current_time_utc - fallback, current_time_utc, timeout))
+
+        return quotes
+
+    @staticmethod
+    def _download_latest_closes(
+        formatted_pairs: List[str],
+        start: datetime.datetime,
+        end: datetime.datetime,
+        timeout: float = RATE_FETCH_REQUEST_TIMEOUT,
+    ) -> Dict[str, float]:
+        """
+        指定範囲の1分足をYFinanceから取得し、通貨ペアごとの最後の有効なClose価格を返す
+        
+        Args:
+            formatted_pairs: YFinance形式の通貨ペアのリスト
+            start: 取得開始時刻（UTC）
+            end: 取得終了時刻（UTC）
+            timeout: ダウンロードのタイムアウト（秒）
+        
+        Returns:
+            Dict[str, float]: 通貨ペア（=Xなし）と最新価格のマッピング
+        """
+        fetch_started = time.perf_counter()
+        data = yf.download(
+            formatted_pairs,
+            start=start,
+            end=end,
+            interval="1m",
+            group_by="ticker",
+            progress=False,
+            timeout=timeout,
+        )
+        window_minutes = int((end - start).total_seconds() // 60)
+        record_fetch("rates", f"{','.join(formatted_pairs)} {window_minutes}m", False,
+                     time.perf_counter() - fetch_started, rows=len(data))
+
+        closes = {}
+        if data is None or len(data) == 0:
+            return closes
+
+        for pair in formatted_pairs:
+            try:
+                if isinstance(data, pd.DataFrame) and pair in data:
+                    close = data[pair]["Close"]
+                else:
+                    close = data[(pair, "Close")]
+                close = close.dropna()
+                if len(close) > 0:
+                    closes[pair.replace("=X", "")] = float(close.iloc[-1])
+            except Exception as e:
+                print(f"エラー: {pair}のデータ取得に失敗しました: {e}")
+
+        return closes
     
     def apply_spread(self, rate: float, currency_pair: str, is_buy: bool) -> float:
         """
@@ -426,30 +493,40 @@ class Portfolio:
         
         return self.execute_trade_with_spread(base_currency, quote_currency, amount)
     
-    def get_market_data_summary(self, current_time: datetime.datetime | None = None) -> Dict | None:
+    def get_market_data_summary(self, current_time: datetime.datetime | None = None, snapshot=None) -> Dict | None:
 
         """
         現在の市場データと自分のポートフォリオ情報をまとめて取得
         
+        Args:
+            current_time: 基準時刻（naiveの場合はJST）
+            snapshot: サイクルで取得済みのMarketSnapshot（渡された場合はレートを取得し直さない）
+        
         Returns:
             Dict | None: 市場データとポートフォリオの概要。レート取得に失敗した場合はNone
         """
-        # 主要通貨ペアのレートを取得
-        market_rates = self.get_current_rates(current_time=current_time)
-        if market_rates is None:
-            return None
+        if snapshot is not None:
+            market_rates = dict(snapshot.market_rates)
+            bank_rates = snapshot.bank_rates()
+            if current_time is None:
+                current_time = snapshot.timestamp
+        else:
+            # 主要通貨ペアのレートを取得
+            market_rates = self.get_current_rates(current_time=current_time)
+            if market_rates is None:
+                return None
 
-        # スプレッド適用済みのレートを計算
-        bank_rates = {
-            pair: {
-                "buy_rate": self.apply_spread(rate, pair, True),
-                "sell_rate": self.apply_spread(rate, pair, False),
-                "market_rate": rate,
-                "buy_spread": self.apply_spread(rate, pair, True) - rate,
-                "sell_spread": rate - self.apply_spread(rate, pair, False)
-            } 
-            for pair, rate in market_rates.items()
-        }
+            # スプレッド適用済みのレートを計算
+            bank_rates = {
+                pair: {
+                    "buy_rate": self.apply_spread(rate, pair, True),
+                    "sell_rate": self.apply_spread(rate, pair, False),
+                    "market_rate": rate,
+                    "buy_spread": self.apply_spread(rate, pair, True) - rate,
+                    "sell_spread": rate - self.apply_spread(rate, pair, False)
+                } 
+                for pair, rate in market_rates.items()
+            }
         
         # JPYでの総資産を計算
         total_jpy = None
@@ -472,10 +549,10 @@ class Portfolio:
         }
     
     def display_market_info(
-        self, current_time: datetime.datetime | None = None
+        self, current_time: datetime.datetime | None = None, snapshot=None
     ) -> tuple[str, pd.DataFrame | None]:
-        """現在の市場情報とポートフォリオ状況を表示"""
-        market_data = self.get_market_data_summary(current_time)
+        """現在の市場情報とポートフォリオ状況を表示（snapshotが渡された場合はそのレートを使う）"""
+        market_data = self.get_market_data_summary(current_time, snapshot)
         if market_data is None:
             print("レート取得に失敗したため、市場情報を表示できません")
             return "", None
@@ -490,18 +567,10 @@ class Portfolio:
         # else:
         #     trades_text = "【取引履歴】\n  取引履歴なし"
 
-        market_info_text = (
-            "=" * 50 + "\n"
-            f"市場情報 - {market_data['timestamp']}\n"
-            + "=" * 50 + "\n\n"
-            "【為替レート】\n"
-            + "\n".join(
-            f"{pair}:\n"
-            f"  市場レート: {rates['market_rate']:.4f}\n"
-            f"  銀行買値(Ask): {rates['buy_rate']:.4f} (スプレッド: +{rates['buy_spread']:.4f})\n"
-            f"  銀行売値(Bid): {rates['sell_rate']:.4f} (スプレッド: -{rates['sell_spread']:.4f})"
-            for pair, rates in market_data['bank_rates'].items()
-            ) + "\n\n"
+        market_info_text = render(
+            "market_info",
+            timestamp=market_data['timestamp'],
+            bank_rates=list(market_data['bank_rates'].items())
         )
         print(market_info_text)
         
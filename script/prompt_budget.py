@@ -0,0 +1,185 @@
+"""
+プロンプトのトークン予算 - セクションごとに予算を割り当て、優先度の低い内容から削って収める
+"""
+
+import json
+import math
+import os
+
+# トークン予算設定
+PROMPT_TOKEN_BUDGET = 8192  # プロンプト全体の上限
+PROMPT_SECTION_BUDGETS = {  # セクションごとの上限
+    "technicals": 3000,
+    "news": 3000,
+    "portfolio": 400,
+    "history": 1200,
+}
+# 全体の上限を超えた場合に削る順番（小さいほど先に削る）
+PROMPT_SECTION_PRIORITIES = {
+    "history": 0,
+    "news": 1,
+    "technicals": 2,
+    "portfolio": 3,
+}
+PROMPT_TOKENS_FILE = "prompt_tokens.json"  # 実行ディレクトリに保存するトークン数の記録
+
+# トークナイザーが無い場合の概算（UTF-8のバイト数あたりのトークン数）
+ESTIMATED_BYTES_PER_TOKEN = 4
+
+
+class TokenCounter:
+    """
+    ロード済みプロセッサーのトークナイザーでトークン数を数えるクラス
+
+    プロセッサーが無い場合はUTF-8のバイト数から概算する。
+    """
+
+    def __init__(self, processor=None):
+        """
+        Args:
+            processor: transformersのプロセッサー（tokenizer属性を持つ）またはトークナイザー
+        """
+        self.tokenizer = getattr(processor, "tokenizer", processor)
+        self._cache = {}
+
+    @property
+    def estimated(self):
+        """トークン数が概算かどうか"""
+        return self.tokenizer is None
+
+    @property
+    def name(self):
+        """トークナイザーの名前"""
+        if self.tokenizer is None:
+            return f"estimate({ESTIMATED_BYTES_PER_TOKEN} bytes/token)"
+        return getattr(self.tokenizer, "name_or_path", None) or type(self.tokenizer).__name__
+
+    def count(self, text):
+        """
+        テキストのトークン数を数える
+
+        Args:
+            text (str): 対象テキスト
+
+        Returns:
+            int: トークン数
+        """
+        if not text:
+            return 0
+        if text not in self._cache:
+            if self.tokenizer is None:
+                tokens = math.ceil(len(text.encode("utf-8")) / ESTIMATED_BYTES_PER_TOKEN)
+            else:
+                tokens = len(self.tokenizer.encode(text, add_special_tokens=False))
+            self._cache[text] = tokens
+        return self._cache[text]
+
+
+class BudgetedSection:
+    """
+    段階的に削れるプロンプトのセクション
+
+    render(level) は level=0 で全文を返し、level を上げるほど短いテキストを返す。
+    """
+
+    def __init__(self, name, render, max_level, budget=None, priority=None):
+        """
+        Args:
+            name (str): セクション名
+            render (callable): 削減段階を受け取りテキストを返す関数
+            max_level (int): 最も削った段階
+            budget (int): セクションのトークン上限（省略時はPROMPT_SECTION_BUDGETS）
+            priority (int): 削る順番（省略時はPROMPT_SECTION_PRIORITIES）
+        """
+        self.name = name
+        self._render = render
+        self.max_level = max_level
+        self.budget = PROMPT_SECTION_BUDGETS.get(name) if budget is None else budget
+        self.priority = PROMPT_SECTION_PRIORITIES.get(name, 0) if priority is None else priority
+        self.level = 0
+        self._texts = {}
+
+    @property
+    def text(self):
+        """現在の削減段階のテキスト"""
+        if self.level not in self._texts:
+            self._texts[self.level] = self._render(self.level)
+        return self._texts[self.level]
+
+    def can_trim(self):
+        return self.level < self.max_level
+
+
+def fit_sections(sections, counter, total_budget=PROMPT_TOKEN_BUDGET, fixed_text=""):
+    """
+    各セクションを予算内に収める
+
+    まずセクションごとの上限まで削り、それでも全体の上限を超える場合は
+    優先度の低いセクションから1段階ずつ削る。
+
+    Args:
+        sections (list): BudgetedSectionのリスト
+        counter (TokenCounter): トークン数を数えるカウンター
+        total_budget (int): プロンプト全体の上限
+        fixed_text (str): 削れない部分（市場情報・質問など）のテキスト
+
+    Returns:
+        dict: セクション名 -> {"tokens", "budget", "level", "trimmed"} の記録
+    """
+    for section in sections:
+        while section.budget is not None and counter.count(section.text) > section.budget and section.can_trim():
+            section.level += 1
+
+    fixed_tokens = counter.count(fixed_text)
+    by_priority = sorted(sections, key=lambda s: s.priority)
+    while fixed_tokens + sum(counter.count(s.text) for s in sections) > total_budget:
+        trimmable = [s for s in by_priority if s.can_trim()]
+        if not trimmable:
+            print("警告: 全セクションを最小まで削ってもトークン予算に収まりません")
+            break
+        trimmable[0].level += 1
+
+    report = {}
+    for section in sections:
+        tokens = counter.count(section.text)
+        if section.level:
+            print(f"{section.name}: 削減段階{section.level}に縮小しました（{tokens}トークン）")
+        report[section.name] = {
+            "tokens": tokens,
+            "budget": section.budget,
+            "level": section.level,
+            "trimmed": section.level > 0,
+        }
+    return report
+
+
+def save_token_report(output_dir, prompt, counter, sections_report, total_budget=PROMPT_TOKEN_BUDGET,
+                      section_reuse=None):
+    """
+    最終的なプロンプトのトークン数を実行ディレクトリに保存する
+
+    Args:
+        output_dir (str): 実行ディレクトリ
+        prompt (str): 完成したプロンプト
+        counter (TokenCounter): トークン数を数えるカウンター
+        sections_report (dict): fit_sectionsの記録
+        total_budget (int): プロンプト全体の上限
+        section_reuse (dict): 前回から再利用したセクションと描画したセクションの一覧
+
+    Returns:
+        dict: 保存した記録
+    """
+    report = {
+        "total_tokens": counter.count(prompt),
+        "budget": total_budget,
+        "tokenizer": counter.name,
+        "estimated": counter.estimated,
+        "sections": sections_report,
+    }
+    if section_reuse is not None:
+        report["section_reuse"] = section_reuse
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+        with open(os.path.join(output_dir, PROMPT_TOKENS_FILE), 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    return report
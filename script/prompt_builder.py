@@ -0,0 +1,114 @@
+"""
+プロンプトビルダー - コンパイル済みのJinja2テンプレートと構造化データからプロンプトを組み立てる
+"""
+
+import hashlib
+import os
+from functools import lru_cache
+
+from jinja2 import Environment, FileSystemLoader, StrictUndefined
+
+# テンプレート設定
+PROMPT_TEMPLATE_DIR = os.path.join(os.path.dirname(__file__), 'templates')
+
+# テンプレートのバージョン（プロンプトの文面を変えたら上げる）
+PROMPT_TEMPLATE_VERSIONS = {
+    "technicals": 3,
+    "technicals_daily": 1,
+    "news": 2,
+    "market_info": 1,
+    "trade_info": 1,
+    "question": 1,
+}
+
+# セクション間の区切り
+TECHNICALS_SEPARATOR = "\n==============================================\n"
+
+_environment = Environment(
+    loader=FileSystemLoader(PROMPT_TEMPLATE_DIR),
+    undefined=StrictUndefined,
+    trim_blocks=True,
+    lstrip_blocks=True,
+    keep_trailing_newline=True,
+    autoescape=False,
+)
+
+# 起動時に全テンプレートをコンパイルしておく
+_templates = {name: _environment.get_template(f"{name}.j2") for name in PROMPT_TEMPLATE_VERSIONS}
+
+
+@lru_cache(maxsize=None)
+def template_id(name):
+    """
+    テンプレートの識別子を返す（バージョンとテンプレート本文のハッシュ）
+
+    バージョンを上げ忘れてもテンプレート本文が変われば識別子が変わるため、
+    セクションのキャッシュキーやプロンプトの差分確認に使える。
+
+    Args:
+        name (str): テンプレート名
+
+    Returns:
+        str: "名前@vバージョン-ハッシュ" 形式の識別子
+    """
+    with open(os.path.join(PROMPT_TEMPLATE_DIR, f"{name}.j2"), 'rb') as f:
+        digest = hashlib.sha256(f.read()).hexdigest()[:8]
+    return f"{name}@v{PROMPT_TEMPLATE_VERSIONS[name]}-{digest}"
+
+
+def render(name, **context):
+    """
+    コンパイル済みテンプレートでセクションを描画する
+
+    Args:
+        name (str): テンプレート名
+        **context: テンプレートに渡すデータ
+
+    Returns:
+        str: 描画したテキスト
+    """
+    return _templates[name].render(**context)
+
+
+class PromptBuilder:
+    """
+    プロンプトを部品のリストとして組み立て、最後に1回だけ結合するクラス
+
+    各セクションの名前とテンプレートの識別子を記録するので、
+    どのテンプレートのどのバージョンでプロンプトを作ったかを後から確認できる。
+    """
+
+    def __init__(self):
+        self._parts = []
+        self.sections = []  # {"name": セクション名, "template": テンプレート識別子} のリスト
+
+    def add(self, text):
+        """テキストをそのまま追加する"""
+        if text:
+            self._parts.append(text)
+        return self
+
+    def add_section(self, name, text, template=None):
+        """
+        描画済みのセクションを追加する
+
+        Args:
+            name (str): セクション名
+            text (str): セクションのテキスト
+            template (str): 使用したテンプレート名
+        """
+        self.sections.append({"name": name, "template": template_id(template) if template else None})
+        return self.add(text)
+
+    def render_section(self, name, template, **context):
+        """テンプレートを描画してセクションとして追加する"""
+        return self.add_section(name, render(template, **context), template)
+
+    def build(self):
+        """
+        部品を結合してプロンプトを返す
+
+        Returns:
+            str: プロンプト文字列
+        """
+        return "".join(self._parts)
@@ -0,0 +1,205 @@
+"""
+プロンプト生成プロファイル - セクションごとの所要時間・サイズ・トークン数とデータ取得のキャッシュ状況を記録する
+"""
+
+import json
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# プロファイル設定
+PROMPT_PROFILE_FILE = "prompt_profile.json"  # prompt.txt と同じ実行ディレクトリに保存する
+
+_current_profile = ContextVar("prompt_profile", default=None)
+
+
+class PromptProfile:
+    """
+    1回のプロンプト生成のプロファイル
+
+    セクションごとの所要時間（取得・描画を含む）、出力のバイト数・トークン数、
+    各データ取得（yfinance・ニュース・レート）のキャッシュヒット/ミスと所要時間を記録する。
+    """
+
+    def __init__(self):
+        self._started = time.perf_counter()
+        self.sections = {}
+        self.fetches = []
+        self.total_seconds = None
+
+    @contextmanager
+    def section(self, name):
+        """with ブロックの所要時間をセクションの時間として加算する"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            entry = self.sections.setdefault(name, {"seconds": 0.0})
+            entry["seconds"] = round(entry["seconds"] + time.perf_counter() - started, 4)
+
+    def record_output(self, name, text, tokens=None):
+        """
+        セクションの出力サイズを記録する
+
+        Args:
+            name (str): セクション名
+            text (str): セクションのテキスト
+            tokens (int): トークン数（概算を含む）
+        """
+        entry = self.sections.setdefault(name, {"seconds": 0.0})
+        entry["bytes"] = len(text.encode("utf-8"))
+        if tokens is not None:
+            entry["tokens"] = tokens
+
+    def record_fetch(self, source, key, hit, seconds, **extra):
+        """
+        データ取得を記録する
+
+        Args:
+            source (str): 取得元（"yfinance", "news", "rates" など）
+            key (str): 取得対象（通貨ペア・足の種類など）
+            hit (bool): キャッシュ（またはローカルストア）で賄えたかどうか
+            seconds (float): 所要時間
+            **extra: 追加情報（件数など）
+        """
+        self.fetches.append({"source": source, "key": key, "hit": hit, "seconds": round(seconds, 4), **extra})
+
+    def finish(self):
+        """全体の所要時間を確定する"""
+        self.total_seconds = round(time.perf_counter() - self._started, 4)
+
+    def to_dict(self):
+        """
+        プロファイルを辞書にまとめる
+
+        Returns:
+            dict: total / sections / fetches / fetch_summary を含む辞書
+        """
+        summary = {}
+        for fetch in self.fetches:
+            entry = summary.setdefault(fetch["source"], {"count": 0, "hits": 0, "misses": 0, "seconds": 0.0})
+            entry["count"] += 1
+            entry["hits" if fetch["hit"] else "misses"] += 1
+            entry["seconds"] = round(entry["seconds"] + fetch["seconds"], 4)
+
+        return {
+            "total": {
+                "seconds": self.total_seconds if self.total_seconds is not None
+                else round(time.perf_counter() - self._started, 4),
+                "bytes": sum(s.get("bytes", 0) for s in self.sections.values()),
+                "tokens": sum(s.get("tokens", 0) for s in self.sections.values()),
+            },
+            "sections": self.sections,
+            "fetches": self.fetches,
+            "fetch_summary": summary,
+        }
+
+    def save(self, output_dir):
+        """
+        プロファイルを実行ディレクトリに保存する
+
+        Args:
+            output_dir (str): 実行ディレクトリ
+
+        Returns:
+            str: 保存したファイルのパス
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        path = os.path.join(output_dir, PROMPT_PROFILE_FILE)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=2, ensure_ascii=False)
+        return path
+
+
+def start_profile():
+    """
+    新しいプロファイルを開始し、以降の record_fetch / profile_section の記録先にする
+
+    Returns:
+        PromptProfile: 開始したプロファイル
+    """
+    profile = PromptProfile()
+    _current_profile.set(profile)
+    return profile
+
+
+def get_profile():
+    """記録中のプロファイルを返す（無い場合はNone）"""
+    return _current_profile.get()
+
+
+def record_fetch(source, key, hit, seconds, **extra):
+    """記録中のプロファイルがあればデータ取得を記録する"""
+    profile = _current_profile.get()
+    if profile is not None:
+        profile.record_fetch(source, key, hit, seconds, **extra)
+
+
+@contextmanager
+def profile_section(name):
+    """記録中のプロファイルがあれば with ブロックの所要時間をセクションに加算する"""
+    profile = _current_profile.get()
+    if profile is None:
+        yield
+        return
+    with profile.section(name):
+        yield
+
+
+def load_profile(run_dir):
+    """
+    実行ディレクトリのプロファイルを読み込む
+
+    Args:
+        run_dir (str): 実行ディレクトリ
+
+    Returns:
+        dict | None: プロファイル。無い場合はNone
+    """
+    path = os.path.join(run_dir, PROMPT_PROFILE_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def format_profile(profile, run_id=None):
+    """
+    プロファイルを表示用のテキストにする
+
+    Args:
+        profile (dict): load_profileで読み込んだプロファイル
+        run_id (str): 実行ID
+
+    Returns:
+        str: 表示用テキスト
+    """
+    total = profile["total"]
+    lines = []
+    if run_id:
+        lines.append(f"実行: {run_id}")
+    lines.append(f"合計: {total['seconds']:.2f}秒, {total['bytes']:,} bytes, {total['tokens']:,} tokens")
+
+    lines.append("")
+    lines.append("セクション:")
+    for name, section in sorted(profile["sections"].items(), key=lambda x: -x[1].get("seconds", 0.0)):
+        lines.append(
+            f"  {name}: {section.get('seconds', 0.0):.2f}秒, "
+            f"{section.get('bytes', 0):,} bytes, {section.get('tokens', 0):,} tokens"
+        )
+
+    if profile.get("fetch_summary"):
+        lines.append("")
+        lines.append("データ取得:")
+        for source, summary in profile["fetch_summary"].items():
+            lines.append(
+                f"  {source}: {summary['count']}回 (ヒット {summary['hits']} / ミス {summary['misses']}), "
+                f"{summary['seconds']:.2f}秒"
+            )
+        slowest = sorted(profile["fetches"], key=lambda f: -f["seconds"])[:3]
+        lines.append("  最も遅い取得: " + ", ".join(
+            f"{f['source']}:{f['key']} {f['seconds']:.2f}秒" for f in slowest
+        ))
+
+    return "\n".join(lines)
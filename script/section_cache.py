@@ -0,0 +1,97 @@
+"""
+セクションキャッシュ - 前回のプロンプト生成で描画したセクションを入力のハッシュで再利用する
+"""
+
+import hashlib
+import json
+import os
+import threading
+
+# キャッシュ設定
+SECTION_CACHE_FILE = os.path.join(os.path.dirname(__file__), '..', 'cache', 'prompt_sections.json')
+
+
+def hash_inputs(*inputs):
+    """
+    セクションの入力データのハッシュを計算する
+
+    Args:
+        *inputs: JSONに変換できる入力データ（変換できない値は文字列化する）
+
+    Returns:
+        str: SHA-256のハッシュ値
+    """
+    payload = json.dumps(inputs, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SectionCache:
+    """
+    描画済みセクションのキャッシュ
+
+    前回のプロンプト生成で使ったセクションを (セクションキー -> 入力ハッシュ, テキスト) として保存し、
+    入力が変わっていないセクションは描画せずに再利用する。保存されるのは今回使ったセクションだけなので、
+    ファイルは常に直前の1サイクル分の大きさに保たれる。
+    """
+
+    def __init__(self, path=SECTION_CACHE_FILE):
+        self.path = os.path.abspath(path)
+        self._lock = threading.Lock()
+        self._previous = {}
+        self._current = {}
+        self.reused = []
+        self.rendered = []
+        self._load()
+
+    def get_or_render(self, key, input_hash, render):
+        """
+        入力が前回と同じならキャッシュしたテキストを返し、変わっていれば描画する
+
+        Args:
+            key (str): セクションキー（例: "news:2"）
+            input_hash (str): セクションの入力ハッシュ（テンプレートの識別子を含める）
+            render (callable): テキストを描画する関数
+
+        Returns:
+            str: セクションのテキスト
+        """
+        with self._lock:
+            if key in self._current and self._current[key]["hash"] == input_hash:
+                return self._current[key]["text"]
+
+            entry = self._previous.get(key)
+            if entry is not None and entry.get("hash") == input_hash:
+                self.reused.append(key)
+            else:
+                entry = {"hash": input_hash, "text": render()}
+                self.rendered.append(key)
+            self._current[key] = entry
+            return entry["text"]
+
+    def report(self):
+        """
+        再利用したセクションと描画したセクションの一覧を返す
+
+        Returns:
+            dict: {"reused": [...], "rendered": [...]}
+        """
+        return {"reused": list(self.reused), "rendered": list(self.rendered)}
+
+    def save(self):
+        """今回使ったセクションを保存する（一時ファイル経由で置き換え）"""
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._current, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self._previous = json.load(f)
+        except (json.JSONDecodeError, OSError) as e:
+            print(f"セクションキャッシュの読み込みエラー: {e}")
+            self._previous = {}
@@ -0,0 +1,192 @@
+"""
+差分バックアップ - 書き込みのたびにファイル全体を複製せず、前回のバックアップ以降に増えた部分だけを保存する
+
+past_data/
+    manifest.json       バックアップの一覧（古い順）と、セグメントの連なり（チェーン）
+    <チェーン>_<n>.seg  チェーンのn番目のセグメント
+
+チェーンは元ファイルの先頭からの内容を、セグメントを順に連結した形で保持する。
+追記の前のバックアップは、同じチェーンに前回以降の末尾だけをセグメントとして足す。
+ファイルが作り直された（ヘッダー行が違う・前回より短い）場合や作り直しの前のバックアップは、
+全体を1つ目のセグメントとする新しいチェーンを始める（セグメントが BACKUP_MAX_SEGMENTS 個に達した場合も同様）。
+各バックアップは (チェーン, その時点のサイズ) で表すため、復元はチェーンを連結してそのサイズで切り詰めればよい。
+
+ファイル名は連番のため、同じ秒に複数回書き込んでもバックアップは上書きされない。
+古いバックアップの削除は一覧の先頭を1件外すだけで、どのバックアップからも参照されなくなったチェーンのセグメントを消す。
+"""
+
+import json
+import os
+import threading
+from datetime import datetime
+
+# バックアップ設定
+BACKUP_MANIFEST_FILE = "manifest.json"
+BACKUP_SEGMENT_SUFFIX = ".seg"
+BACKUP_MAX_SEGMENTS = 64  # チェーンのセグメントがこの数に達したら全体を保存して新しいチェーンを始める
+
+
+class SegmentBackup:
+    """1つのファイルの差分バックアップ"""
+
+    def __init__(self, source_path, backup_dir, keep_count):
+        """
+        Args:
+            source_path (str): バックアップするファイル
+            backup_dir (str): バックアップの保存先（past_data）
+            keep_count (int): 保持するバックアップの件数
+        """
+        self.source_path = source_path
+        self.backup_dir = os.path.abspath(backup_dir)
+        self.keep_count = keep_count
+        self._lock = threading.Lock()
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.backup_dir, BACKUP_MANIFEST_FILE)
+
+    def _segment_path(self, chain_id, index):
+        return os.path.join(self.backup_dir, f"{chain_id}_{index}{BACKUP_SEGMENT_SUFFIX}")
+
+    def load_manifest(self):
+        """
+        マニフェストを読み込む
+
+        Returns:
+            dict: {"next_seq", "entries": [{"seq", "created_at", "chain", "size"}], "chains": {チェーン: {...}}}
+        """
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"next_seq": 1, "entries": [], "chains": {}}
+
+    def _save_manifest(self, manifest):
+        tmp_path = f"{self.manifest_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        os.replace(tmp_path, self.manifest_path)
+
+    def backup(self, append=False):
+        """
+        現在のファイルをバックアップする（書き込みの直前に呼ぶ）
+
+        Args:
+            append (bool): 直後の書き込みが追記の場合True（前回以降の末尾だけを保存できる）
+
+        Returns:
+            int | None: バックアップの連番。ファイルが無い場合はNone
+        """
+        with self._lock:
+            if not os.path.exists(self.source_path):
+                return None
+            os.makedirs(self.backup_dir, exist_ok=True)
+            manifest = self.load_manifest()
+            seq = manifest["next_seq"]
+
+            with open(self.source_path, 'rb') as f:
+                header = f.readline()
+                size = os.fstat(f.fileno()).st_size
+                chain_id = manifest["entries"][-1]["chain"] if manifest["entries"] else None
+                chain = manifest["chains"].get(chain_id)
+                extends = (
+                    append and chain is not None and chain["segments"] < BACKUP_MAX_SEGMENTS
+                    and chain["header"] == header.decode("utf-8", "replace") and size >= chain["size"]
+                )
+                if extends:
+                    # 前回のバックアップ以降に追記された部分だけを保存する
+                    if size > chain["size"]:
+                        f.seek(chain["size"])
+                        self._write_segment(chain_id, chain["segments"], f.read(size - chain["size"]))
+                        chain["segments"] += 1
+                        chain["size"] = size
+                else:
+                    # 新しいチェーンを始め、ファイル全体を1つ目のセグメントにする
+                    chain_id = f"{seq:08d}"
+                    f.seek(0)
+                    self._write_segment(chain_id, 0, f.read(size))
+                    chain = {"header": header.decode("utf-8", "replace"), "segments": 1, "size": size}
+                    manifest["chains"][chain_id] = chain
+
+            manifest["entries"].append({
+                "seq": seq,
+                "created_at": datetime.now().isoformat(),
+                "chain": chain_id,
+                "size": size
+            })
+            manifest["next_seq"] = seq + 1
+            self._prune(manifest)
+            self._save_manifest(manifest)
+            return seq
+
+    def _write_segment(self, chain_id, index, data):
+        with open(self._segment_path(chain_id, index), 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _prune(self, manifest):
+        # 一覧の先頭から外し、参照されなくなったチェーンを削除する（チェーンは古い順に並ぶため先頭だけ見ればよい）
+        entries = manifest["entries"]
+        while len(entries) > self.keep_count:
+            dropped = entries.pop(0)
+            if entries[0]["chain"] != dropped["chain"]:
+                chain = manifest["chains"].pop(dropped["chain"], None)
+                for index in range(chain["segments"] if chain else 0):
+                    try:
+                        os.remove(self._segment_path(dropped["chain"], index))
+                    except FileNotFoundError:
+                        pass
+
+    def latest(self):
+        """最新のバックアップ（無い場合はNone）"""
+        entries = self.load_manifest()["entries"]
+        return entries[-1] if entries else None
+
+    def read(self, entry):
+        """
+        バックアップ時点のファイルの内容を組み立てる
+
+        Args:
+            entry (dict): マニフェストのバックアップ
+
+        Returns:
+            bytes: ファイルの内容
+        """
+        chain = self.load_manifest()["chains"][entry["chain"]]
+        parts = []
+        remaining = entry["size"]
+        for index in range(chain["segments"]):
+            if remaining <= 0:
+                break
+            with open(self._segment_path(entry["chain"], index), 'rb') as f:
+                data = f.read(remaining)
+            parts.append(data)
+            remaining -= len(data)
+        return b"".join(parts)
+
+    def restore(self, entry=None):
+        """
+        バックアップからファイルを復元する（一時ファイル経由で置き換え）
+
+        Args:
+            entry (dict): 復元するバックアップ（省略時は最新）
+
+        Returns:
+            dict: 復元したバックアップ
+
+        Raises:
+            FileNotFoundError: バックアップが無い場合
+        """
+        with self._lock:
+            entry = entry or self.latest()
+            if entry is None:
+                raise FileNotFoundError("バックアップが見つかりません")
+            data = self.read(entry)
+            tmp_path = f"{self.source_path}.{os.getpid()}.restore"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.source_path)
+            return entry
@@ -0,0 +1,583 @@
+"""
+SQLiteストア - 取引ログと残高をSQLite（WALモード）に保存する
+
+Slack Bot の STORAGE_BACKEND=sqlite で使う保存先と、推論サブプロセスからの読み込みで共有する。
+取引は検索に使う列（id, timestamp, user_id, type, status, currency_pair）と元の辞書全体（data列）を持つ。
+書き込みのたびに書き込み前の状態を undo_journal に記録し、JSONファイルのバックアップと同じく
+直前の書き込みの前の状態に戻せるようにする（restore_last）。
+
+移行ツール:
+    python -m script.sqlite_store --log data/log/transaction_log.jsonl --balance data/balance/balance.json --db data/forex.db
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+from script.jsonl_log import is_jsonl_log, read_records
+from script.log_checkpoint import read_all_records
+
+# SQLite設定
+SQLITE_BUSY_TIMEOUT_SECONDS = 10
+SQLITE_HEADER = b"SQLite format 3\x00"
+SQLITE_UNDO_JOURNAL_KEEP = 10  # 保持する書き込み前の状態の件数（対象ごと）
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS transactions (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL UNIQUE,
+    timestamp TEXT,
+    user_id TEXT,
+    type TEXT,
+    status TEXT,
+    currency_pair TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_transactions_timestamp ON transactions(timestamp);
+CREATE INDEX IF NOT EXISTS idx_transactions_user_id ON transactions(user_id, timestamp);
+CREATE INDEX IF NOT EXISTS idx_transactions_type ON transactions(type, seq);
+CREATE INDEX IF NOT EXISTS idx_transactions_currency_pair ON transactions(currency_pair);
+
+CREATE TABLE IF NOT EXISTS balances (
+    currency TEXT PRIMARY KEY,
+    amount REAL NOT NULL,
+    updated_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS balance_history (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT NOT NULL,
+    balances TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS undo_journal (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    target TEXT NOT NULL,
+    op TEXT NOT NULL,
+    record_id TEXT,
+    data TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_undo_journal_target ON undo_journal(target, seq);
+"""
+
+# 取引の辞書から検索用の列に写すキー
+_INDEXED_COLUMNS = ("timestamp", "user_id", "type", "status", "currency_pair")
+
+
+def is_sqlite_file(path):
+    """
+    ファイルがSQLiteのデータベースかどうかを返す
+
+    Args:
+        path (str): ファイルパス
+
+    Returns:
+        bool: SQLiteのデータベースの場合True
+    """
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(SQLITE_HEADER)) == SQLITE_HEADER
+    except OSError:
+        return False
+
+
+class SqliteDatabase:
+    """
+    スレッドごとに接続を持つSQLiteデータベース
+
+    WALモードで開くため、Botの書き込み中も推論サブプロセスから読み込める。
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): データベースファイルのパス
+        """
+        self.path = os.path.abspath(path)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._local = threading.local()
+        with self.connection() as conn:
+            conn.executescript(_SCHEMA)
+
+    def connection(self):
+        """
+        このスレッドの接続を返す（with ブロックで使うとトランザクションになる）
+
+        Returns:
+            sqlite3.Connection: 接続
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=SQLITE_BUSY_TIMEOUT_SECONDS)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+
+def _row_to_record(row):
+    return json.loads(row["data"]) if row is not None else None
+
+
+def _journal(conn, target, op, keep, record_id=None, data=None):
+    """書き込み前の状態を記録し、対象ごとに直近 keep 件だけを残す（書き込みと同じトランザクションで呼ぶ）"""
+    conn.execute(
+        "INSERT INTO undo_journal (target, op, record_id, data) VALUES (?, ?, ?, ?)",
+        (target, op, record_id, json.dumps(data, ensure_ascii=False) if data is not None else None)
+    )
+    conn.execute(
+        "DELETE FROM undo_journal WHERE target = ? AND seq NOT IN"
+        " (SELECT seq FROM undo_journal WHERE target = ? ORDER BY seq DESC LIMIT ?)",
+        (target, target, keep)
+    )
+
+
+def _last_journal(conn, target):
+    """
+    対象の最新の書き込み前の状態を返す
+
+    Raises:
+        FileNotFoundError: 記録が無い場合（JSONファイルのバックアップが無い場合と同じ）
+    """
+    row = conn.execute(
+        "SELECT op, record_id, data FROM undo_journal WHERE target = ? ORDER BY seq DESC LIMIT 1", (target,)
+    ).fetchone()
+    if row is None:
+        raise FileNotFoundError("バックアップが見つかりません")
+    return row["op"], row["record_id"], json.loads(row["data"]) if row["data"] is not None else None
+
+
+class SqliteTransactionStore:
+    """取引ログのSQLiteストア（検索・集計は索引を使い、結果の件数に比例する）"""
+
+    def __init__(self, path, journal_keep=SQLITE_UNDO_JOURNAL_KEEP):
+        """
+        Args:
+            path (str): データベースファイルのパス
+            journal_keep (int): 保持する書き込み前の状態の件数
+        """
+        self.db = SqliteDatabase(path)
+        self.journal_keep = journal_keep
+
+    def add(self, record):
+        """
+        取引を追加する
+
+        Args:
+            record (dict): 取引データ（idを含むこと）
+        """
+        with self.db.connection() as conn:
+            self._insert(conn, record)
+            _journal(conn, "transactions", "insert", self.journal_keep, record_id=record["id"])
+
+    def add_many(self, records):
+        """
+        複数の取引を1つのトランザクションで追加する（同じidの取引は追加しない）
+
+        Args:
+            records (list): 取引データのリスト
+
+        Returns:
+            int: 追加した件数
+        """
+        with self.db.connection() as conn:
+            return sum(self._insert(conn, record, ignore_existing=True) for record in records)
+
+    @staticmethod
+    def _insert(conn, record, ignore_existing=False):
+        verb = "INSERT OR IGNORE" if ignore_existing else "INSERT"
+        cursor = conn.execute(
+            f"{verb} INTO transactions (id, timestamp, user_id, type, status, currency_pair, data)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (record["id"], *(record.get(column) for column in _INDEXED_COLUMNS),
+             json.dumps(record, ensure_ascii=False))
+        )
+        return cursor.rowcount
+
+    def update(self, record_id, fields):
+        """
+        取引のフィールドを上書きする
+
+        Args:
+            record_id (str): 取引ID
+            fields (dict): 上書きするフィールド
+
+        Returns:
+            bool: 取引が見つかった場合True
+        """
+        with self.db.connection() as conn:
+            row = conn.execute("SELECT data FROM transactions WHERE id = ?", (record_id,)).fetchone()
+            if row is None:
+                return False
+            record = _row_to_record(row)
+            _journal(conn, "transactions", "update", self.journal_keep, record_id=record_id, data=record)
+            self._replace(conn, {**record, **fields})
+            return True
+
+    @staticmethod
+    def _replace(conn, record):
+        conn.execute(
+            "UPDATE transactions SET timestamp = ?, user_id = ?, type = ?, status = ?, currency_pair = ?,"
+            " data = ? WHERE id = ?",
+            (*(record.get(column) for column in _INDEXED_COLUMNS),
+             json.dumps(record, ensure_ascii=False), record["id"])
+        )
+
+    def restore_last(self):
+        """
+        直前の書き込み（追加・更新・全削除）の前の状態に戻す
+
+        記録は消さないため、次の書き込みまでは何度呼んでも同じ状態になる（JSONファイルのバックアップからの復元と同じ）。
+
+        Returns:
+            str: 戻した書き込みの種類（"insert", "update", "clear"）
+
+        Raises:
+            FileNotFoundError: 記録が無い場合
+        """
+        with self.db.connection() as conn:
+            op, record_id, data = _last_journal(conn, "transactions")
+            if op == "insert":
+                conn.execute("DELETE FROM transactions WHERE id = ?", (record_id,))
+            elif op == "update":
+                self._replace(conn, data)
+            elif op == "clear":
+                for record in data:
+                    self._insert(conn, record, ignore_existing=True)
+            return op
+
+    def get(self, record_id):
+        """IDで取引を返す（無い場合はNone）"""
+        row = self.db.connection().execute("SELECT data FROM transactions WHERE id = ?", (record_id,)).fetchone()
+        return _row_to_record(row)
+
+    def last_of_type(self, record_type, exclude_status=None):
+        """
+        指定した種類の最新の取引を返す（追加した順で最後のもの）
+
+        Args:
+            record_type (str): 取引の種類（"取引", "取り消し" など）
+            exclude_status (str): 除外するステータス
+
+        Returns:
+            dict | None: 取引
+        """
+        sql = "SELECT data FROM transactions WHERE type = ?"
+        params = [record_type]
+        if exclude_status is not None:
+            sql += " AND status IS NOT ?"
+            params.append(exclude_status)
+        row = self.db.connection().execute(sql + " ORDER BY seq DESC LIMIT 1", params).fetchone()
+        return _row_to_record(row)
+
+    def newest(self, limit=None, user_id=None, since=None):
+        """
+        取引を新しい順に返す
+
+        Args:
+            limit (int): 最大件数（Noneの場合は全件）
+            user_id (str): 指定した場合はそのユーザーの取引のみ
+            since (str): 指定した場合はこのタイムスタンプ以降の取引のみ
+
+        Returns:
+            list: 取引のリスト（新しい順）
+        """
+        sql = "SELECT data FROM transactions"
+        conditions, params = [], []
+        if user_id is not None:
+            conditions.append("user_id = ?")
+            params.append(user_id)
+        if since is not None:
+            conditions.append("timestamp >= ?")
+            params.append(since)
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY timestamp DESC"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return [_row_to_record(row) for row in self.db.connection().execute(sql, params)]
+
+    @staticmethod
+    def _range_condition(start, end):
+        conditions, params = [], []
+        if start:
+            conditions.append("timestamp >= ?")
+            params.append(start)
+        if end:
+            conditions.append("timestamp <= ?")
+            params.append(end)
+        return (" WHERE " + " AND ".join(conditions) if conditions else ""), params
+
+    def count_range(self, start=None, end=None):
+        """タイムスタンプの範囲の取引数を返す"""
+        where, params = self._range_condition(start, end)
+        return self.db.connection().execute("SELECT COUNT(*) FROM transactions" + where, params).fetchone()[0]
+
+    def iter_range(self, start=None, end=None):
+        """
+        タイムスタンプの範囲の取引を古い順に返す（1件ずつ読み込む）
+
+        Args:
+            start (str): この値以上のタイムスタンプ
+            end (str): この値以下のタイムスタンプ
+
+        Yields:
+            dict: 取引
+        """
+        where, params = self._range_condition(start, end)
+        sql = "SELECT data FROM transactions" + where
+        for row in self.db.connection().execute(sql + " ORDER BY timestamp, seq", params):
+            yield _row_to_record(row)
+
+    def all(self):
+        """全ての取引を追加した順に返す"""
+        return [_row_to_record(row) for row in self.db.connection().execute("SELECT data FROM transactions ORDER BY seq")]
+
+    def count(self):
+        """取引の件数を返す"""
+        return self.db.connection().execute("SELECT COUNT(*) FROM transactions").fetchone()[0]
+
+    def statistics(self):
+        """
+        取引統計を集計する（TransactionLog.get_statistics と同じ形式）
+
+        Returns:
+            dict: 取引統計
+        """
+        conn = self.db.connection()
+        row = conn.execute(
+            "SELECT COUNT(*) AS total,"
+            " SUM(status = '完了') AS completed,"
+            " SUM(status = '取り消し済み') AS undone,"
+            " MIN(timestamp) AS earliest, MAX(timestamp) AS latest"
+            " FROM transactions"
+        ).fetchone()
+        pairs = [r[0] for r in conn.execute(
+            "SELECT DISTINCT currency_pair FROM transactions WHERE currency_pair IS NOT NULL AND currency_pair != ''"
+        )]
+        types = {r[0]: r[1] for r in conn.execute(
+            "SELECT COALESCE(type, 'その他'), COUNT(*) FROM transactions GROUP BY COALESCE(type, 'その他')"
+        )}
+        return {
+            "total_transactions": row["total"],
+            "completed_transactions": row["completed"] or 0,
+            "undone_transactions": row["undone"] or 0,
+            "currency_pairs": pairs,
+            "transaction_types": types,
+            "date_range": {
+                "earliest": row["earliest"],
+                "latest": row["latest"]
+            }
+        }
+
+    def daily_summary(self, start_date=None, end_date=None):
+        """
+        日付ごとの取引件数・取引量を集計する（TransactionLog.get_daily_summary と同じ形式）
+
+        Args:
+            start_date (str): この日付（YYYY-MM-DD）以降のみ
+            end_date (str): この日付（YYYY-MM-DD）以前のみ
+
+        Returns:
+            dict: 日付 -> {"count", "volume"}（日付順）
+        """
+        sql = ("SELECT substr(timestamp, 1, 10) AS day, COUNT(*) AS count,"
+               " SUM(ABS(COALESCE(json_extract(data, '$.amount'), 0))) AS volume"
+               " FROM transactions WHERE timestamp IS NOT NULL AND timestamp != ''")
+        params = []
+        if start_date:
+            sql += " AND timestamp >= ?"
+            params.append(start_date)
+        if end_date:
+            # 日付の終わりまで含める
+            sql += " AND substr(timestamp, 1, 10) <= ?"
+            params.append(end_date)
+        rows = self.db.connection().execute(sql + " GROUP BY day ORDER BY day", params)
+        return {row["day"]: {"count": row["count"], "volume": row["volume"]} for row in rows}
+
+    def pair_summary(self):
+        """
+        通貨ペアごとの取引件数・差引数量・取引量を集計する（TransactionLog.get_pair_summary と同じ形式）
+
+        Returns:
+            dict: 通貨ペア -> {"count", "net_amount", "volume"}
+        """
+        rows = self.db.connection().execute(
+            "SELECT currency_pair, COUNT(*) AS count,"
+            " SUM(COALESCE(json_extract(data, '$.amount'), 0)) AS net_amount,"
+            " SUM(ABS(COALESCE(json_extract(data, '$.amount'), 0))) AS volume"
+            " FROM transactions WHERE currency_pair IS NOT NULL AND currency_pair != ''"
+            " GROUP BY currency_pair"
+        )
+        return {
+            row["currency_pair"]: {"count": row["count"], "net_amount": row["net_amount"], "volume": row["volume"]}
+            for row in rows
+        }
+
+    def clear(self):
+        """全ての取引を削除する（削除した取引は restore_last で戻せるよう記録する）"""
+        with self.db.connection() as conn:
+            records = [_row_to_record(row) for row in conn.execute("SELECT data FROM transactions ORDER BY seq")]
+            _journal(conn, "transactions", "clear", self.journal_keep, data=records)
+            conn.execute("DELETE FROM transactions")
+
+
+class SqliteBalanceStore:
+    """残高のSQLiteストア（更新と履歴の追加を1つのトランザクションで行う）"""
+
+    def __init__(self, path, journal_keep=SQLITE_UNDO_JOURNAL_KEEP):
+        """
+        Args:
+            path (str): データベースファイルのパス
+            journal_keep (int): 保持する書き込み前の状態の件数
+        """
+        self.db = SqliteDatabase(path)
+        self.journal_keep = journal_keep
+
+    def get(self):
+        """
+        残高を返す
+
+        Returns:
+            dict | None: 通貨と残高のマッピング。まだ保存されていない場合はNone
+        """
+        rows = self.db.connection().execute("SELECT currency, amount FROM balances").fetchall()
+        return {row["currency"]: row["amount"] for row in rows} if rows else None
+
+    def set(self, balances, history_limit=100):
+        """
+        残高を置き換え、履歴に追加する
+
+        Args:
+            balances (dict): 通貨と残高のマッピング
+            history_limit (int): 保持する履歴の件数
+        """
+        now = datetime.now().isoformat()
+        with self.db.connection() as conn:
+            previous = {row["currency"]: row["amount"] for row in conn.execute("SELECT currency, amount FROM balances")}
+            if previous:
+                _journal(conn, "balances", "set", self.journal_keep, data=previous)
+            self._replace(conn, balances, now)
+            conn.execute(
+                "INSERT INTO balance_history (timestamp, balances) VALUES (?, ?)",
+                (now, json.dumps(balances, ensure_ascii=False))
+            )
+            conn.execute(
+                "DELETE FROM balance_history WHERE seq <= (SELECT MAX(seq) FROM balance_history) - ?",
+                (history_limit,)
+            )
+
+    @staticmethod
+    def _replace(conn, balances, now):
+        conn.execute("DELETE FROM balances")
+        conn.executemany(
+            "INSERT INTO balances (currency, amount, updated_at) VALUES (?, ?, ?)",
+            [(currency, float(amount), now) for currency, amount in balances.items()]
+        )
+
+    def restore_last(self):
+        """
+        直前の更新の前の残高に戻す（履歴には追加しない。次の更新までは何度呼んでも同じ状態になる）
+
+        Returns:
+            dict: 戻した残高
+
+        Raises:
+            FileNotFoundError: 記録が無い場合
+        """
+        with self.db.connection() as conn:
+            _, _, previous = _last_journal(conn, "balances")
+            self._replace(conn, previous, datetime.now().isoformat())
+            return previous
+
+    def history(self, limit=10):
+        """
+        残高の変更履歴を古い順に返す
+
+        Args:
+            limit (int): 取得する件数（新しいものから）
+
+        Returns:
+            list: {"timestamp", "balances"} のリスト
+        """
+        rows = self.db.connection().execute(
+            "SELECT timestamp, balances FROM balance_history ORDER BY seq DESC LIMIT ?", (limit,)
+        ).fetchall()
+        return [{"timestamp": row["timestamp"], "balances": json.loads(row["balances"])} for row in reversed(rows)]
+
+
+def migrate_json_to_sqlite(db_path, log_path=None, balance_path=None):
+    """
+    JSONファイルの取引ログと残高をSQLiteに移行する（移行済みの取引は重複して追加しない）
+
+    圧縮済みの追記型ログはアーカイブに移した取引も移行する。アーカイブが無い・件数がヘッダーの集計と
+    一致しない場合は、残高が合わなくなるため移行しない（例外を送出する）。
+
+    Args:
+        db_path (str): 移行先のデータベースファイル
+        log_path (str): 取引ログ（transaction_log.jsonl または従来形式のjson）
+        balance_path (str): 残高ファイル（balance.json）
+
+    Returns:
+        dict: {"transactions": 追加した取引数, "balances": 移行した残高 または None}
+
+    Raises:
+        FileNotFoundError: 圧縮済みのログのアーカイブが無い場合
+        ValueError: アーカイブの取引数がログのヘッダーの集計と一致しない場合
+    """
+    result = {"transactions": 0, "balances": None}
+
+    if log_path and os.path.exists(log_path):
+        records = read_all_records(log_path) if is_jsonl_log(log_path) else read_records(log_path)
+        records = [record for record in records if record.get("id")]
+        result["transactions"] = SqliteTransactionStore(db_path).add_many(records)
+
+    if balance_path and os.path.exists(balance_path):
+        with open(balance_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        balances = data.get("balances", data) if isinstance(data, dict) else None
+        if balances:
+            balances = {k: v for k, v in balances.items() if isinstance(v, (int, float))}
+            SqliteBalanceStore(db_path).set(balances)
+            result["balances"] = balances
+
+    return result
+
+
+def load_transactions(db_path):
+    """
+    推論サブプロセス向けに、データベースの取引を追加した順に読み込む
+
+    Args:
+        db_path (str): データベースファイル
+
+    Returns:
+        list: 取引のリスト
+    """
+    return SqliteTransactionStore(db_path).all()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JSONの取引ログ・残高をSQLiteに移行する")
+    parser.add_argument("--db", required=True, help="移行先のSQLiteファイル")
+    parser.add_argument("--log", default=None, help="取引ログ（transaction_log.jsonl / transaction_log.json）")
+    parser.add_argument("--balance", default=None, help="残高ファイル（balance.json）")
+    args = parser.parse_args()
+
+    try:
+        result = migrate_json_to_sqlite(args.db, args.log, args.balance)
+    except (FileNotFoundError, ValueError) as e:
+        print(f"移行できません: {e}")
+        return
+    print(f"取引を{result['transactions']}件移行しました -> {args.db}")
+    if result["balances"] is not None:
+        print(f"残高を移行しました: {result['balances']}")
+
+
+if __name__ == "__main__":
+    main()
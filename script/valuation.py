@@ -0,0 +1,171 @@
+"""
+資産評価エンジン - 残高を通貨ごとの配列、レートを変換行列として持ち、ベクトル演算で評価する
+
+Portfolio.get_total_value / Portfolio.summary / 取引ログの資産まとめ / Slackの残高表示で共通に使う。
+"""
+
+import numpy as np
+import pandas as pd
+
+from script.currency_graph import solve_rates
+
+# 評価設定
+VALUATION_CURRENCIES = ["JPY", "USD", "EUR"]  # 配列の並び順（残高にそれ以外の通貨があれば後ろに追加する）
+VALUATION_BASE_CURRENCY = "JPY"
+
+
+def normalize_rates(rates):
+    """
+    レートを {通貨ペア: レート} の辞書に揃える
+
+    Args:
+        rates (dict | pd.DataFrame): レートの辞書、または display_market_info が返す
+            pair / market_rate 列を持つDataFrame
+
+    Returns:
+        dict: 通貨ペアとレートのマッピング（欠損値は除く）
+    """
+    if rates is None:
+        return {}
+    if isinstance(rates, pd.DataFrame):
+        if rates.empty or "pair" not in rates or "market_rate" not in rates:
+            return {}
+        rates = dict(zip(rates["pair"], rates["market_rate"]))
+    return {pair: float(rate) for pair, rate in rates.items() if rate is not None and pd.notna(rate)}
+
+
+class ValuationEngine:
+    """
+    配列ベースの資産評価エンジン
+
+    残高は currencies の並びの配列、レートは基準通貨への変換ベクトル（変換行列の1列）として扱い、
+    1つまたは複数のポートフォリオを1つまたは複数のレートのスナップショットで一度に評価する。
+    """
+
+    def __init__(self, currencies=None):
+        """
+        Args:
+            currencies (list): 配列の並び順（省略時はVALUATION_CURRENCIES）
+        """
+        self.currencies = list(currencies or VALUATION_CURRENCIES)
+        self.index = {currency: i for i, currency in enumerate(self.currencies)}
+
+    @classmethod
+    def for_balances(cls, *balances_list):
+        """残高に含まれる全ての通貨を並びに含むエンジンを返す"""
+        currencies = list(VALUATION_CURRENCIES)
+        for balances in balances_list:
+            currencies.extend(c for c in balances if c not in currencies)
+        return cls(currencies)
+
+    def to_array(self, balances):
+        """
+        残高の辞書を配列にする
+
+        Args:
+            balances (dict): 通貨と残高のマッピング
+
+        Returns:
+            np.ndarray: currencies の並びの残高（無い通貨は0）
+
+        Raises:
+            KeyError: エンジンの並びに無い通貨がある場合
+        """
+        array = np.zeros(len(self.currencies))
+        for currency, amount in balances.items():
+            array[self.index[currency]] = amount
+        return array
+
+    def conversion_vector(self, rates, base_currency=VALUATION_BASE_CURRENCY):
+        """
+        各通貨1単位の基準通貨での価値を返す
+
+        Args:
+            rates (dict | pd.DataFrame): レート
+            base_currency (str): 基準通貨
+
+        Returns:
+            np.ndarray: currencies の並びの変換レート（経路が無い通貨はNaN）
+        """
+        graph = solve_rates(normalize_rates(rates), [base_currency])
+        column = graph.matrix[:, graph.index[base_currency]]
+        vector = np.full(len(self.currencies), np.nan)
+        for i, currency in enumerate(self.currencies):
+            if currency == base_currency:
+                vector[i] = 1.0
+            elif currency in graph.index:
+                vector[i] = column[graph.index[currency]]
+        return vector
+
+    def value_many(self, balances_list, rates_list, base_currency=VALUATION_BASE_CURRENCY):
+        """
+        複数のポートフォリオを複数のレートのスナップショットで評価する
+
+        Args:
+            balances_list (list): 残高の辞書のリスト（P件）
+            rates_list (list): レートのリスト（S件）
+            base_currency (str): 基準通貨
+
+        Returns:
+            np.ndarray: P x S の総資産（残高のある通貨のレートが無い組はNaN）
+        """
+        balances = np.array([self.to_array(b) for b in balances_list]).reshape(len(balances_list), len(self.currencies))
+        vectors = np.array([self.conversion_vector(r, base_currency) for r in rates_list]).reshape(len(rates_list), len(self.currencies))
+        # 残高0の通貨はレートが無くても評価に影響させない
+        values = np.where(balances[:, None, :] == 0, 0.0, balances[:, None, :] * vectors[None, :, :])
+        return values.sum(axis=2)
+
+    def values(self, balances, rates, base_currency=VALUATION_BASE_CURRENCY):
+        """
+        通貨ごとの基準通貨での価値を返す
+
+        Args:
+            balances (dict): 通貨と残高のマッピング
+            rates (dict | pd.DataFrame): レート
+            base_currency (str): 基準通貨
+
+        Returns:
+            dict: 通貨と価値のマッピング（レートが無い通貨はNone）
+        """
+        amounts = self.to_array(balances)
+        values = np.where(amounts == 0, 0.0, amounts * self.conversion_vector(rates, base_currency))
+        return {
+            currency: None if np.isnan(values[self.index[currency]]) else float(values[self.index[currency]])
+            for currency in balances
+        }
+
+    def total(self, balances, rates, base_currency=VALUATION_BASE_CURRENCY):
+        """
+        基準通貨での総資産を返す
+
+        Args:
+            balances (dict): 通貨と残高のマッピング
+            rates (dict | pd.DataFrame): レート
+            base_currency (str): 基準通貨
+
+        Returns:
+            float | None: 総資産。残高のある通貨のレートが無い場合はNone
+        """
+        total = self.value_many([balances], [rates], base_currency)[0, 0]
+        return None if np.isnan(total) else float(total)
+
+    def missing_currencies(self, balances, rates, base_currency=VALUATION_BASE_CURRENCY):
+        """残高があるのに基準通貨へのレートが無い通貨のリストを返す"""
+        vector = self.conversion_vector(rates, base_currency)
+        return [c for c, amount in balances.items() if amount != 0 and np.isnan(vector[self.index[c]])]
+
+
+def value_balances(balances, rates, base_currency=VALUATION_BASE_CURRENCY):
+    """
+    1つのポートフォリオを評価する
+
+    Args:
+        balances (dict): 通貨と残高のマッピング
+        rates (dict | pd.DataFrame): レート
+        base_currency (str): 基準通貨
+
+    Returns:
+        tuple: (通貨ごとの価値の辞書, 総資産。レートが無い通貨がある場合はNone)
+    """
+    engine = ValuationEngine.for_balances(balances)
+    return engine.values(balances, rates, base_currency), engine.total(balances, rates, base_currency)